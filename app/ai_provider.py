@@ -1,10 +1,36 @@
 import os
-import json
+import orjson
+import functools
+import threading
 from dotenv import load_dotenv
+from app import llm_cache, schemas
+
+# Optional dependency: the module must still import when Vertex AI is not installed
+try:
+    import vertexai
+    from vertexai.generative_models import GenerativeModel, GenerationConfig
+except ImportError:
+    vertexai = None
+    GenerativeModel = None
+    GenerationConfig = None
 
 load_dotenv()
 
+_init_lock = threading.Lock()
+_initialized: set[tuple[str, str]] = set()
+
+
+@functools.lru_cache(maxsize=4)
+def _get_model(project: str, location: str, model_name: str):
+    """Returns a cached GenerativeModel, running vertexai.init once per (project, location)."""
+    with _init_lock:
+        if (project, location) not in _initialized:
+            vertexai.init(project=project, location=location)
+            _initialized.add((project, location))
+    return GenerativeModel(model_name)
 
+
+@llm_cache.cached(ttl=llm_cache.DEFAULT_TTL_SECONDS, should_cache=llm_cache.has_answer)
 def generate_oracle_json(prompt: str) -> dict:
     """Generate a JSON response for Clause Oracle via Vertex AI.
 
@@ -16,9 +42,8 @@ def generate_oracle_json(prompt: str) -> dict:
     Returns a dict with keys: "answer", "citation".
     Raises on initialization errors; caller should handle fallbacks.
     """
-    # Lazy imports to avoid hard dependency when not enabled
-    import vertexai
-    from vertexai.generative_models import GenerativeModel, GenerationConfig
+    if vertexai is None:
+        raise RuntimeError("google-cloud-aiplatform (vertexai) is not installed")
 
     project = os.getenv("VERTEX_PROJECT")
     location = os.getenv("VERTEX_LOCATION", "us-central1")
@@ -27,35 +52,37 @@ def generate_oracle_json(prompt: str) -> dict:
     if not project:
         raise RuntimeError("VERTEX_PROJECT env var is required for Vertex AI provider")
 
-    vertexai.init(project=project, location=location)
-    model = GenerativeModel(model_name)
+    model = _get_model(project, location, model_name)
 
-    gen_cfg = GenerationConfig(response_mime_type="application/json")
+    gen_cfg = GenerationConfig(response_mime_type="application/json", response_schema=schemas.QUERY_RESPONSE_SCHEMA)
     response = model.generate_content(prompt, generation_config=gen_cfg)
 
-    text = (getattr(response, "text", None) or "").strip()
+    try:
+        # response.text raises ValueError when the first candidate has no text part
+        text = (getattr(response, "text", None) or "").strip()
+    except ValueError:
+        text = ""
     if not text:
-        # Fallback: try candidates -> content -> parts
+        # Fallback: first non-empty part across candidates -> content -> parts
         try:
-            candidates = getattr(response, "candidates", []) or []
-            for c in candidates:
-                parts = getattr(getattr(c, "content", None), "parts", []) or []
-                for p in parts:
-                    t = getattr(p, "text", "")
-                    if t:
-                        text = t.strip()
-                        break
-                if text:
-                    break
-        except Exception:
-            pass
+            text = next(
+                (
+                    p.text.strip()
+                    for c in getattr(response, "candidates", None) or ()
+                    for p in getattr(getattr(c, "content", None), "parts", None) or ()
+                    if getattr(p, "text", "")
+                ),
+                "",
+            )
+        except AttributeError:
+            text = ""
 
     # Ensure JSON object contract
     try:
-        data = json.loads(text)
-        if not isinstance(data, dict):
-            raise ValueError("Non-object JSON")
-    except Exception:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
         data = {"answer": text or "", "citation": ""}
 
     # Guarantee keys
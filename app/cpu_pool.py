@@ -0,0 +1,32 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# CPU-heavy helpers (report building, PDF merging, cue scoring of large documents) run in a
+# process pool so they use more than one core and don't hold the GIL of the worker serving requests.
+# Every server worker starts its own pool, so the default stays small rather than following the
+# CPU count: with `-w $(nproc)` that would mean nproc² processes.
+WORKERS = max(1, int(os.getenv("CPU_POOL_WORKERS", "2") or 2))
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKERS)
+    return _executor
+
+
+async def run_cpu_bound(fn, *args):
+    # Serverless runtimes may not allow subprocesses; fall back to a worker thread there
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+    except (OSError, NotImplementedError, BrokenProcessPool):
+        return await asyncio.to_thread(fn, *args)
+
+
+def shutdown() -> None:
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
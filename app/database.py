@@ -1,25 +1,104 @@
 # In app/database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.models import Base
 
 DATABASE_URL = "sqlite:///./chimera_app.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./chimera_app.db"
 
+# Sync engine is only used for startup schema creation/migrations
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Write engine: aiosqlite keeps disk I/O off the event loop. SQLite admits one writer at a time, so
+# the pool holds a single connection: concurrent write sessions queue here for it instead of racing
+# for the file lock and sleeping in busy_timeout. Write sessions must not hold it across slow work
+# (model calls, OCR); reads that don't need it go through read_engine below.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0,
+    pool_timeout=60,
+)
+SessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Read-only engine for GET endpoints. WAL readers never block each other or the writer, so a
+# larger pool lets dashboard/detail polls run in parallel without competing for write sessions.
+read_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=max(4, os.cpu_count() or 4),
+    max_overflow=10,
+)
+ReadSessionLocal = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+
+
+# Bump whenever create_db_and_tables gains a migration step
+SCHEMA_VERSION = 6
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+@event.listens_for(read_engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # Per-connection settings; journal_mode=WAL is persistent and set once at startup
+    cursor = dbapi_connection.cursor()
+    # Wait for a concurrent writer's lock instead of failing fast with SQLITE_BUSY
+    cursor.execute("PRAGMA busy_timeout=5000")
+    # foreign_keys stays off: anonymous analyses are stored under owner_id 0, which has no users row
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+
+@event.listens_for(read_engine.sync_engine, "connect")
+def _set_read_only(dbapi_connection, connection_record):
+    # Reject writes on read-pool connections; mode=ro URIs can't open a WAL db whose -shm is missing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
 
 def create_db_and_tables():
+    # WAL lets readers proceed while a writer commits; the mode is stored in the DB file
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    except Exception:
+        pass
+    # Warm databases are already at the current schema; skip create_all and the probes
+    try:
+        with engine.connect() as conn:
+            if (conn.exec_driver_sql("PRAGMA user_version").scalar() or 0) >= SCHEMA_VERSION:
+                return
+    except Exception:
+        pass
     Base.metadata.create_all(bind=engine)
     # Lightweight SQLite migration for new columns
     try:
         with engine.begin() as conn:
-            cols = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info('analysis_meta')").fetchall()]
+            cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info('analysis_meta')")}
             if 'risk_reason' not in cols:
                 conn.exec_driver_sql("ALTER TABLE analysis_meta ADD COLUMN risk_reason TEXT")
             if 'page_images_json' not in cols:
                 conn.exec_driver_sql("ALTER TABLE analysis_meta ADD COLUMN page_images_json TEXT")
+            if 'page_images_uri' not in cols:
+                conn.exec_driver_sql("ALTER TABLE analysis_meta ADD COLUMN page_images_uri TEXT")
+            if 'file_hash' not in cols:
+                conn.exec_driver_sql("ALTER TABLE analysis_meta ADD COLUMN file_hash TEXT")
+            # Single-column hash indexes duplicated the (owner_id, hash) ones below
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_analysis_meta_file_hash")
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_analysis_meta_content_hash")
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_meta_owner_hash ON analysis_meta (owner_id, content_hash)")
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_meta_owner_file_hash ON analysis_meta (owner_id, file_hash)")
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_analyses_owner ON analyses (owner_id)")
+            conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_meta_owner_created ON analysis_meta (owner_id, created_at DESC)")
             # Ensure timeline_events table exists
             conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS timeline_events (id INTEGER PRIMARY KEY, analysis_id INTEGER NOT NULL, date TEXT NOT NULL, label TEXT NOT NULL, kind TEXT NOT NULL, description TEXT NOT NULL)")
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
     except Exception:
         # Best-effort migration; avoid crashing app startup
         pass
\ No newline at end of file
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import functools
+import threading
+
+import numpy as np
+
+# Bump LLM_PROMPT_VERSION whenever prompts change so stale answers are never served
+PROMPT_VERSION = os.getenv("LLM_PROMPT_VERSION", "v1")
+CACHE_DB_FILE = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+DEFAULT_TTL_SECONDS = 7 * 86400
+# Cosine similarity required for a semantic hit (near-duplicate questions)
+SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.85"))
+# Expired rows are never read again; writers delete them at most this often
+PURGE_INTERVAL_SECONDS = 3600
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_last_purge = 0.0
+
+
+def is_enabled() -> bool:
+    v = (os.getenv("LLM_CACHE_ENABLED", "true") or "").strip().lower()
+    return v not in ("0", "false", "no", "off")
+
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(CACHE_DB_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "input_hash TEXT PRIMARY KEY, prompt_version TEXT NOT NULL, "
+            "response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_semantic_cache ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, prompt_version TEXT NOT NULL, "
+            "embedding TEXT NOT NULL, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_semantic_scope ON llm_semantic_cache(scope, prompt_version)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _purge_expired(conn: sqlite3.Connection) -> None:
+    """Deletes expired rows from both tables; callers hold _lock and commit."""
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+    conn.execute("DELETE FROM llm_semantic_cache WHERE expires_at <= ?", (now,))
+
+
+def has_answer(data) -> bool:
+    """True for {answer, ...} responses with a non-empty answer; blocked or empty replies are not cached."""
+    return isinstance(data, dict) and bool(str(data.get("answer") or "").strip())
+
+
+def input_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update((p or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def get(key: str):
+    """Returns the cached response for an exact input hash, or None on miss/expiry."""
+    if not is_enabled():
+        return None
+    try:
+        with _lock:
+            row = _get_conn().execute(
+                "SELECT response FROM llm_cache WHERE input_hash = ? AND prompt_version = ? AND expires_at > ?",
+                (key, PROMPT_VERSION, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    except Exception:
+        return None
+
+
+def put(key: str, response, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+    if not is_enabled():
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            _purge_expired(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (input_hash, prompt_version, response, expires_at) VALUES (?, ?, ?, ?)",
+                (key, PROMPT_VERSION, json.dumps(response), time.time() + ttl),
+            )
+            conn.commit()
+    except Exception:
+        pass
+
+
+def get_many(keys: list[str]) -> dict:
+    """Batch form of get(): one query for many input hashes; returns {key: response} for hits only."""
+    if not is_enabled() or not keys:
+        return {}
+    try:
+        marks = ",".join("?" * len(keys))
+        with _lock:
+            rows = _get_conn().execute(
+                f"SELECT input_hash, response FROM llm_cache WHERE input_hash IN ({marks}) AND prompt_version = ? AND expires_at > ?",
+                (*keys, PROMPT_VERSION, time.time()),
+            ).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+    except Exception:
+        return {}
+
+
+def put_many(items: dict, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+    if not is_enabled() or not items:
+        return
+    try:
+        expires_at = time.time() + ttl
+        with _lock:
+            conn = _get_conn()
+            _purge_expired(conn)
+            conn.executemany(
+                "INSERT OR REPLACE INTO llm_cache (input_hash, prompt_version, response, expires_at) VALUES (?, ?, ?, ?)",
+                [(k, PROMPT_VERSION, json.dumps(v), expires_at) for k, v in items.items()],
+            )
+            conn.commit()
+    except Exception:
+        pass
+
+
+def semantic_get(scope: str, embedding: list[float]):
+    """Returns the response of the most similar cached query in `scope` if cosine >= SEMANTIC_THRESHOLD."""
+    if not is_enabled() or not embedding:
+        return None
+    try:
+        with _lock:
+            rows = _get_conn().execute(
+                "SELECT embedding, response FROM llm_semantic_cache WHERE scope = ? AND prompt_version = ? AND expires_at > ?",
+                (scope, PROMPT_VERSION, time.time()),
+            ).fetchall()
+        if not rows:
+            return None
+        matrix = np.array([json.loads(e) for e, _ in rows], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        sims = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        best = int(np.argmax(sims))
+        if float(sims[best]) >= SEMANTIC_THRESHOLD:
+            return json.loads(rows[best][1])
+        return None
+    except Exception:
+        return None
+
+
+def semantic_put(scope: str, embedding: list[float], response, ttl: int = DEFAULT_TTL_SECONDS) -> None:
+    if not is_enabled() or not embedding:
+        return
+    try:
+        with _lock:
+            conn = _get_conn()
+            _purge_expired(conn)
+            conn.execute(
+                "INSERT INTO llm_semantic_cache (scope, prompt_version, embedding, response, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (scope, PROMPT_VERSION, json.dumps([float(x) for x in embedding]), json.dumps(response), time.time() + ttl),
+            )
+            conn.commit()
+    except Exception:
+        pass
+
+
+def cached(ttl: int = DEFAULT_TTL_SECONDS, should_cache=None):
+    """Exact-match cache for sync LLM calls whose positional args fully determine the response.
+
+    `should_cache(result)` returning False keeps a result out of the cache (e.g. an empty answer).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = input_hash(fn.__qualname__, *[str(a) for a in args])
+            hit = get(key)
+            if hit is not None:
+                return hit
+            result = fn(*args)
+            if should_cache is None or should_cache(result):
+                put(key, result, ttl)
+            return result
+        return wrapper
+    return decorator
@@ -1,16 +1,24 @@
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Response, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Response, APIRouter, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt
+from cachetools import TTLCache
 import json
 import os
+import time
 import io
-import pypdf
-
-from app import models, schemas, auth, services, utils
-from app.database import SessionLocal, create_db_and_tables
-from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+import asyncio
+import glob
+import hashlib
+import shutil
+import tempfile
+from functools import partial
+
+from app import models, schemas, auth, services, utils, page_store, cpu_pool
+from app.database import SessionLocal, ReadSessionLocal, create_db_and_tables
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse, ORJSONResponse
 from app import repository as fs_repo
 
 create_db_and_tables()
@@ -22,6 +30,8 @@ app = FastAPI(
     description="An AI-powered legal document analysis and co-pilot.",
     version="0.1.0",
     root_path=root_path,
+    # orjson keeps large analysis payloads (page text, highlights) cheap to encode
+    default_response_class=ORJSONResponse,
 )
 
 # Add /api prefix to all routes for Cloud Run deployment
@@ -48,6 +58,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("shutdown")
+def _shutdown_cpu_executor():
+    cpu_pool.shutdown()
+
+# OCR prewarming for scanned pages runs off the request path on a single background consumer
+_prewarm_task: asyncio.Task | None = None
+
+@app.on_event("startup")
+async def _start_prewarm_worker():
+    global _prewarm_task
+    _prewarm_task = asyncio.create_task(services.run_ocr_prewarm_worker())
+
+@app.on_event("shutdown")
+async def _stop_prewarm_worker():
+    if _prewarm_task is not None:
+        _prewarm_task.cancel()
+        await asyncio.gather(_prewarm_task, return_exceptions=True)
+
 # Serve static files
 @app.get("/")
 async def read_index():
@@ -61,23 +89,37 @@ async def read_main_js():
 async def read_favicon():
     return FileResponse("favicon.ico")
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    """Session on the read-only pool, for endpoints that never write."""
+    async with ReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-async def get_current_user(token: str | None = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    class _Anonymous:
-        def __init__(self):
-            self.id = 0
-            self.email = "anonymous@local"
+class _Anonymous:
+    def __init__(self):
+        self.id = 0
+        self.email = "anonymous@local"
+
+class _AuthenticatedUser:
+    def __init__(self, id: int, email: str):
+        self.id = id
+        self.email = email
+
+# Signature-verified token -> (user_id, email, exp). Tokens are reused across many
+# requests, so this skips the HMAC check and the users lookup on repeat calls.
+_token_cache: TTLCache = TTLCache(maxsize=4096, ttl=60)
 
+async def get_current_user(token: str | None = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)):
     if not token:
         return _Anonymous()
+    cached = _token_cache.get(token)
+    if cached and cached[2] > time.time():
+        return _AuthenticatedUser(cached[0], cached[1])
     try:
         payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
         email: str = payload.get("sub")
@@ -85,63 +127,128 @@ async def get_current_user(token: str | None = Depends(oauth2_scheme), db: Sessi
             return _Anonymous()
     except JWTError:
         return _Anonymous()
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
+    result = await db.execute(select(models.User.id).where(models.User.email == email))
+    user_id = result.scalar()
+    if user_id is None:
         return _Anonymous()
-    return user
+    # Never serve a cached identity past the token's own expiry
+    _token_cache[token] = (user_id, email, float(payload.get("exp") or 0))
+    return _AuthenticatedUser(user_id, email)
 
 @api_router.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    # Hash before touching the write session: the lookup below checks out the single writer connection
+    hashed_password = auth.get_password_hash(user.password)
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = auth.get_password_hash(user.password)
     new_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @api_router.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_read_db)):
+    result = await db.execute(select(models.User).where(models.User.email == form_data.username))
+    user = result.scalars().first()
     if not user or not auth.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     access_token = auth.create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @api_router.get("/analyses/me", response_model=list[schemas.AnalysisResult])
-async def read_user_analyses(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return db.query(models.Analysis).filter(models.Analysis.owner_id == current_user.id).all()
+async def read_user_analyses(db: AsyncSession = Depends(get_read_db), current_user: schemas.User = Depends(get_current_user)):
+    # Only the summary columns; skip hydrating the large key_info/actions JSON text
+    result = await db.execute(
+        select(models.Analysis.id, models.Analysis.filename, models.Analysis.assessment)
+        .where(models.Analysis.owner_id == current_user.id)
+    )
+    return [schemas.AnalysisResult.model_construct(id=row.id, filename=row.filename, assessment=row.assessment) for row in result]
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+_ALLOWED_EXTS: frozenset[str] = frozenset({'.pdf', '.doc', '.docx', '.txt', '.rtf'})
+_ALLOWED_MIMES: frozenset[str] = frozenset({
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'text/plain',
+    'application/rtf',
+    'text/rtf',
+})
 
-@api_router.post("/analyze", response_model=schemas.IntelligentAnalysis)
+def _copy_upload(src_path: str, dst_path: str) -> None:
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, length=UPLOAD_CHUNK_SIZE)
+
+@api_router.post("/analyze", response_model=schemas.IntelligentAnalysis, response_model_exclude_unset=True)
 async def analyze_document(
     document: UploadFile = File(...), 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
+    read_db: AsyncSession = Depends(get_read_db),
     current_user: schemas.User = Depends(get_current_user)
 ):
     # Validate allowed file types by extension and MIME
-    allowed_exts = {'.pdf', '.doc', '.docx', '.txt', '.rtf'}
-    allowed_mimes = {
-        'application/pdf',
-        'application/msword',
-        'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        'text/plain',
-        'application/rtf',
-        'text/rtf',
-    }
-    fname = document.filename or ''
-    ext = ('.' + fname.split('.')[-1].lower()) if '.' in fname else ''
-    if ext and ext not in allowed_exts and document.content_type not in allowed_mimes:
+    ext = os.path.splitext(document.filename or '')[1].lower()
+    if ext and ext not in _ALLOWED_EXTS and document.content_type not in _ALLOWED_MIMES:
         raise HTTPException(status_code=400, detail="Unsupported file type. Allowed: PDF, DOC, DOCX, TXT, RTF.")
 
-    raw_bytes = await document.read()
+    # Stream the upload to disk in 1 MB chunks so large PDFs never sit fully in memory
+    # and hash it incrementally for duplicate detection
+    tmp = tempfile.NamedTemporaryFile(delete=False)
+    hasher = hashlib.blake2b(digest_size=16)
     try:
-        contents = await utils.extract_text_from_document(raw_bytes, document.content_type)
+        with tmp:
+            while chunk := await document.read(UPLOAD_CHUNK_SIZE):
+                tmp.write(chunk)
+                hasher.update(chunk)
+        return await _analyze_uploaded_file(document, tmp.name, hasher.hexdigest(), db, read_db, current_user)
+    finally:
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+
+
+async def _load_existing_analysis(db: AsyncSession, analysis_id: int, document: UploadFile, upload_path: str, current_user: schemas.User) -> schemas.IntelligentAnalysis:
+    # Load existing full analysis and return it (no new entry)
+    fa = await services.get_full_analysis(db, analysis_id, current_user.id)
+    ia = await services.full_analysis_to_intelligent(fa)
+    # Backfill page images for scanned PDFs only if none were stored with the analysis
+    if not ia.page_images and (not ia.extracted_text or (len(ia.extracted_text) == 1 and len(ia.extracted_text[0]) < 100)):
+        try:
+            ia.page_images = await utils.get_page_images_if_scanned(upload_path, document.content_type)
+        except Exception:
+            ia.page_images = []
+    return ia
+
+
+async def _analyze_uploaded_file(document: UploadFile, upload_path: str, file_hash: str, db: AsyncSession, read_db: AsyncSession, current_user: schemas.User) -> schemas.IntelligentAnalysis:
+    # Lookups go through read_db: a query on the write session would hold the single writer
+    # connection through extraction and the model calls below. read_db itself is closed after each
+    # miss so its pooled connection isn't held through that work either.
+    # Duplicate detection by file digest first, so re-uploads skip extraction and classification
+    existing_id = await services.find_existing_analysis_by_hash(read_db, current_user.id, file_hash=file_hash)
+    if existing_id:
+        return await _load_existing_analysis(read_db, existing_id, document, upload_path, current_user)
+    await read_db.close()
+
+    try:
+        contents = await utils.extract_text_from_document(upload_path, document.content_type)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     if not contents or not any(contents): 
         raise HTTPException(status_code=400, detail="Could not extract text from the document.")
+
+    # Analyses stored before file digests were recorded only carry the extracted-text hash.
+    # Computed once here and reused when the meta row is persisted.
+    content_hash = services.hash_pages(contents)
+    existing_id = await services.find_existing_analysis_by_hash(read_db, current_user.id, content_hash=content_hash)
+    if existing_id:
+        return await _load_existing_analysis(read_db, existing_id, document, upload_path, current_user)
+    await read_db.close()
     
     # --- RE-INSTATED CLASSIFICATION CHECK ---
     document_classification = await services.classify_document_type(contents)
@@ -152,25 +259,11 @@ async def analyze_document(
         )
     # --- END OF CHECK ---
 
-    # Duplicate detection by content hash
-    existing_id = await services.find_existing_analysis_by_hash(db, current_user.id, contents)
-    if existing_id:
-        # Load existing full analysis and return it (no new entry)
-        fa = await services.get_full_analysis(db, existing_id, current_user.id)
-        ia = await services.full_analysis_to_intelligent(fa)
-        # Backfill page images for scanned PDFs if missing
-        if not ia.extracted_text or (len(ia.extracted_text) == 1 and len(ia.extracted_text[0]) < 100):
-            try:
-                ia.page_images = await utils.get_page_images_if_scanned(raw_bytes, document.content_type)
-            except Exception:
-                ia.page_images = []
-        return ia
-
     analysis_result = await services.process_large_document(contents)
     analysis_result.extracted_text = contents
     # Add scanned page images if applicable
     try:
-        analysis_result.page_images = await utils.get_page_images_if_scanned(raw_bytes, document.content_type)
+        analysis_result.page_images = await utils.get_page_images_if_scanned(upload_path, document.content_type)
     except Exception:
         analysis_result.page_images = []
 
@@ -181,24 +274,24 @@ async def analyze_document(
                 current_user.id,
                 document.filename,
                 analysis_result.assessment,
-                [item.model_dump() for item in analysis_result.key_info],
-                [item.model_dump() for item in analysis_result.identified_actions],
+                schemas.KeyInfoList.dump_python(analysis_result.key_info, mode="json"),
+                schemas.ActionList.dump_python(analysis_result.identified_actions, mode="json"),
             )
             analysis_result.id = creation.get("id")
             analysis_result.filename = document.filename
             analysis_result.created_at = creation.get("created_at")
             analysis_result.risk_level = await services.derive_risk_level(analysis_result)
-            # Compute precomputed highlights for immediate rendering on first load
+            # Compute precomputed highlights for immediate rendering on first load (worker thread: may OCR scanned pages)
             try:
-                analysis_result.risk_highlights = services.compute_risk_highlights_for_ia(analysis_result)
+                analysis_result.risk_highlights = await asyncio.to_thread(services.compute_risk_highlights_for_ia, analysis_result)
             except Exception:
                 analysis_result.risk_highlights = []
-            await services.persist_analysis_meta(db, {"id": analysis_result.id, "owner_id": current_user.id}, contents, analysis_result)
+            await services.persist_analysis_meta(db, {"id": analysis_result.id, "owner_id": current_user.id}, contents, analysis_result, file_hash=file_hash, content_hash=content_hash)
             # Save original PDF to GCS (optional best-effort)
             try:
                 if (document.content_type or '').lower() == 'application/pdf':
                     print(f"Uploading original PDF for analysis {analysis_result.id}")
-                    fs_repo.upload_original_pdf(int(analysis_result.id), raw_bytes)
+                    await asyncio.to_thread(fs_repo.upload_original_pdf, int(analysis_result.id), upload_path)
                     print(f"Successfully uploaded original PDF for analysis {analysis_result.id}")
                 else:
                     print(f"Skipping PDF upload for non-PDF file: {document.content_type}")
@@ -211,43 +304,71 @@ async def analyze_document(
             print(f"Firestore unavailable, falling back to SQLite: {e}")
 
     # Default SQLite path
+    analysis_result.filename = document.filename
+    analysis_result.created_at = await services.now_iso()
+    # LLM risk scoring runs before the write transaction opens so it never holds the DB lock
+    analysis_result.risk_level = await services.derive_risk_level(analysis_result)
     db_analysis = models.Analysis(
         filename=document.filename,
         assessment=analysis_result.assessment,
-        key_info_json=json.dumps([item.model_dump() for item in analysis_result.key_info]),
-        actions_json=json.dumps([item.model_dump() for item in analysis_result.identified_actions]),
+        key_info_json=schemas.KeyInfoList.dump_json(analysis_result.key_info).decode(),
+        actions_json=schemas.ActionList.dump_json(analysis_result.identified_actions).decode(),
         owner_id=current_user.id
     )
+    # Store scanned page images on disk and return URLs instead of inline base64. The files are written
+    # before the write transaction opens; inside it they are only moved under the new id.
+    staged_key = None
+    if analysis_result.page_images:
+        try:
+            staged_key = await asyncio.to_thread(page_store.stage_page_images, analysis_result.page_images)
+        except Exception:
+            staged_key = None
     db.add(db_analysis)
-    db.commit()
-    # attach ids/metadata in response
-    analysis_result.id = db_analysis.id
-    analysis_result.filename = document.filename
-    analysis_result.created_at = await services.now_iso()
-    analysis_result.risk_level = await services.derive_risk_level(analysis_result)
-    # Compute precomputed highlights for immediate rendering on first load
     try:
-        analysis_result.risk_highlights = services.compute_risk_highlights_for_ia(analysis_result)
+        # Flush assigns the id; analysis + meta rows are committed together below
+        await db.flush()
+        # attach ids/metadata in response
+        analysis_result.id = db_analysis.id
+        if staged_key:
+            try:
+                analysis_result.page_images = page_store.place_staged_pages(db_analysis.id, staged_key, analysis_result.page_images)
+            except OSError:
+                pass
+        await services.persist_analysis_meta(db, db_analysis, contents, analysis_result, file_hash=file_hash, commit=False, content_hash=content_hash)
+        await db.commit()
+    finally:
+        if staged_key:
+            # No-op once placed; clears the staging folder if the insert failed
+            page_store.discard_staged_pages(staged_key)
+    # Highlights aren't stored, so they're computed after commit: their OCR calls for scanned pages can take
+    # seconds and must not hold SQLite's single writer lock (worker thread: keeps the event loop free)
+    try:
+        analysis_result.risk_highlights = await asyncio.to_thread(services.compute_risk_highlights_for_ia, analysis_result)
     except Exception:
         analysis_result.risk_highlights = []
-    # persist updated risk_reason if set during derive
-    await services.persist_analysis_meta(db, db_analysis, contents, analysis_result)
     # Save original PDF to local storage (best-effort)
     try:
         if (document.content_type or '').lower() == 'application/pdf':
-            import os as _os
-            folder = _os.path.join('data', 'uploads', f'analysis_{db_analysis.id}')
-            _os.makedirs(folder, exist_ok=True)
-            path = _os.path.join(folder, 'original.pdf')
-            with open(path, 'wb') as f:
-                f.write(raw_bytes)
+            folder = os.path.join('data', 'uploads', f'analysis_{db_analysis.id}')
+            os.makedirs(folder, exist_ok=True)
+            await asyncio.to_thread(_copy_upload, upload_path, os.path.join(folder, 'original.pdf'))
     except Exception:
         pass
     return analysis_result
 
 
+@api_router.get("/analyses/{analysis_id}/pages/{page_number}")
+async def get_analysis_page_image(analysis_id: int, page_number: int, k: str = ""):
+    # Unauthenticated by design (<img> tags cannot send a bearer token); the random key in
+    # the URL handed out by /analyze is what grants access. Page files never change.
+    path = page_store.page_image_path(analysis_id, page_number, k)
+    if not path:
+        raise HTTPException(status_code=404, detail="Page image not found")
+    return FileResponse(path, media_type="image/png", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
 @api_router.get("/analyses/{analysis_id}/file")
-async def get_analysis_file(analysis_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+async def get_analysis_file(analysis_id: int, db: AsyncSession = Depends(get_read_db), current_user: schemas.User = Depends(get_current_user)):
     # Ownership check via existing helper (non-disruptive)
     try:
         _ = await services.get_full_analysis(db, analysis_id, current_user.id)
@@ -295,6 +416,16 @@ async def simulate_risk(request: schemas.SimulationRequest, current_user: schema
     )
     return schemas.SimulationResponse(simulation_text=simulation_result)
 
+@api_router.post("/simulate/batch", response_model=schemas.SimulationBatchResponse)
+async def simulate_risk_batch(request: schemas.SimulationBatchRequest, current_user: schemas.User = Depends(get_current_user)):
+    # One model round trip for every clause; the shared key facts/assessment are sent once
+    simulations = await services.get_risk_simulations_batch(
+        clauses=request.clauses,
+        document_context=request.document_context,
+        key_info=request.key_info
+    )
+    return schemas.SimulationBatchResponse(simulations=simulations)
+
 @api_router.post("/rewrite", response_model=schemas.RewriteResponse)
 async def rewrite_clause(request: schemas.RewriteRequest, current_user: schemas.User = Depends(get_current_user)):
     rewritten_versions = await services.get_clause_rewrites(
@@ -308,7 +439,7 @@ async def rewrite_clause(request: schemas.RewriteRequest, current_user: schemas.
 async def locate_highlight(
     analysis_id: int,
     request: schemas.LocateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: schemas.User = Depends(get_current_user)
 ):
     """Return exact locations (page + text offsets and/or OCR boxes) for a given text."""
@@ -330,12 +461,19 @@ async def benchmark_clause(request: schemas.BenchmarkRequest, current_user: sche
     )
     return schemas.BenchmarkResponse(**benchmark_data)
 
+@api_router.post("/benchmark/batch", response_model=schemas.BenchmarkBatchResponse)
+async def benchmark_clauses_batch(request: schemas.BenchmarkBatchRequest, current_user: schemas.User = Depends(get_current_user)):
+    # All clauses share one embedding request; already-seen clauses are served from the embedding cache
+    results = await services.get_clause_benchmarks_batch(request.clause_texts)
+    return schemas.BenchmarkBatchResponse(results=[schemas.BenchmarkResponse(**r) for r in results])
+
 @api_router.post("/query", response_model=schemas.QueryResponse)
 async def query_document(request: schemas.QueryRequest, current_user: schemas.User = Depends(get_current_user)):
     """
     Accepts a user question and returns an answer based on the document context.
     """
-    result = await services.answer_user_question(request.question, request.full_text, request.history)
+    history = [{"role": m.role, "content": m.content} for m in request.history]
+    result = await services.answer_user_question(request.question, request.full_text, history)
     # Optionally persist conversation if analysis_id provided
     if request.analysis_id:
         await services.append_conversation_message(
@@ -352,19 +490,27 @@ async def query_document(request: schemas.QueryRequest, current_user: schemas.Us
     return schemas.QueryResponse(answer=answer, citation=citation)
 
 @api_router.get("/analyses/dashboard", response_model=list[schemas.DashboardItem])
-async def get_dashboard_items(db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
-    return await services.get_dashboard_list(db, current_user.id)
+async def get_dashboard_items(
+    limit: int = Query(fs_repo.DASHBOARD_PAGE_SIZE, ge=1, le=fs_repo.DASHBOARD_PAGE_SIZE),
+    after_id: int | None = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    try:
+        return await services.get_dashboard_list(db, current_user.id, limit=limit, after_id=after_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Dashboard is unavailable: {e}")
 
 @api_router.get("/analyses/{analysis_id}", response_model=schemas.FullAnalysisResponse)
-async def get_analysis(analysis_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+async def get_analysis(analysis_id: int, db: AsyncSession = Depends(get_read_db), current_user: schemas.User = Depends(get_current_user)):
     return await services.get_full_analysis(db, analysis_id, current_user.id)
 
 @api_router.post("/timeline", response_model=schemas.TimelineResponse)
-async def generate_timeline(request: schemas.TimelineRequest, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+async def generate_timeline(request: schemas.TimelineRequest, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     return await services.generate_timeline(db, request.analysis_id, current_user.id)
 
 @api_router.get("/timeline/{analysis_id}", response_model=schemas.TimelineResponse)
-async def list_timeline(analysis_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+async def list_timeline(analysis_id: int, db: AsyncSession = Depends(get_read_db), current_user: schemas.User = Depends(get_current_user)):
     return await services.list_timeline(db, analysis_id, current_user.id)
 
 @api_router.post("/reminders", response_model=schemas.ReminderResponse)
@@ -373,26 +519,52 @@ async def create_reminder(request: schemas.ReminderRequest, current_user: schema
     return schemas.ReminderResponse(success=ok)
 
 @api_router.delete("/analyses/{analysis_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_analysis(analysis_id: int, db: Session = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
+async def delete_analysis(analysis_id: int, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)):
     # Firestore path: lightweight ownership check, then delete
     if os.getenv("DB_BACKEND", "").lower() == "firestore":
         has_access = await services.has_analysis_access(db, analysis_id, current_user.id)
         if not has_access:
             raise HTTPException(status_code=404, detail="Analysis not found")
         await services.delete_analysis(db, analysis_id)
+        await asyncio.to_thread(_delete_analysis_files, analysis_id)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     # SQLite path: Ensure the analysis exists and belongs to the current user
-    analysis = db.query(models.Analysis).filter(models.Analysis.id == analysis_id, models.Analysis.owner_id == current_user.id).first()
+    result = await db.execute(select(models.Analysis).where(models.Analysis.id == analysis_id, models.Analysis.owner_id == current_user.id))
+    analysis = result.scalars().first()
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found")
     await services.delete_analysis(db, analysis_id)
+    await asyncio.to_thread(_delete_analysis_files, analysis_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
+EXPORT_CACHE_DIR = os.path.join('data', 'exports')
+
+def _remove_export_cache(analysis_id: int) -> None:
+    for stale in glob.glob(os.path.join(EXPORT_CACHE_DIR, f"analysis_{analysis_id}_*.pdf")):
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+def _delete_analysis_files(analysis_id: int) -> None:
+    # Stored pages, the original upload and cached exports; stored page URLs stop resolving
+    page_store.delete_analysis_files(analysis_id)
+    _remove_export_cache(analysis_id)
+
+def _write_export_cache(analysis_id: int, cache_path: str, pdf_bytes: bytes) -> None:
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    # Drop stale exports of this analysis before writing the current one
+    _remove_export_cache(analysis_id)
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, cache_path)
+
 @api_router.get("/analyses/{analysis_id}/export")
 async def export_analysis_pdf(
     analysis_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_read_db), 
     current_user: schemas.User = Depends(get_current_user)
 ):
     """
@@ -436,12 +608,22 @@ async def export_analysis_pdf(
     # Get company name from environment
     company_name = os.getenv("COMPANY_NAME", "Your Company")
     
-    # Create analysis PDF
-    analysis_pdf_bytes = utils.create_analysis_pdf(analysis_data, company_name)
+    original_filename = full_analysis.filename or "document"
+    
+    # Generate filename
+    safe_filename = "".join(c for c in original_filename if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    if not safe_filename:
+        safe_filename = "document"
+    export_filename = f"analysis_{analysis_id}_{safe_filename}_export.pdf"
+    
+    # Repeat downloads of unchanged analyses are served straight from the export cache
+    export_key = hashlib.sha256(json.dumps([analysis_data, company_name], sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+    cache_path = os.path.join(EXPORT_CACHE_DIR, f"analysis_{analysis_id}_{export_key}.pdf")
+    if os.path.exists(cache_path):
+        return FileResponse(cache_path, media_type="application/pdf", filename=export_filename)
     
     # Try to get original document
-    original_bytes = None
-    original_filename = full_analysis.filename or "document"
+    original_source = None
     original_mime_type = "application/pdf"  # Default assumption
     
     # Determine original file type from filename
@@ -460,12 +642,11 @@ async def export_analysis_pdf(
         if os.getenv("DB_BACKEND", "").lower() == "firestore":
             try:
                 # Try to get from GCS
-                from google.cloud import storage as _storage
                 st, bucket = fs_repo._st_client_bucket()  # type: ignore
                 blob = bucket.blob(f"analyses/{analysis_id}/original.pdf")
-                if blob.exists():
+                if await asyncio.to_thread(blob.exists):
                     print(f"Found original PDF in GCS for analysis {analysis_id}")
-                    original_bytes = blob.download_as_bytes()
+                    original_source = await asyncio.to_thread(blob.download_as_bytes)
                     print(f"Successfully downloaded original PDF for analysis {analysis_id}")
                 else:
                     print(f"Original PDF not found in GCS for analysis {analysis_id}")
@@ -473,60 +654,32 @@ async def export_analysis_pdf(
                 print(f"Failed to retrieve original PDF from GCS for analysis {analysis_id}: {e}")
                 pass
         else:
-            # SQLite path - try local file
+            # SQLite path - hand the local file path straight to the merger
             local_path = os.path.join('data', 'uploads', f'analysis_{analysis_id}', 'original.pdf')
             if os.path.exists(local_path):
-                with open(local_path, 'rb') as f:
-                    original_bytes = f.read()
+                original_source = local_path
     except Exception:
         # Original document not found - continue with analysis-only PDF
         pass
     
-    # Generate final PDF
-    if original_bytes:
-        if original_mime_type == "application/pdf":
-            # Merge PDFs
-            final_pdf_bytes = utils.merge_pdf_with_original(analysis_pdf_bytes, original_bytes)
-        else:
-            # Attach non-PDF as attachment
-            final_pdf_bytes = utils.attach_non_pdf_original(
-                analysis_pdf_bytes, 
-                original_bytes, 
-                original_filename, 
-                original_mime_type
-            )
-            # Add notice page about attachment
-            notice_page = utils.create_attachment_notice_page(original_filename)
-            notice_reader = pypdf.PdfReader(io.BytesIO(notice_page))
-            analysis_reader = pypdf.PdfReader(io.BytesIO(final_pdf_bytes))
-            writer = pypdf.PdfWriter()
-            
-            # Add analysis pages
-            for page in analysis_reader.pages:
-                writer.add_page(page)
-            
-            # Add notice page
-            for page in notice_reader.pages:
-                writer.add_page(page)
-            
-            # Write final PDF
-            output_buffer = io.BytesIO()
-            writer.write(output_buffer)
-            final_pdf_bytes = output_buffer.getvalue()
-            output_buffer.close()
-    else:
-        # No original document - just return analysis PDF
-        final_pdf_bytes = analysis_pdf_bytes
-    
-    # Generate filename
-    safe_filename = "".join(c for c in original_filename if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    if not safe_filename:
-        safe_filename = "document"
-    export_filename = f"analysis_{analysis_id}_{safe_filename}_export.pdf"
+    # Generate final PDF in the CPU pool so reportlab/pypdf don't block the event loop
+    final_pdf_bytes = await cpu_pool.run_cpu_bound(
+        utils.build_export_pdf,
+        analysis_data,
+        company_name,
+        original_source,
+        original_filename,
+        original_mime_type,
+    )
+    try:
+        await asyncio.to_thread(_write_export_cache, analysis_id, cache_path, final_pdf_bytes)
+    except Exception:
+        pass
     
     # Return PDF as streaming response
+    buffer = io.BytesIO(final_pdf_bytes)
     return StreamingResponse(
-        io.BytesIO(final_pdf_bytes),
+        iter(partial(buffer.read, UPLOAD_CHUNK_SIZE), b""),
         media_type="application/pdf",
         headers={
             "Content-Disposition": f"attachment; filename=\"{export_filename}\"",
@@ -1,5 +1,5 @@
 # In app/models.py
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -22,6 +22,8 @@ class Analysis(Base):
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="analyses")
 
+    __table_args__ = (Index('ix_analyses_owner', 'owner_id'),)
+
 class AnalysisMeta(Base):
     __tablename__ = "analysis_meta"
     id = Column(Integer, primary_key=True, index=True)
@@ -30,11 +32,22 @@ class AnalysisMeta(Base):
     created_at = Column(String, nullable=True)
     extracted_text_json = Column(Text, nullable=True)
     page_images_json = Column(Text, nullable=True)
+    # Packed reference to page images kept in the page store; when set, page_images_json is unused
+    page_images_uri = Column(Text, nullable=True)
     risk_level = Column(String, nullable=True)
     risk_reason = Column(Text, nullable=True)
-    content_hash = Column(String, index=True, nullable=True)
+    content_hash = Column(String, nullable=True)
+    file_hash = Column(String, nullable=True)
     conversation_json = Column(Text, nullable=True)
 
+    # Duplicate detection always filters by owner, so the hashes are only indexed behind owner_id
+    __table_args__ = (
+        Index('ix_meta_owner_hash', 'owner_id', 'content_hash'),
+        Index('ix_meta_owner_file_hash', 'owner_id', 'file_hash'),
+        # Dashboard: owner's analyses newest first
+        Index('ix_meta_owner_created', 'owner_id', created_at.desc()),
+    )
+
 class TimelineEvent(Base):
     __tablename__ = "timeline_events"
     id = Column(Integer, primary_key=True, index=True)
@@ -0,0 +1,108 @@
+import os
+import re
+import base64
+import shutil
+import secrets
+import urllib.parse
+
+UPLOADS_DIR = os.path.join('data', 'uploads')
+# Pages written before their analysis row exists; moved under the analysis folder once it has an id
+STAGING_DIR = os.path.join(UPLOADS_DIR, 'staging')
+_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def _pages_dir(analysis_id: int, key: str) -> str:
+    return os.path.join(UPLOADS_DIR, f'analysis_{int(analysis_id)}', f'pages_{key}')
+
+
+def save_page_images(analysis_id: int, page_images: list[str]) -> list[str]:
+    """Writes data-URI page images to local storage and returns API-relative URLs for them.
+
+    The random per-analysis key makes the URLs unguessable, so <img> tags can load them without
+    an Authorization header. Entries that are not data URIs (e.g. GCS URLs) are returned unchanged.
+    """
+    return place_staged_pages(analysis_id, stage_page_images(page_images), page_images)
+
+
+def stage_page_images(page_images: list[str]) -> str:
+    """Writes the data-URI pages to a staging folder under a fresh key, before the analysis id is known.
+
+    The file writes happen here, so callers can do them outside a database transaction and only
+    call place_staged_pages (a directory rename) once the id has been assigned.
+    """
+    key = secrets.token_urlsafe(16)
+    folder = os.path.join(STAGING_DIR, key)
+    for idx, ref in enumerate(page_images):
+        if not (ref or "").startswith('data:image'):
+            continue
+        png_bytes = base64.b64decode(ref.split(',', 1)[1])
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f'page_{idx + 1}.png'), 'wb') as f:
+            f.write(png_bytes)
+    return key
+
+
+def place_staged_pages(analysis_id: int, key: str, page_images: list[str]) -> list[str]:
+    """Moves pages staged under `key` into the analysis folder and returns their URLs (see save_page_images)."""
+    staged = os.path.join(STAGING_DIR, key)
+    if os.path.isdir(staged):
+        folder = _pages_dir(analysis_id, key)
+        os.makedirs(os.path.dirname(folder), exist_ok=True)
+        os.replace(staged, folder)
+    return [
+        f"/analyses/{int(analysis_id)}/pages/{idx + 1}?k={key}" if (ref or "").startswith('data:image') else ref
+        for idx, ref in enumerate(page_images)
+    ]
+
+
+def discard_staged_pages(key: str) -> None:
+    """Removes pages staged under `key` that were never placed (e.g. the analysis insert failed)."""
+    shutil.rmtree(os.path.join(STAGING_DIR, key), ignore_errors=True)
+
+
+def delete_analysis_files(analysis_id: int) -> None:
+    """Removes the analysis folder: its stored pages (so their URLs stop resolving) and the original upload."""
+    shutil.rmtree(os.path.join(UPLOADS_DIR, f'analysis_{int(analysis_id)}'), ignore_errors=True)
+
+
+def pack_page_urls(analysis_id: int, urls: list[str]) -> str | None:
+    """Collapses the URL list from save_page_images into one page_images_uri string.
+
+    Returns None unless every entry is a stored page under the same key, in page order (e.g. when
+    some pages are remote references), in which case callers keep the full list instead.
+    """
+    m = re.match(r"^/analyses/\d+/pages/1\?k=([A-Za-z0-9_-]+)$", urls[0] if urls else "")
+    if not m:
+        return None
+    uri = f"/analyses/{int(analysis_id)}/pages?k={m.group(1)}&n={len(urls)}"
+    return uri if unpack_page_urls(uri) == urls else None
+
+
+def unpack_page_urls(uri: str) -> list[str]:
+    """Expands a page_images_uri back into per-page URLs without touching the disk."""
+    m = re.match(r"^/analyses/(\d+)/pages\?k=([A-Za-z0-9_-]+)&n=(\d+)$", uri or "")
+    if not m:
+        return []
+    analysis_id, key, count = int(m.group(1)), m.group(2), int(m.group(3))
+    return [f"/analyses/{analysis_id}/pages/{i}?k={key}" for i in range(1, count + 1)]
+
+
+def page_image_path(analysis_id: int, page_number: int, key: str) -> str | None:
+    """Returns the on-disk path of a stored page image, or None if the key/page is invalid."""
+    if not _KEY_RE.match(key or "") or page_number < 1:
+        return None
+    path = os.path.join(_pages_dir(analysis_id, key), f'page_{int(page_number)}.png')
+    return path if os.path.isfile(path) else None
+
+
+def read_local_page_image(ref: str) -> bytes | None:
+    """Reads the bytes behind a URL produced by save_page_images; None for any other reference."""
+    m = re.match(r"^/analyses/(\d+)/pages/(\d+)\?(.*)$", ref or "")
+    if not m:
+        return None
+    key = urllib.parse.parse_qs(m.group(3)).get('k', [''])[0]
+    path = page_image_path(int(m.group(1)), int(m.group(2)), key)
+    if not path:
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
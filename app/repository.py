@@ -1,23 +1,74 @@
+import io
 import os
-import base64
+import copy
+import itertools
+import binascii
+import random
 import datetime
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Iterable
 
+from cachetools import TTLCache
+
 try:
     from google.cloud import firestore
     from google.cloud import storage
 except Exception:  # Keep import-time failures non-fatal if Firestore not used
     firestore = None
     storage = None
+try:
+    from google.cloud.storage.retry import DEFAULT_RETRY
+except Exception:
+    DEFAULT_RETRY = None
+try:
+    from google.auth.credentials import Signing as _Signing
+    from google.auth.transport.requests import Request as _AuthRequest
+except Exception:
+    _Signing = None
+    _AuthRequest = None
+
+# Concurrent GCS uploads per request; throughput gains flatten well before API throttling
+_UPLOAD_WORKERS = 10
+DASHBOARD_PAGE_SIZE = 200
+# GCS object names, bound once instead of re-parsing the template per page
+_PDF_BLOB_NAME = "analyses/{}/original.pdf".format
+_PAGE_BLOB_NAME = "analyses/{}/page_{}.png".format
+_SIGNED_URL_TTL = timedelta(seconds=600)
+# Objects above 8 MiB go through a resumable session sent in chunks of this size
+_RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
 
 
 def is_firestore_enabled() -> bool:
     return (os.getenv("DB_BACKEND", "").lower() == "firestore") and firestore is not None
 
 
+# Clients open gRPC/HTTP channels and run credential discovery on construction, so build
+# them once per process and share them across requests (both clients are thread-safe)
+_client_lock = threading.Lock()
+# Each Firestore client owns one gRPC channel; a small pool spreads concurrent streams across
+# several HTTP/2 connections instead of queueing them behind one connection's stream limit
+_FS_POOL_SIZE = max(1, int(os.getenv("FIRESTORE_CLIENT_POOL", "4")))
+_FS_CLIENTS: list = []
+_fs_rr = itertools.count()
+_ST_CLIENT = None
+_BUCKET = None
+_BUCKET_NAME = None
+
+
 def _fs_client():
+    """Returns a shared Firestore client, round-robin across the pool."""
     if firestore is None:
         raise RuntimeError("google-cloud-firestore not installed/configured")
+    if not _FS_CLIENTS:
+        with _client_lock:
+            if not _FS_CLIENTS:
+                _FS_CLIENTS[:] = [_build_fs_client() for _ in range(_FS_POOL_SIZE)]
+    return _FS_CLIENTS[next(_fs_rr) % len(_FS_CLIENTS)]
+
+
+def _build_fs_client():
     project = os.getenv("GCP_PROJECT")
     db_id = os.getenv("FIRESTORE_DATABASE")
     # Let client pick up GOOGLE_APPLICATION_CREDENTIALS automatically
@@ -31,14 +82,45 @@ def _fs_client():
 
 
 def _st_client_bucket():
+    global _ST_CLIENT, _BUCKET, _BUCKET_NAME
     if storage is None:
         raise RuntimeError("google-cloud-storage not installed/configured")
     bucket_name = os.getenv("GCS_BUCKET")
     if not bucket_name:
         raise RuntimeError("GCS_BUCKET env var is required when using Firestore backend")
-    st = storage.Client()
-    bucket = st.bucket(bucket_name)
-    return st, bucket
+    if _BUCKET is not None and _BUCKET_NAME == bucket_name:
+        return _ST_CLIENT, _BUCKET
+    with _client_lock:
+        if _ST_CLIENT is None:
+            _ST_CLIENT = storage.Client()
+        if _BUCKET is None or _BUCKET_NAME != bucket_name:
+            _BUCKET = _ST_CLIENT.bucket(bucket_name)
+            _BUCKET_NAME = bucket_name
+        return _ST_CLIENT, _BUCKET
+
+
+def _signing_kwargs(st) -> dict:
+    """Extra generate_signed_url arguments for the storage client's (already cached) credentials.
+
+    Key-file credentials sign locally and need nothing. Metadata-server credentials (Cloud Run,
+    GCE) hold no private key, so they sign through IAM signBlob with the client's access token,
+    refreshed only when it has expired.
+    """
+    creds = getattr(st, "_credentials", None)
+    if creds is None or _Signing is None or isinstance(creds, _Signing):
+        return {}
+    with _client_lock:
+        if not creds.valid:
+            creds.refresh(_AuthRequest())
+    return {"service_account_email": creds.service_account_email, "access_token": creds.token}
+
+
+def reset_clients() -> None:
+    """Drops the cached Firestore/Storage clients (e.g. after changing env in tests)."""
+    global _ST_CLIENT, _BUCKET, _BUCKET_NAME
+    with _client_lock:
+        _FS_CLIENTS.clear()
+        _ST_CLIENT = _BUCKET = _BUCKET_NAME = None
 
 
 def _analyses_coll(db):
@@ -49,35 +131,149 @@ def _analysis_doc(db, analysis_id: int):
     return _analyses_coll(db).document(str(analysis_id))
 
 
+# An analysis never changes owner, so check_owner can skip the ownership read after the first one.
+# Entries are dropped on delete and expire for other workers; write paths never trust this cache and
+# re-check the owner inside their own transaction instead.
+_owner_cache: TTLCache = TTLCache(maxsize=4096, ttl=300)
+_owner_lock = threading.Lock()
+
+
+def _snapshot_owner(snap) -> int | None:
+    if not snap.exists:
+        return None
+    try:
+        return int((snap.to_dict() or {}).get("owner_id", 0))
+    except Exception:
+        return 0
+
+
+def _get_owner_only(db, analysis_id: int) -> int | None:
+    """Reads just owner_id from the root doc (skipping the large text/list fields); None if missing."""
+    with _owner_lock:
+        cached = _owner_cache.get(int(analysis_id))
+    if cached is not None:
+        return cached
+    owner = _snapshot_owner(_analysis_doc(db, analysis_id).get(field_paths=["owner_id"]))
+    if owner is None:
+        return None
+    with _owner_lock:
+        _owner_cache[int(analysis_id)] = owner
+    return owner
+
+
+# Short-lived copies of get_full_analysis results; UI flows re-open the same analysis in quick
+# succession. Every writer below calls _invalidate_full_analysis for the analysis it touches.
+_full_analysis_cache: TTLCache = TTLCache(maxsize=256, ttl=30)
+
+
+def _invalidate_full_analysis(analysis_id: int) -> None:
+    with _owner_lock:
+        _full_analysis_cache.pop(int(analysis_id), None)
+
+
 def _now_iso() -> str:
     return datetime.datetime.utcnow().isoformat() + "Z"
 
 
+def _message_sort_key(md: dict):
+    # Messages written before server timestamps carry ISO strings, which Firestore orders after
+    # every Timestamp; those legacy messages are always older, so they sort first
+    ts = md.get("ts")
+    if isinstance(ts, str) or ts is None:
+        return (0, ts or "", 0.0, 0)
+    return (1, "", ts.timestamp(), int(md.get("seq", 0)))
+
+
+_ID_SHARDS = 10
+
+
 def _next_analysis_id(db) -> int:
-    """Atomically increments and returns the next integer analysis id."""
-    counters = db.collection("counters").document("analyses")
+    """Allocates a unique integer analysis id from a randomly chosen counter shard.
+
+    Shard i only hands out ids congruent to i modulo _ID_SHARDS, so concurrent uploads contend on
+    one of ten documents instead of a single hot counter. Ids stay unique but are no longer
+    strictly sequential. A shard's first id starts at the legacy counters/analyses value so it
+    never collides with ids issued before sharding.
+    """
+    shard_idx = random.randrange(_ID_SHARDS)
+    legacy = db.collection("counters").document("analyses")
+    shard = legacy.collection("shards").document(str(shard_idx))
     txn = db.transaction()
 
     @firestore.transactional
     def txn_op(transaction):
-        snap = counters.get(transaction=transaction)
+        snap = shard.get(transaction=transaction)
         if snap.exists:
-            next_id = int(snap.get("next_id") or 1)
+            next_id = int(snap.get("next_id"))
         else:
-            next_id = 1
-        transaction.set(counters, {"next_id": next_id + 1}, merge=True)
+            legacy_snap = legacy.get(transaction=transaction)
+            floor = int((legacy_snap.to_dict() or {}).get("next_id") or 1) if legacy_snap.exists else 1
+            next_id = floor + (shard_idx - floor) % _ID_SHARDS
+        transaction.set(shard, {"next_id": next_id + _ID_SHARDS})
         return next_id
 
     return txn_op(txn)
 
 
+_BATCH_LIMIT = 450  # stay below Firestore 500 ops limit
+_LIST_PAGE_SIZE = 500
+_BULK_MAX_ATTEMPTS = 15  # BulkWriter's own default retry budget per write
+
+
+def _bulk_write(db, ops: Iterable[tuple]) -> None:
+    """Applies ("set", ref, data) / ("merge", ref, data) / ("delete", ref) writes.
+
+    Uses the client's BulkWriter, which keeps many commits in flight with built-in backoff; older
+    clients without it fall back to sequential batches. Ops must target distinct documents since
+    BulkWriter does not order writes. Raises RuntimeError if any write still fails after its retries.
+    """
+    bulk_writer = getattr(db, "bulk_writer", None)
+    if bulk_writer is not None:
+        bw = bulk_writer()
+        failures = []
+
+        def _on_error(error, _writer) -> bool:
+            # BulkWriter only reports failures through this callback; returning False gives up on the write
+            if error.attempts < _BULK_MAX_ATTEMPTS:
+                return True
+            failures.append(error)
+            return False
+
+        bw.on_write_error(_on_error)
+        for op in ops:
+            if op[0] == "delete":
+                bw.delete(op[1])
+            else:
+                bw.set(op[1], op[2], merge=(op[0] == "merge"))
+        bw.close()
+        if failures:
+            first = failures[0]
+            raise RuntimeError(f"{len(failures)} Firestore write(s) failed; first: {first.code} {first.message}")
+        return
+    batch = db.batch()
+    count = 0
+    for op in ops:
+        if op[0] == "delete":
+            batch.delete(op[1])
+        else:
+            batch.set(op[1], op[2], merge=(op[0] == "merge"))
+        count += 1
+        if count >= _BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            count = 0
+    if count:
+        batch.commit()
+
+
 def _decode_data_uri_png(data_uri: str) -> bytes:
     # Expected format: data:image/png;base64,<b64>
     if not data_uri.startswith("data:image"):
         return b""
     try:
-        b64 = data_uri.split(",", 1)[1]
-        return base64.b64decode(b64)
+        # Decode straight from a view past the comma instead of split()-copying the payload
+        raw = data_uri.encode("ascii")
+        return binascii.a2b_base64(memoryview(raw)[raw.index(b",") + 1:])
     except Exception:
         return b""
 
@@ -98,41 +294,78 @@ def create_analysis(owner_id: int, filename: str, assessment: str, key_info: lis
         "content_hash": None,
     }
     _analysis_doc(db, new_id).set(doc)
+    with _owner_lock:
+        _owner_cache[int(new_id)] = doc["owner_id"]
     return {"id": new_id, "created_at": created_at}
 
 
-def upload_original_pdf(analysis_id: int, content: bytes) -> str:
-    """Uploads the original PDF to GCS and returns a public URL if available, else empty string."""
+def _stored_object_url(blob) -> str:
+    """URL to persist for an uploaded object, computed locally with no per-object ACL call.
+
+    Public buckets (GCS_PUBLIC_BUCKET) get the permanent public URL; otherwise the object name is
+    stored and readers sign it on demand.
+    """
+    if (os.getenv("GCS_PUBLIC_BUCKET", "") or "").strip().lower() in ("1", "true", "yes", "on"):
+        return blob.public_url
+    return blob.name
+
+
+def _upload_kwargs(content_type: str) -> dict:
+    kwargs = {"content_type": content_type, "checksum": "crc32c"}
+    if DEFAULT_RETRY is not None:
+        kwargs["retry"] = DEFAULT_RETRY
+    return kwargs
+
+
+def _upload_bytes(blob, data: bytes, content_type: str) -> None:
+    """Uploads in-memory bytes with an explicit size so small objects use a single multipart request."""
+    blob.upload_from_file(io.BytesIO(data), size=len(data), **_upload_kwargs(content_type))
+
+
+def upload_original_pdf(analysis_id: int, content: bytes | str) -> str:
+    """Uploads the original PDF (bytes or a local file path) to GCS and returns a public URL if available, else empty string."""
     st, bucket = _st_client_bucket()
-    blob = bucket.blob(f"analyses/{analysis_id}/original.pdf")
-    blob.upload_from_string(content, content_type="application/pdf")
+    blob = bucket.blob(_PDF_BLOB_NAME(analysis_id), chunk_size=_RESUMABLE_CHUNK_SIZE)
+    if isinstance(content, str):
+        blob.upload_from_filename(content, **_upload_kwargs("application/pdf"))
+    else:
+        _upload_bytes(blob, content, "application/pdf")
+    # Recorded so signed-URL requests can skip a GCS existence probe
     try:
-        blob.make_public()
-        return blob.public_url
+        _analysis_doc(_fs_client(), analysis_id).set({"has_pdf": True}, merge=True)
     except Exception:
-        return ""
+        pass
+    url = _stored_object_url(blob)
+    return url if url.startswith("https://") else ""
 
 
 def get_original_pdf_signed_url(analysis_id: int, expires_seconds: int = 600) -> str | None:
-    """Returns a short-lived signed URL to the original PDF in GCS if it exists."""
-    from datetime import timedelta
-    st, bucket = _st_client_bucket()
-    blob = bucket.blob(f"analyses/{analysis_id}/original.pdf")
-    if not blob.exists():
+    """Returns a short-lived signed URL to the original PDF in GCS if one was uploaded.
+
+    Presence comes from the `has_pdf` flag set by upload_original_pdf; signing itself is local,
+    so no Storage round trip is needed. Older analyses without the flag return None and callers
+    fall back to streaming.
+    """
+    snap = _analysis_doc(_fs_client(), analysis_id).get(field_paths=["has_pdf"])
+    if not snap.exists or not (snap.to_dict() or {}).get("has_pdf"):
         return None
+    st, bucket = _st_client_bucket()
+    blob = bucket.blob(_PDF_BLOB_NAME(analysis_id))
     try:
-        url = blob.generate_signed_url(expiration=timedelta(seconds=expires_seconds), method="GET", version="v4")
+        url = blob.generate_signed_url(expiration=timedelta(seconds=expires_seconds), method="GET", version="v4", **_signing_kwargs(st))
         return url
     except Exception:
         return None
 
 
-def find_by_content_hash(owner_id: int, content_hash: str) -> int | None:
+def find_by_content_hash(owner_id: int, content_hash: str, field: str = "content_hash") -> int | None:
+    """Finds an owner's analysis by hash; `field` selects content_hash (extracted text) or file_hash (raw upload)."""
     db = _fs_client()
     q = (
         _analyses_coll(db)
         .where("owner_id", "==", int(owner_id or 0))
-        .where("content_hash", "==", content_hash)
+        .where(field, "==", content_hash)
+        .select([])  # only the id is needed
         .limit(1)
     )
     docs = list(q.stream())
@@ -141,78 +374,141 @@ def find_by_content_hash(owner_id: int, content_hash: str) -> int | None:
     return int(docs[0].id)
 
 
-def persist_meta(analysis_id: int, owner_id: int, pages: list[str], page_images: list[str], risk_level: str, risk_reason: str, content_hash: str) -> None:
+def persist_meta(analysis_id: int, owner_id: int, pages: list[str], page_images: list[str], risk_level: str, risk_reason: str, content_hash: str, file_hash: str | None = None) -> None:
     db = _fs_client()
     doc_ref = _analysis_doc(db, analysis_id)
     # Upsert scalar metadata
-    doc_ref.set(
-        {
-            "owner_id": int(owner_id or 0),
-            "risk_level": risk_level,
-            "risk_reason": risk_reason or "",
-            "content_hash": content_hash,
-        },
-        merge=True,
-    )
+    meta = {
+        "owner_id": int(owner_id or 0),
+        "risk_level": risk_level,
+        "risk_reason": risk_reason or "",
+        "content_hash": content_hash,
+    }
+    if file_hash:
+        meta["file_hash"] = file_hash
 
     # Persist pages as subcollection
     pages_coll = doc_ref.collection("pages")
-    # Clear any existing pages (best-effort)
-    for p in pages_coll.stream():
-        p.reference.delete()
+    existing_page_ids = [r.id for r in pages_coll.list_documents(page_size=_LIST_PAGE_SIZE)]
 
     # Upload images to GCS if provided
     urls: list[str] = []
     if page_images:
         st, bucket = _st_client_bucket()
-        for idx, data_uri in enumerate(page_images):
+
+        def _upload_page(idx: int, data_uri: str) -> str:
             png_bytes = _decode_data_uri_png(data_uri)
             if not png_bytes:
-                urls.append("")
-                continue
-            blob = bucket.blob(f"analyses/{analysis_id}/page_{idx+1}.png")
-            blob.upload_from_string(png_bytes, content_type="image/png")
-            # Make public if desired; otherwise, app could use signed URLs
-            try:
-                blob.make_public()
-                url = blob.public_url
-            except Exception:
-                url = blob.path
-            urls.append(url)
+                return ""
+            blob = bucket.blob(_PAGE_BLOB_NAME(analysis_id, idx + 1))
+            _upload_bytes(blob, png_bytes, "image/png")
+            return _stored_object_url(blob)
+
+        # Uploads are latency-bound HTTPS round-trips, so overlap them; map() keeps page order
+        with ThreadPoolExecutor(max_workers=min(_UPLOAD_WORKERS, len(page_images))) as pool:
+            urls = list(pool.map(_upload_page, range(len(page_images)), page_images))
 
     # Write page docs covering both text pages and image pages
     pg_list = pages or []
     total = max(len(pg_list), len(urls)) if urls else len(pg_list)
-    for i in range(total):
-        txt = pg_list[i] if i < len(pg_list) else ""
-        payload = {"index": i + 1, "text": txt or ""}
-        if urls and i < len(urls) and urls[i]:
-            payload["image_url"] = urls[i]
-        pages_coll.document(str(i + 1)).set(payload)
+
+    def _page_ops():
+        yield ("merge", doc_ref, meta)
+        # set() overwrites pages being rewritten; only stale pages past the new count are deleted
+        for pid in existing_page_ids:
+            if not pid.isdigit() or not (1 <= int(pid) <= total):
+                yield ("delete", pages_coll.document(pid))
+        for i in range(total):
+            txt = pg_list[i] if i < len(pg_list) else ""
+            payload = {"index": i + 1, "text": txt or ""}
+            if urls and i < len(urls) and urls[i]:
+                payload["image_url"] = urls[i]
+            yield ("set", pages_coll.document(str(i + 1)), payload)
+
+    _bulk_write(db, _page_ops())
+    _invalidate_full_analysis(analysis_id)
 
 
-def list_dashboard(owner_id: int) -> list[dict]:
+def _snapshot_field(snap, field: str, default=None):
+    try:
+        value = snap.get(field)
+    except KeyError:
+        return default
+    return default if value is None else value
+
+
+def list_dashboard(owner_id: int, page_size: int = DASHBOARD_PAGE_SIZE, after_id: int | None = None) -> list[dict]:
+    """Returns the owner's newest analyses first, at most `page_size` of them.
+
+    Ordering, limit and projection run server-side; pass the last item's `id` as
+    `after_id` to fetch the next page. Needs the composite index declared in
+    firestore.indexes.json; a missing index raises FailedPrecondition.
+    """
     db = _fs_client()
-    q = _analyses_coll(db).where("owner_id", "==", int(owner_id or 0))
+    q = (
+        _analyses_coll(db)
+        .where("owner_id", "==", int(owner_id or 0))
+        .order_by("created_at", direction=firestore.Query.DESCENDING)
+        .select(["filename", "created_at", "risk_level"])
+    )
+    if after_id:
+        cursor = _analysis_doc(db, after_id).get(field_paths=["owner_id", "created_at"])
+        if not cursor.exists or int(_snapshot_field(cursor, "owner_id", -1)) != int(owner_id or 0):
+            return []
+        # a snapshot cursor also carries the document name, so equal timestamps don't skip items
+        q = q.start_after(cursor)
     items = []
-    for doc in q.stream():
-        d = doc.to_dict() or {}
+    for doc in q.limit(int(page_size)).stream():
+        # snapshot.get() copies one field; to_dict() deep-copies the whole document
         items.append(
             {
                 "id": int(doc.id),
-                "filename": d.get("filename", ""),
-                "created_at": d.get("created_at"),
-                "risk_level": d.get("risk_level"),
+                "filename": _snapshot_field(doc, "filename", ""),
+                "created_at": _snapshot_field(doc, "created_at"),
+                "risk_level": _snapshot_field(doc, "risk_level"),
             }
         )
-    # Sort by created_at desc if present
-    items.sort(key=lambda x: x.get("created_at") or "", reverse=True)
     return items
 
 
 def get_full_analysis(analysis_id: int, owner_id: int) -> dict:
+    with _owner_lock:
+        cached = _full_analysis_cache.get(int(analysis_id))
+    # Callers get deep copies: a shallow one still shares the nested lists/dicts (key_info, pages,
+    # conversation) with the cached entry, so mutating a result would leak into later reads
+    if cached is not None and cached[0] == int(owner_id or 0):
+        return copy.deepcopy(cached[1])
+    result = _load_full_analysis(analysis_id, owner_id)
+    with _owner_lock:
+        _full_analysis_cache[int(analysis_id)] = (int(owner_id or 0), result)
+    return copy.deepcopy(result)
+
+
+def _load_full_analysis(analysis_id: int, owner_id: int) -> dict:
     db = _fs_client()
-    snap = _analysis_doc(db, analysis_id).get()
+    ref = _analysis_doc(db, analysis_id)
+    pages_coll = ref.collection("pages")
+    convo_coll = ref.collection("conversation")
+    timeline_coll = ref.collection("timeline_events")
+
+    def _conversation_docs():
+        # Ensure deterministic order by timestamp if available
+        try:
+            return list(convo_coll.order_by("ts").stream())
+        except Exception:
+            return list(convo_coll.stream())
+
+    # The root doc and the three subcollections are independent reads; issue them together
+    # so latency is the slowest read rather than the sum of all four
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        snap_f = pool.submit(ref.get)
+        pages_f = pool.submit(lambda: list(pages_coll.stream()))
+        convo_f = pool.submit(_conversation_docs)
+        timeline_f = pool.submit(lambda: list(timeline_coll.stream()))
+        snap = snap_f.result()
+        page_docs = pages_f.result()
+        convo_docs = convo_f.result()
+        timeline_docs = timeline_f.result()
     if not snap.exists:
         raise ValueError("Analysis not found")
     d = snap.to_dict() or {}
@@ -220,53 +516,50 @@ def get_full_analysis(analysis_id: int, owner_id: int) -> dict:
         raise ValueError("Analysis not found")
 
     # Pages
-    pages_coll = snap.reference.collection("pages")
-    page_docs = list(pages_coll.stream())
     # Sort by page index
     page_docs.sort(key=lambda p: int(p.id))
-    extracted_text = [(p.to_dict() or {}).get("text", "") for p in page_docs]
-    # Build accessible image URLs (prefer stored http URLs; else generate signed URLs)
-    image_urls: list[str] = []
-    try:
-        st, bucket = _st_client_bucket()
-    except Exception:
-        st = bucket = None
-    for p in page_docs:
-        pd = p.to_dict() or {}
-        url = (pd.get("image_url") or "").strip()
-        if url.startswith("http://") or url.startswith("https://"):
-            image_urls.append(url)
-            continue
-        # Fallback: generate signed URL for known object path
-        if bucket is not None:
-            try:
-                from datetime import timedelta as _td
-                idx = int(p.id)
-                blob = bucket.blob(f"analyses/{analysis_id}/page_{idx}.png")
-                if blob.exists():
-                    su = blob.generate_signed_url(expiration=_td(seconds=600), method="GET", version="v4")
-                    image_urls.append(su)
-            except Exception:
-                pass
+    page_dicts = [p.to_dict() or {} for p in page_docs]
+    extracted_text = [pd.get("text", "") for pd in page_dicts]
+    # Build accessible image URLs (prefer stored http URLs; else sign the stored object path).
+    # No exists() probe: only pages recorded with an image are signed.
+    stored_urls = [(pd.get("image_url") or "").strip() for pd in page_dicts]
+    to_sign = [i for i, url in enumerate(stored_urls) if url and not url.startswith(("http://", "https://"))]
+    if to_sign:
+        try:
+            st, bucket = _st_client_bucket()
+            sign_kwargs = _signing_kwargs(st)
+
+            def _sign(i: int) -> str:
+                try:
+                    blob = bucket.blob(_PAGE_BLOB_NAME(analysis_id, int(page_docs[i].id)))
+                    return blob.generate_signed_url(expiration=_SIGNED_URL_TTL, method="GET", version="v4", **sign_kwargs)
+                except Exception:
+                    return ""
+
+            if sign_kwargs:
+                # IAM signBlob is one HTTPS call per URL, so overlap them
+                with ThreadPoolExecutor(max_workers=min(_UPLOAD_WORKERS, len(to_sign))) as pool:
+                    signed_urls = list(pool.map(_sign, to_sign))
+            else:
+                # Local key signing is pure CPU; threads would only add overhead
+                signed_urls = [_sign(i) for i in to_sign]
+            for i, signed in zip(to_sign, signed_urls):
+                stored_urls[i] = signed
+        except Exception:
+            for i in to_sign:
+                stored_urls[i] = ""
+    image_urls = [u for u in stored_urls if u.startswith(("http://", "https://"))]
 
     # Conversation
-    convo_coll = snap.reference.collection("conversation")
     messages = []
-    # Ensure deterministic order by timestamp if available
-    try:
-        convo_stream = convo_coll.order_by("ts").stream()
-    except Exception:
-        convo_stream = convo_coll.stream()
-    for m in convo_stream:
-        md = m.to_dict() or {}
+    for md in sorted((m.to_dict() or {} for m in convo_docs), key=_message_sort_key):
         role = md.get("role", "user")
         content = md.get("content", "")
         messages.append({"role": role, "content": content})
 
     # Timeline
-    timeline_coll = snap.reference.collection("timeline_events")
     events = []
-    for ev in timeline_coll.stream():
+    for ev in timeline_docs:
         ed = ev.to_dict() or {}
         events.append({
             "id": None,  # Firestore has no numeric id requirement for events
@@ -294,50 +587,68 @@ def get_full_analysis(analysis_id: int, owner_id: int) -> dict:
 
 def append_conversation_message(analysis_id: int, owner_id: int, user_message: dict, assistant_message: dict) -> None:
     db = _fs_client()
-    snap = _analysis_doc(db, analysis_id).get()
-    if not snap.exists:
-        return
-    if int((snap.to_dict() or {}).get("owner_id", 0)) != int(owner_id or 0):
-        return
-    convo = snap.reference.collection("conversation")
-    # We don't guarantee ordering; Firestore timestamps can be added if needed
-    convo.add({"role": user_message.get("role", "user"), "content": user_message.get("content", ""), "ts": _now_iso()})
-    convo.add({"role": assistant_message.get("role", "assistant"), "content": assistant_message.get("content", ""), "ts": _now_iso()})
+    ref = _analysis_doc(db, analysis_id)
+    convo = ref.collection("conversation")
+    user_ref, assistant_ref = convo.document(), convo.document()
+
+    # The owner read and both message writes commit together, so a concurrent delete can never be
+    # followed by orphan messages. Server-assigned timestamps: native Timestamp ordering and no
+    # client clock skew. Both messages share one commit (and so one timestamp); seq keeps the user
+    # turn first.
+    @firestore.transactional
+    def txn_op(transaction) -> bool:
+        snap = ref.get(field_paths=["owner_id"], transaction=transaction)
+        if _snapshot_owner(snap) != int(owner_id or 0):
+            return False
+        transaction.set(user_ref, {"role": user_message.get("role", "user"), "content": user_message.get("content", ""), "ts": firestore.SERVER_TIMESTAMP, "seq": 0})
+        transaction.set(assistant_ref, {"role": assistant_message.get("role", "assistant"), "content": assistant_message.get("content", ""), "ts": firestore.SERVER_TIMESTAMP, "seq": 1})
+        return True
+
+    if txn_op(db.transaction()):
+        _invalidate_full_analysis(analysis_id)
 
 
 def replace_timeline(analysis_id: int, owner_id: int, events: Iterable[dict], lifecycle_summary: str) -> list[dict]:
     db = _fs_client()
-    snap = _analysis_doc(db, analysis_id).get()
-    if not snap.exists:
-        return []
-    if int((snap.to_dict() or {}).get("owner_id", 0)) != int(owner_id or 0):
-        return []
-    coll = snap.reference.collection("timeline_events")
-    # Delete existing
-    for ev in coll.stream():
-        ev.reference.delete()
+    ref = _analysis_doc(db, analysis_id)
+    coll = ref.collection("timeline_events")
     stored = []
     for e in events or []:
         date_str = (e.get("date") or "").strip()
         if not date_str:
             continue
-        payload = {
+        stored.append({
             "date": date_str,
             "label": (e.get("label") or "").strip(),
             "kind": (e.get("kind") or "key_date").strip() or "key_date",
             "description": (e.get("description") or "").strip(),
-        }
-        ref = coll.document()
-        ref.set(payload)
-        stored.append(payload)
-    # Store lifecycle summary at root
-    snap.reference.set({"lifecycle_summary": lifecycle_summary or ""}, merge=True)
+        })
+
+    # Owner check, old-event deletes and new-event writes commit atomically (timelines stay far below
+    # the 500-write transaction limit). update() rather than a merge-set, so a deleted analysis is
+    # never re-created as an ownerless root doc.
+    @firestore.transactional
+    def txn_op(transaction) -> bool:
+        snap = ref.get(field_paths=["owner_id"], transaction=transaction)
+        if _snapshot_owner(snap) != int(owner_id or 0):
+            return False
+        old_refs = [ev.reference for ev in coll.stream(transaction=transaction)]
+        for r in old_refs:
+            transaction.delete(r)
+        for payload in stored:
+            transaction.set(coll.document(), payload)
+        transaction.update(ref, {"lifecycle_summary": lifecycle_summary or ""})
+        return True
+
+    if not txn_op(db.transaction()):
+        return []
+    _invalidate_full_analysis(analysis_id)
     return stored
 
 
 def list_timeline(analysis_id: int, owner_id: int) -> tuple[str, list[dict]]:
     db = _fs_client()
-    snap = _analysis_doc(db, analysis_id).get()
+    snap = _analysis_doc(db, analysis_id).get(field_paths=["owner_id", "lifecycle_summary"])
     if not snap.exists:
         return "", []
     if int((snap.to_dict() or {}).get("owner_id", 0)) != int(owner_id or 0):
@@ -359,37 +670,36 @@ def list_timeline(analysis_id: int, owner_id: int) -> tuple[str, list[dict]]:
 
 def check_owner(analysis_id: int, owner_id: int) -> bool:
     """Lightweight ownership/existence check without loading subcollections."""
-    db = _fs_client()
-    ref = _analysis_doc(db, analysis_id)
-    snap = ref.get()
-    if not snap.exists:
-        return False
+    doc_owner = _get_owner_only(_fs_client(), analysis_id)
+    return doc_owner is not None and doc_owner == int(owner_id or 0)
+
+def _delete_analysis_objects(analysis_id: int) -> None:
+    """Best-effort removal of the analysis's stored original PDF and page images."""
     try:
-        doc_owner = int((snap.to_dict() or {}).get("owner_id", 0))
-    except Exception:
-        doc_owner = 0
-    return doc_owner == int(owner_id or 0)
+        _, bucket = _st_client_bucket()
+        for blob in bucket.list_blobs(prefix=f"analyses/{int(analysis_id)}/"):
+            blob.delete()
+    except Exception as e:
+        print(f"Could not delete stored objects of analysis {analysis_id}: {e}")
 
 def delete_analysis(analysis_id: int) -> bool:
-    """Delete an analysis and its subcollections efficiently using batched writes."""
+    """Delete an analysis and its subcollections with one bulk write."""
     db = _fs_client()
     ref = _analysis_doc(db, analysis_id)
-    snap = ref.get()
-    if not snap.exists:
+    with _owner_lock:
+        _owner_cache.pop(int(analysis_id), None)
+    if not ref.get(field_paths=["owner_id"]).exists:
         return True
-    # Batched delete for subcollections to reduce round-trips
-    for coll_name in ("pages", "timeline_events", "conversation"):
-        coll = ref.collection(coll_name)
-        batch = db.batch()
-        count = 0
-        for d in coll.stream():
-            batch.delete(d.reference)
-            count += 1
-            if count >= 450:  # stay below Firestore 500 ops limit
-                batch.commit()
-                batch = db.batch()
-                count = 0
-        if count:
-            batch.commit()
+    # The root doc goes first: chat and timeline transactions re-read it, so nothing can be written
+    # under the analysis once it is gone, and the subcollection listing below sees every earlier write.
     ref.delete()
+
+    def _delete_ops():
+        for coll_name in ("pages", "timeline_events", "conversation"):
+            for r in ref.collection(coll_name).list_documents(page_size=_LIST_PAGE_SIZE):
+                yield ("delete", r)
+
+    _bulk_write(db, _delete_ops())
+    _invalidate_full_analysis(analysis_id)
+    _delete_analysis_objects(analysis_id)
     return True
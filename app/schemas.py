@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from typing import List, Dict, Optional
 
 class KeyInfoItem(BaseModel):
@@ -13,6 +13,10 @@ class ActionItem(BaseModel):
     is_negotiable: bool
     is_benchmarkable: bool
 
+# One-shot (de)serializers for the stored key_info/actions JSON columns
+KeyInfoList = TypeAdapter(List[KeyInfoItem])
+ActionList = TypeAdapter(List[ActionItem])
+
 class IntelligentAnalysis(BaseModel):
     key_info: List[KeyInfoItem]
     identified_actions: List[ActionItem] # Changed from List[str]
@@ -31,12 +35,12 @@ class IntelligentAnalysis(BaseModel):
 # --- Keep the other schemas as they are ---
 class AnalysisResult(BaseModel):
     id: int; filename: str; assessment: str
-    class Config: from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class UserCreate(BaseModel): email: str; password: str
 class User(BaseModel):
     id: int; email: str
-    class Config: from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 class Token(BaseModel): access_token: str; token_type: str
 
 class SimulationRequest(BaseModel):
@@ -44,12 +48,22 @@ class SimulationRequest(BaseModel):
 
 class SimulationResponse(BaseModel): simulation_text: str
 
+# Clauses per /simulate/batch or /benchmark/batch request; same cap as an analysis's risk highlights
+MAX_BATCH_CLAUSES = 12
+
+class SimulationBatchRequest(BaseModel):
+    clauses: List[str] = Field(max_length=MAX_BATCH_CLAUSES); document_context: str; key_info: List[Dict]
+
+class SimulationBatchResponse(BaseModel): simulations: list[str]
+
 class RewriteRequest(BaseModel):
     clause_key: str; clause_text: str; document_context: str
 
 class RewriteResponse(BaseModel): rewritten_clauses: list[str]
 class BenchmarkRequest(BaseModel): clause_text: str; clause_key: str
 class BenchmarkResponse(BaseModel): benchmark_result: str; examples: list[str]
+class BenchmarkBatchRequest(BaseModel): clause_texts: list[str] = Field(max_length=MAX_BATCH_CLAUSES)
+class BenchmarkBatchResponse(BaseModel): results: list[BenchmarkResponse]
 class ChatMessage(BaseModel):
     role: str
     content: str
@@ -63,6 +77,13 @@ class QueryResponse(BaseModel):
     answer: str
     citation: Optional[str] = None  
 
+# Structured-output schema (OpenAPI subset accepted by Gemini/Vertex) for Q&A model responses
+QUERY_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {"answer": {"type": "string"}, "citation": {"type": "string"}},
+    "required": ["answer", "citation"],
+}
+
 class DashboardItem(BaseModel):
     id: int
     filename: str
@@ -127,3 +148,7 @@ class LocateRequest(BaseModel):
 
 class LocateResponse(BaseModel):
     matches: List[AnchorMatch] = Field(default_factory=list)
+
+# Resolve the "AnchorMatch" forward refs now rather than on first validation in a request
+IntelligentAnalysis.model_rebuild()
+FullAnalysisResponse.model_rebuild()
@@ -1,5 +1,5 @@
 import os
-import json
+import orjson
 import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -11,16 +11,44 @@ try:
 except Exception:
     documentai = None
 import google.auth
-import base64
+try:
+    from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+except Exception:
+    ResourceExhausted = ServiceUnavailable = None
+import time
+import functools
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import sqlite3
 import numpy as np
+try:
+    import sqlite_vec
+except Exception:
+    sqlite_vec = None
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+try:
+    # SIMD base64 for data-URI page images; the stdlib decoder gives identical bytes
+    from pybase64 import b64decode as _b64decode
+except Exception:
+    from base64 import b64decode as _b64decode
 import hashlib
 import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 import re
-from app import models, schemas
+import bisect
+import heapq
+import concurrent.futures
+from cachetools import LRUCache
+from app import models, schemas, llm_cache
 from app import repository as fs_repo
+from app import page_store, cpu_pool
+from app.vectors import quantize_int8, int8_unit_query
 
 # Load environment variables
 load_dotenv()
@@ -76,102 +104,276 @@ else:
         HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
     }
 
+# Bound in-flight Gemini calls and space out their starts so bursts (e.g. per-page analysis of a
+# long document) stay under quota instead of fanning out into 429s and retries
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "8"))
+GEMINI_MIN_INTERVAL = float(os.getenv("GEMINI_MIN_INTERVAL_MS", "100")) / 1000.0
+GEMINI_MAX_RETRIES = 3
+_gemini_sem = asyncio.Semaphore(GEMINI_CONCURRENCY)
+
+
+class _RateLimiter:
+    """Enforces a minimum interval between request starts across all coroutines."""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.last_ts = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.min_interval <= 0:
+            return
+        async with self._lock:
+            wait = self.min_interval - (time.monotonic() - self.last_ts)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_ts = time.monotonic()
+
+
+_gemini_rate = _RateLimiter(GEMINI_MIN_INTERVAL)
+_RETRYABLE = tuple(e for e in (ResourceExhausted, ServiceUnavailable) if e is not None)
+
+
+async def _generate_content(prompt, **kwargs):
+    """model.generate_content_async behind the shared semaphore/rate limiter, retrying 429/503 with backoff."""
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        async with _gemini_sem:
+            await _gemini_rate.acquire()
+            try:
+                return await model.generate_content_async(prompt, **kwargs)
+            except _RETRYABLE as e:
+                if attempt == GEMINI_MAX_RETRIES:
+                    raise
+                print(f"Gemini throttled ({e.__class__.__name__}); retrying in {2 ** attempt}s")
+        await asyncio.sleep(2 ** attempt)
+
+# Simple sentence split heuristic
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
 # Enforce concise assessments (2-3 sentences, reasonable length)
 def _shorten_assessment(text: str, max_sentences: int = 3, max_chars: int = 600) -> str:
     try:
         if not text:
             return text
-        s = " ".join((text or "").split())
-        # Simple sentence split heuristic
-        parts = re.split(r"(?<=[\.!?])\s+", s)
-        if not parts:
-            parts = [s]
+        # Common case: already short with few terminators, so the split/rejoin below can't clip anything
+        if len(text) <= max_chars and sum(text.count(c) for c in ".!?") <= max_sentences:
+            t = text.strip()
+            if not t or t[-1] in ".!?":
+                return t
+        s = " ".join(text.split())
+        # maxsplit: sentences past the limit are dropped anyway
+        parts = _SENTENCE_RE.split(s, maxsplit=max_sentences)
         clipped = " ".join(parts[:max_sentences]).strip()
         if len(clipped) > max_chars:
-            clipped = (clipped[: max(0, max_chars - 1)].rstrip() + "…") if len(clipped) > 0 else clipped
+            clipped = clipped[: max(0, max_chars - 1)].rstrip() + "…"
         return clipped
     except Exception:
         return text
 
 # ---- OCR Function (Swapped to Document AI with Vision fallback) ----
-async def extract_text_with_ocr(image_bytes_list: list[bytes]) -> list[str]:
-    """Runs OCR for a list of page images and returns a list of per-page texts.
+_OCR_CLIENTS: dict = {}
+_OCR_CLIENTS_LOCK = threading.Lock()
 
-    Preference order:
-    1) Document AI (if configured/available)
-    2) Fallback to Cloud Vision (previous behavior)
+
+def get_ocr_client(cls):
+    """Returns a shared instance of a Vision/Document AI client class.
+
+    Clients own gRPC channels and credentials, so building one per call repeats channel setup and
+    TLS handshakes. Async clients are bound to the loop that created them and are cached per loop.
+    """
+    key = (cls, asyncio.get_running_loop()) if "Async" in cls.__name__ else cls
+    client = _OCR_CLIENTS.get(key)
+    if client is None:
+        with _OCR_CLIENTS_LOCK:
+            client = _OCR_CLIENTS.get(key)
+            if client is None:
+                client = _OCR_CLIENTS[key] = cls()
+    return client
+
+
+_docai_name: str | None = None
+
+def _docai_processor_name() -> str | None:
+    """Full Document AI processor path, or None when Document AI isn't installed/configured.
+
+    Resolved once: DOCAI_PROJECT_ID falls back to the ADC project, and google.auth.default() can
+    read credential files and probe the metadata server, which the per-page OCR paths shouldn't repeat.
+    Only a resolved path is kept, so a transient credentials failure is retried on the next call.
     """
+    global _docai_name
+    if _docai_name is None:
+        _docai_name = _resolve_docai_processor_name()
+    return _docai_name
+
+
+def _resolve_docai_processor_name() -> str | None:
     processor_id = os.environ.get("DOCAI_PROCESSOR_ID")
+    if documentai is None or not processor_id:
+        return None
     location = os.environ.get("DOCAI_LOCATION", "us")
     project_id = os.environ.get("DOCAI_PROJECT_ID")
     if not project_id:
         try:
-            creds, default_project = google.auth.default()
-            if default_project:
-                project_id = default_project
+            creds, project_id = google.auth.default()
         except Exception:
             project_id = None
+    if not project_id:
+        return None
+    return documentai.DocumentProcessorServiceClient.processor_path(project_id, location, processor_id)
+
+
+# Document AI online processing accepts up to 15 pages per request
+DOCAI_PAGES_PER_REQUEST = 15
+# Vision's synchronous batch_annotate_images accepts up to 16 images per call
+VISION_IMAGES_PER_REQUEST = 16
+
+
+def _pages_to_pdf(images: list[bytes]) -> bytes:
+    """Packs page PNGs into one PDF so Document AI can OCR them in a single request."""
+    import fitz  # PyMuPDF
+    doc = fitz.open()
+    try:
+        for img in images:
+            with fitz.open(stream=img, filetype="png") as im:
+                rect = im[0].rect
+            page = doc.new_page(width=rect.width, height=rect.height)
+            page.insert_image(rect, stream=img)
+        return doc.tobytes(deflate=True, garbage=3)
+    finally:
+        doc.close()
+
+
+def _docai_page_texts(document, expected: int) -> list[str]:
+    """Splits a multi-page Document AI result into per-page text via each page's text anchors."""
+    full = getattr(document, "text", "") or ""
+    texts = []
+    for page in getattr(document, "pages", []) or []:
+        segments = page.layout.text_anchor.text_segments
+        texts.append("".join(full[int(seg.start_index):int(seg.end_index)] for seg in segments))
+    texts += [""] * (expected - len(texts))
+    return texts[:expected]
+
+
+# OCR output depends only on the page pixels, so cached text stays valid far longer than LLM answers
+OCR_CACHE_TTL_SECONDS = 30 * 86400
+
+
+async def extract_text_with_ocr(image_bytes_list: list[bytes]) -> list[str]:
+    """Runs OCR for a list of page images and returns a list of per-page texts.
+
+    Pages seen before (same image bytes) are served from the local cache; only misses are sent out.
+    """
+    keys = [llm_cache.input_hash("ocr_page", hashlib.sha256(img).hexdigest()) for img in image_bytes_list]
+    hits = await asyncio.to_thread(llm_cache.get_many, keys)
+    misses = [i for i, k in enumerate(keys) if k not in hits]
+    if not misses:
+        return [hits[k] for k in keys]
+    miss_texts = await _ocr_pages([image_bytes_list[i] for i in misses])
+    if len(miss_texts) != len(misses):
+        # Whole-request failure (single error entry); nothing to merge or cache
+        return miss_texts
+    fresh = {keys[i]: t for i, t in zip(misses, miss_texts) if t and t.strip() and not t.startswith("Error: OCR")}
+    if fresh:
+        await asyncio.to_thread(llm_cache.put_many, fresh, OCR_CACHE_TTL_SECONDS)
+    by_index = dict(zip(misses, miss_texts))
+    return [by_index[i] if i in by_index else hits[k] for i, k in enumerate(keys)]
+
+
+async def _ocr_pages(image_bytes_list: list[bytes]) -> list[str]:
+    """Runs OCR for a list of page images and returns a list of per-page texts.
+
+    Preference order:
+    1) Document AI (if configured/available); pages of a failed request group are re-read with Vision
+    2) Fallback to Cloud Vision (previous behavior)
+    """
+    docai_name = _docai_processor_name()
 
     # Try Document AI first when processor info is available
-    if processor_id and project_id and documentai is not None:
+    if docai_name:
         try:
+            groups = [image_bytes_list[i:i + DOCAI_PAGES_PER_REQUEST] for i in range(0, len(image_bytes_list), DOCAI_PAGES_PER_REQUEST)]
             try:
-                da_client = documentai.DocumentProcessorServiceAsyncClient()
-                name = da_client.processor_path(project_id, location, processor_id)
+                da_client = get_ocr_client(documentai.DocumentProcessorServiceAsyncClient)
+                # One request per group of pages (packed into a PDF) instead of one per page
+                pdfs = await asyncio.gather(*[asyncio.to_thread(_pages_to_pdf, g) for g in groups])
                 tasks = []
-                for img in image_bytes_list:
-                    raw_document = documentai.RawDocument(content=img, mime_type="image/png")
-                    req = documentai.ProcessRequest(name=name, raw_document=raw_document)
+                for pdf in pdfs:
+                    raw_document = documentai.RawDocument(content=pdf, mime_type="application/pdf")
+                    req = documentai.ProcessRequest(name=docai_name, raw_document=raw_document)
                     tasks.append(da_client.process_document(request=req))
                 responses = await asyncio.gather(*tasks, return_exceptions=True)
-                page_texts: list[str] = []
-                for r in responses:
+                results: list[list[str] | None] = []
+                for group, r in zip(groups, responses):
                     if isinstance(r, Exception):
-                        print(f"Document AI error for one page: {r}")
-                        page_texts.append("")
+                        print(f"Document AI error for {len(group)} page(s): {r}")
+                        results.append(None)
                         continue
-                    txt = ""
-                    if getattr(r, "document", None) and getattr(r.document, "text", ""):
-                        txt = r.document.text
-                    page_texts.append(txt)
-                # If at least one page produced text, return the list
-                if any(t.strip() for t in page_texts):
-                    return page_texts
+                    results.append(_docai_page_texts(getattr(r, "document", None), len(group)))
             except Exception as e_async:
                 # Fallback to sync client in thread executor
                 print(f"Doc AI async client unavailable, trying sync: {e_async}")
-                da_client_sync = documentai.DocumentProcessorServiceClient()
-                name = da_client_sync.processor_path(project_id, location, processor_id)
+                da_client_sync = get_ocr_client(documentai.DocumentProcessorServiceClient)
                 loop = asyncio.get_event_loop()
 
-                def _process_one(img: bytes) -> str:
-                    raw_document = documentai.RawDocument(content=img, mime_type="image/png")
-                    req = documentai.ProcessRequest(name=name, raw_document=raw_document)
-                    resp = da_client_sync.process_document(request=req)
+                def _process_group(images: list[bytes]) -> list[str] | None:
+                    raw_document = documentai.RawDocument(content=_pages_to_pdf(images), mime_type="application/pdf")
+                    req = documentai.ProcessRequest(name=docai_name, raw_document=raw_document)
                     try:
-                        return resp.document.text if resp and resp.document else ""
+                        resp = da_client_sync.process_document(request=req)
+                        return _docai_page_texts(resp.document if resp else None, len(images))
                     except Exception as e:
-                        print(f"Document AI sync error for one page: {e}")
-                        return ""
-
-                texts = await asyncio.gather(*[loop.run_in_executor(None, _process_one, img) for img in image_bytes_list])
-                if any(t.strip() for t in texts):
-                    return list(texts)
+                        print(f"Document AI sync error for {len(images)} page(s): {e}")
+                        return None
+
+                results = await asyncio.gather(*[loop.run_in_executor(None, _process_group, g) for g in groups])
+            page_texts = await _vision_fill_failed_groups(groups, results)
+            # If at least one page produced text, return the list
+            if any(t.strip() for t in page_texts):
+                return page_texts
         except Exception as e:
             print(f"Document AI OCR failed, will try Vision fallback: {e}")
 
     # Vision fallback (keeps app behavior if Doc AI not configured)
+    return await _vision_ocr_pages(image_bytes_list)
+
+
+async def _vision_fill_failed_groups(groups: list[list[bytes]], results: list[list[str] | None]) -> list[str]:
+    """Flattens per-group Document AI texts; a failed group (None) is re-read with Vision, so one failed
+    request costs a fallback for its own pages rather than blanking all of them."""
+    failed = [g for g, texts in zip(groups, results) if texts is None]
+    retried: list[str] = []
+    if failed:
+        images = [img for g in failed for img in g]
+        retried = await _vision_ocr_pages(images)
+        if len(retried) != len(images) or any(t.startswith("Error: OCR") for t in retried):
+            # Whole-request Vision failure: those pages stay blank
+            retried = [""] * len(images)
+    page_texts: list[str] = []
+    pos = 0
+    for group, texts in zip(groups, results):
+        if texts is None:
+            texts = retried[pos:pos + len(group)]
+            pos += len(group)
+        page_texts.extend(texts)
+    return page_texts
+
+
+async def _vision_ocr_pages(image_bytes_list: list[bytes]) -> list[str]:
+    """Cloud Vision OCR of each page image; a whole-request failure returns a single error entry."""
     try:
-        client = vision.ImageAnnotatorAsyncClient()
+        client = get_ocr_client(vision.ImageAnnotatorAsyncClient)
         requests = []
         for image_content in image_bytes_list:
             image = vision.Image(content=image_content)
             features = [vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
             requests.append(vision.AnnotateImageRequest(image=image, features=features))
 
-        response = await client.batch_annotate_images(requests=requests)
+        # Sync batches are capped at VISION_IMAGES_PER_REQUEST images; send the shards concurrently
+        shards = [requests[i:i + VISION_IMAGES_PER_REQUEST] for i in range(0, len(requests), VISION_IMAGES_PER_REQUEST)]
+        responses = await asyncio.gather(*[client.batch_annotate_images(requests=shard) for shard in shards])
         page_texts: list[str] = []
-        for annotation in response.responses:
+        for annotation in (a for response in responses for a in response.responses):
             if annotation.error.message:
                 print(f"Cloud Vision API Error for one page: {annotation.error.message}")
             txt = ""
@@ -193,9 +395,9 @@ async def extract_text_with_ocr(image_bytes_list: list[bytes]) -> list[str]:
 
 # ... (keep all other functions and imports) ...
 
-async def get_intelligent_analysis(text: str) -> IntelligentAnalysis:
-    if not model: raise ValueError("Generative model not initialized.")
-    prompt = f"""
+# Static parts of the analysis prompt, built once; the per-call prompt is a plain concatenation
+# (runs for every chunk in process_large_document, so skip re-formatting the multi-KB template)
+_IA_PROMPT_HEAD = """
     You are a meticulous legal analyst AI. Your sole purpose is to extract, classify, and summarize information directly from the provided text. Adhere strictly to all instructions.
 
     ### Instruction 1: Extract Key Information (`key_info`)
@@ -214,26 +416,31 @@ async def get_intelligent_analysis(text: str) -> IntelligentAnalysis:
 
     ### JSON Output Schema:
     Respond ONLY with a valid JSON object that follows this exact schema.
-    {{
+    {
       "key_info": [
-        {{ "key": "Monthly Rent", "value": "...", "is_negotiable": true, "is_benchmarkable": true }}
+        { "key": "Monthly Rent", "value": "...", "is_negotiable": true, "is_benchmarkable": true }
       ],
       "identified_actions": [
-        {{ "text": "Tenant shall pay a security deposit of ₹50,000.", "is_negotiable": true, "is_benchmarkable": true }}
+        { "text": "Tenant shall pay a security deposit of ₹50,000.", "is_negotiable": true, "is_benchmarkable": true }
       ],
       "assessment": "..."
-    }}
+    }
 
     ### Document Text to Analyze:
     ---
-    {text}
+    """
+_IA_PROMPT_TAIL = """
     ---
     """
+
+async def get_intelligent_analysis(text: str) -> IntelligentAnalysis:
+    if not model: raise ValueError("Generative model not initialized.")
+    prompt = _IA_PROMPT_HEAD + text + _IA_PROMPT_TAIL
     try:
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS)
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS)
         if not response.text: raise ValueError(f"AI response blocked. Details: {response.prompt_feedback}")
         cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        data = json.loads(cleaned_response)
+        data = orjson.loads(cleaned_response)
         # Ensure assessment stays concise
         if isinstance(data, dict) and isinstance(data.get("assessment"), str):
             data["assessment"] = _shorten_assessment(data["assessment"])
@@ -246,18 +453,32 @@ async def get_intelligent_analysis(text: str) -> IntelligentAnalysis:
         )
 
 # ---- UPDATED: Function to Summarize a Single Chunk ----
+SUMMARY_STREAM_CHARS = 800
+# The risk verdict is a level plus one short paragraph; cap output so a rambling reply can't run long
+RISK_MAX_OUTPUT_TOKENS = 512
+
+
 async def summarize_chunk(chunk: str) -> str:
     if not model:
         return "Error: Model not initialized."
     try:
         prompt = f"Concisely summarize the key entities, obligations, dates, and important clauses from the following section of a legal document. Focus only on the most critical information.\n\n---\n{chunk}"
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS)
-        
-        if not response.text:
-            print(f"A chunk summary was blocked. Finish Reason: {response.prompt_feedback.block_reason}.")
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS, stream=True)
+        buf = ""
+        async for part in response:
+            try:
+                buf += part.text
+            except ValueError:
+                break  # blocked or empty candidate
+            # Enough for a concise summary; stop instead of waiting on tail tokens
+            if len(buf) > SUMMARY_STREAM_CHARS and len(_SENTENCE_RE.split(buf, maxsplit=3)) > 3:
+                break
+
+        if not buf:
+            print("A chunk summary was blocked or empty.")
             return "" # Return empty string for a blocked chunk
 
-        return response.text.strip()
+        return buf.strip()
     except Exception as e:
         print(f"Error summarizing chunk: {e}")
         return ""
@@ -265,28 +486,51 @@ async def summarize_chunk(chunk: str) -> str:
 
 # ---- Main Orchestrator for Large Document Processing (Unchanged) ----
 async def process_large_document(chunks: list[str]) -> IntelligentAnalysis:
-    # ... (This function remains exactly the same as before) ...
     if len(chunks) <= 3:
         print("Document is small. Performing direct analysis.")
         full_text = "\n".join(chunks)
         return await get_intelligent_analysis(full_text)
 
     print(f"Document is large ({len(chunks)} pages). Running detailed per-chunk analysis...")
-    analysis_tasks = [get_intelligent_analysis(chunk) for chunk in chunks]
-    results = await asyncio.gather(*analysis_tasks, return_exceptions=True)
+    task_index = {asyncio.create_task(get_intelligent_analysis(chunk)): idx for idx, chunk in enumerate(chunks, start=1)}
+    # Handle each chunk as soon as it returns (failures are logged immediately rather than after
+    # the slowest chunk); results are slotted by index so the merged output keeps page order
+    results: dict[int, IntelligentAnalysis] = {}
+    errors_encountered = False
+    pending = set(task_index)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                idx = task_index[task]
+                try:
+                    results[idx] = task.result()
+                except Exception as e:
+                    errors_encountered = True
+                    print(f"Chunk analysis failed for section {idx}: {e}")
+    finally:
+        # Client disconnects cancel this coroutine; don't leave chunk calls running
+        for task in pending:
+            task.cancel()
 
     combined_key_info: list[schemas.KeyInfoItem] = []
     combined_actions: list[schemas.ActionItem] = []
     assessments: list[str] = []
-    errors_encountered = False
-
-    for idx, result in enumerate(results, start=1):
-        if isinstance(result, Exception):
-            errors_encountered = True
-            print(f"Chunk analysis failed for section {idx}: {result}")
-            continue
-        combined_key_info.extend(result.key_info or [])
-        combined_actions.extend(result.identified_actions or [])
+    # Pages repeat the same parties/amounts; keep the first occurrence of each item
+    seen_key_info: set[tuple[str, str]] = set()
+    seen_actions: set[str] = set()
+    for idx in sorted(results):
+        result = results[idx]
+        for item in result.key_info or []:
+            k = (item.key.strip().lower(), str(item.value).strip().lower())
+            if k not in seen_key_info:
+                seen_key_info.add(k)
+                combined_key_info.append(item)
+        for item in result.identified_actions or []:
+            k = item.text.strip().lower()[:200]
+            if k not in seen_actions:
+                seen_actions.add(k)
+                combined_actions.append(item)
         if result.assessment:
             assessments.append(result.assessment.strip())
 
@@ -312,12 +556,35 @@ async def process_large_document(chunks: list[str]) -> IntelligentAnalysis:
 async def now_iso() -> str:
     return datetime.datetime.utcnow().isoformat() + "Z"
 
+_RISK_RE = re.compile(r"\b(terminat|penalt|indemn|liab|default|breach|arbitrat|jurisdict|notice|waiver)\w*", re.I)
+RISK_CONTEXT_PAGES = 10
+RISK_CONTEXT_CHARS = 12000
+
+
+def _risk_context(pages: list[str]) -> str:
+    """Document text for the risk prompt: everything if it fits the budget, else the pages with the
+    most risk-signal terms (kept in document order), capped at RISK_CONTEXT_CHARS."""
+    pages = [p or "" for p in pages]
+    if sum(len(p) for p in pages) <= RISK_CONTEXT_CHARS:
+        return "\n".join(pages)
+    scores = [sum(1 for _ in _RISK_RE.finditer(p)) for p in pages]
+    # Fill the budget highest-signal first, then restore document order
+    picked: dict[int, str] = {}
+    budget = RISK_CONTEXT_CHARS
+    for i in sorted(range(len(pages)), key=lambda i: scores[i], reverse=True)[:RISK_CONTEXT_PAGES]:
+        if budget <= 0:
+            break
+        picked[i] = pages[i][:budget]
+        budget -= len(picked[i])
+    return "\n".join(picked[i] for i in sorted(picked))
+
+
 async def derive_risk_level(analysis: IntelligentAnalysis) -> str:
     # Qualitative heuristic based on severity, balance, clarity extracted via the model
     # Fallback to action count if needed.
     try:
         actions_text = "\n".join([f"- {item.text}" for item in (analysis.identified_actions or [])])
-        full_doc_text = "\n".join(analysis.extracted_text or [])
+        full_doc_text = _risk_context(analysis.extracted_text or [])
         prompt = f"""
         You are a legal risk assessor. Read the entire document text AND the list of obligations/clauses below, then rate the overall document risk as Low, Medium, or High considering these factors:
         1) Severity (how demanding the obligations are),
@@ -344,9 +611,9 @@ async def derive_risk_level(analysis: IntelligentAnalysis) -> str:
         {actions_text}
         ---
         """
-        generation_config = GenerationConfig(response_mime_type="application/json")
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
-        data = json.loads((response.text or "{}").strip())
+        generation_config = GenerationConfig(response_mime_type="application/json", max_output_tokens=RISK_MAX_OUTPUT_TOKENS)
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
+        data = orjson.loads((response.text or "{}").strip())
         level = (data.get("risk_level") or "").title()
         if level not in {"Low", "Medium", "High"}:
             level = "Medium" if len(analysis.identified_actions or []) >= 4 else "Low"
@@ -356,16 +623,20 @@ async def derive_risk_level(analysis: IntelligentAnalysis) -> str:
         count = len(analysis.identified_actions or [])
         return "High" if count >= 8 else ("Medium" if count >= 4 else "Low")
 
-def _hash_content(pages: list[str]) -> str:
-    h = hashlib.sha256()
-    for p in pages:
-        h.update((p or "").encode("utf-8"))
-    return h.hexdigest()
+def hash_pages(pages: list[str]) -> str:
+    # One encode + one digest call over the joined text; byte-identical to hashing page by page,
+    # so stored content_hash values still match
+    return hashlib.sha256("".join(p or "" for p in pages).encode("utf-8")).hexdigest()
+
+async def persist_analysis_meta(db: AsyncSession, analysis: models.Analysis | dict, pages: list[str], ia: IntelligentAnalysis, file_hash: str | None = None, commit: bool = True, content_hash: str | None = None) -> None:
+    """Upserts the analysis meta row. With commit=False the caller owns the transaction.
 
-async def persist_analysis_meta(db: Session, analysis: models.Analysis | dict, pages: list[str], ia: IntelligentAnalysis) -> None:
+    Pass content_hash when the caller already computed hash_pages(pages).
+    """
     # Common values
-    content_hash = _hash_content(pages)
-    risk = await derive_risk_level(ia)
+    content_hash = content_hash or hash_pages(pages)
+    # Reuse the level already derived by the caller instead of a second LLM round-trip
+    risk = ia.risk_level or await derive_risk_level(ia)
     created_at = await now_iso()
 
     # Firestore backend
@@ -381,55 +652,88 @@ async def persist_analysis_meta(db: Session, analysis: models.Analysis | dict, p
                 risk_level=risk,
                 risk_reason=getattr(ia, 'risk_reason', None) or "",
                 content_hash=content_hash,
+                file_hash=file_hash,
             )
         except Exception as _:
             pass
         return
 
     # Default SQLite backend
-    existing = db.query(models.AnalysisMeta).filter(models.AnalysisMeta.analysis_id == analysis.id).first()
+    result = await db.execute(select(models.AnalysisMeta).where(models.AnalysisMeta.analysis_id == analysis.id))
+    existing = result.scalars().first()
     if existing:
         existing.created_at = existing.created_at or created_at
-        existing.extracted_text_json = existing.extracted_text_json or json.dumps(pages)
+        existing.extracted_text_json = existing.extracted_text_json or orjson.dumps(pages).decode()
         existing.risk_level = risk
         existing.risk_reason = ia.risk_reason or existing.risk_reason or ""
         existing.content_hash = existing.content_hash or content_hash
+        existing.file_hash = existing.file_hash or file_hash
         # Save page images if provided
-        if not getattr(existing, 'page_images_json', None):
-            try:
-                existing.page_images_json = json.dumps(ia.page_images or [])
-            except Exception:
-                existing.page_images_json = json.dumps([])
+        if not existing.page_images_json and not existing.page_images_uri:
+            existing.page_images_uri, existing.page_images_json = _page_images_columns(analysis.id, ia.page_images)
         db.add(existing)
     else:
+        page_images_uri, page_images_json = _page_images_columns(analysis.id, ia.page_images)
         meta = models.AnalysisMeta(
             analysis_id=analysis.id,
             owner_id=analysis.owner_id,
             created_at=created_at,
-            extracted_text_json=json.dumps(pages),
-            page_images_json=json.dumps(ia.page_images or []),
+            extracted_text_json=orjson.dumps(pages).decode(),
+            page_images_json=page_images_json,
+            page_images_uri=page_images_uri,
             risk_level=risk,
             risk_reason=ia.risk_reason or "",
             content_hash=content_hash,
-            conversation_json=json.dumps([]),
+            file_hash=file_hash,
+            conversation_json="[]",
         )
         db.add(meta)
-    db.commit()
-
-async def get_dashboard_list(db: Session, owner_id: int) -> list[schemas.DashboardItem]:
+    if commit:
+        await db.commit()
+
+def _page_images_columns(analysis_id: int, page_images: list[str] | None) -> tuple[str | None, str | None]:
+    """Returns (page_images_uri, page_images_json); page-store URLs pack into the uri, anything else stays JSON."""
+    page_images = page_images or []
+    uri = page_store.pack_page_urls(analysis_id, page_images)
+    if uri:
+        return uri, None
+    return None, orjson.dumps(page_images).decode()
+
+async def get_dashboard_list(db: AsyncSession, owner_id: int, limit: int = fs_repo.DASHBOARD_PAGE_SIZE, after_id: int | None = None) -> list[schemas.DashboardItem]:
+    """Returns one page of the owner's dashboard, newest first; `after_id` is the last id of the previous page."""
     if fs_repo.is_firestore_enabled():
         try:
-            rows = fs_repo.list_dashboard(owner_id)
-            return [schemas.DashboardItem(id=r["id"], filename=r.get("filename", ""), created_at=r.get("created_at"), risk_level=r.get("risk_level")) for r in rows]
-        except Exception:
+            rows = fs_repo.list_dashboard(owner_id, page_size=limit, after_id=after_id)
+        except Exception as e:
+            # Don't mask a failed query (e.g. a missing composite index) as an empty dashboard
+            print(f"Dashboard query failed: {e}")
+            raise
+        return [schemas.DashboardItem(id=r["id"], filename=r.get("filename", ""), created_at=r.get("created_at"), risk_level=r.get("risk_level")) for r in rows]
+    # Select just the dashboard columns; full rows would drag in the extracted text and JSON blobs
+    stmt = (
+        select(models.Analysis.id, models.Analysis.filename, models.AnalysisMeta.created_at, models.AnalysisMeta.risk_level)
+        .join(models.AnalysisMeta, models.Analysis.id == models.AnalysisMeta.analysis_id)
+        .where(models.AnalysisMeta.owner_id == owner_id)
+    )
+    if after_id:
+        cursor_at = (await db.execute(
+            select(models.AnalysisMeta.created_at)
+            .where(models.AnalysisMeta.analysis_id == after_id, models.AnalysisMeta.owner_id == owner_id)
+        )).scalar_one_or_none()
+        if cursor_at is None:
             return []
-    items = db.query(models.Analysis, models.AnalysisMeta).join(models.AnalysisMeta, models.Analysis.id == models.AnalysisMeta.analysis_id).filter(models.Analysis.owner_id == owner_id).all()
-    result = []
-    for a, m in items:
-        result.append(schemas.DashboardItem(id=a.id, filename=a.filename, created_at=m.created_at, risk_level=m.risk_level))
-    return result
-
-async def get_full_analysis(db: Session, analysis_id: int, owner_id: int) -> schemas.FullAnalysisResponse:
+        # (created_at, id) keyset: rows sharing the cursor's timestamp are neither skipped nor repeated
+        stmt = stmt.where(or_(
+            models.AnalysisMeta.created_at < cursor_at,
+            and_(models.AnalysisMeta.created_at == cursor_at, models.Analysis.id < after_id),
+        ))
+    items = (await db.execute(
+        stmt.order_by(models.AnalysisMeta.created_at.desc(), models.Analysis.id.desc()).limit(limit)
+    )).all()
+    # Row values come straight from typed columns, so skip per-row Pydantic validation
+    return [schemas.DashboardItem.model_construct(id=r[0], filename=r[1] or "", created_at=r[2], risk_level=r[3]) for r in items]
+
+async def get_full_analysis(db: AsyncSession, analysis_id: int, owner_id: int) -> schemas.FullAnalysisResponse:
     if fs_repo.is_firestore_enabled():
         data = fs_repo.get_full_analysis(analysis_id, owner_id)
         key_info = [schemas.KeyInfoItem(**item) for item in data.get("key_info", [])]
@@ -450,52 +754,58 @@ async def get_full_analysis(db: Session, analysis_id: int, owner_id: int) -> sch
             risk_reason=data.get("risk_reason"),
             conversation=conversation,
         )
-        # Compute risk highlights (best-effort, no failures bubble up)
+        # Compute risk highlights (best-effort, no failures bubble up); on a worker thread because
+        # scanned pages may need a blocking OCR call for their boxes
         try:
-            fa.risk_highlights = _compute_risk_highlights_from_fa(fa)
+            fa.risk_highlights = await asyncio.to_thread(_compute_risk_highlights_from_fa, fa)
         except Exception:
             fa.risk_highlights = []
         # Prewarm OCR cache for scanned PDFs (first few pages) in background
-        try:
-            if fa.page_images:
-                asyncio.create_task(_prewarm_scanned_pages_ocr(int(fa.id), fa.page_images))
-        except Exception:
-            pass
+        if fa.page_images:
+            enqueue_ocr_prewarm(int(fa.id), fa.page_images)
         return fa
-    a = db.query(models.Analysis).filter(models.Analysis.id == analysis_id, models.Analysis.owner_id == owner_id).first()
-    if not a:
+    # One round trip for both rows; the outer join keeps analyses whose meta row is missing
+    Meta = models.AnalysisMeta
+    r = (await db.execute(
+        select(
+            models.Analysis.id, models.Analysis.filename, models.Analysis.assessment,
+            models.Analysis.key_info_json, models.Analysis.actions_json,
+            Meta.extracted_text_json, Meta.page_images_json, Meta.page_images_uri, Meta.conversation_json,
+            Meta.created_at, Meta.risk_level, Meta.risk_reason,
+        )
+        .outerjoin(Meta, (Meta.analysis_id == models.Analysis.id) & (Meta.owner_id == owner_id))
+        .where(models.Analysis.id == analysis_id, models.Analysis.owner_id == owner_id)
+    )).first()
+    if not r:
         raise ValueError("Analysis not found")
-    m = db.query(models.AnalysisMeta).filter(models.AnalysisMeta.analysis_id == analysis_id, models.AnalysisMeta.owner_id == owner_id).first()
-    key_info = [schemas.KeyInfoItem(**item) for item in json.loads(a.key_info_json or "[]")]
-    actions = [schemas.ActionItem(**item) for item in json.loads(a.actions_json or "[]")]
-    pages = json.loads(m.extracted_text_json or "[]") if m else []
-    page_images = json.loads(getattr(m, 'page_images_json', '[]') or '[]') if m else []
-    conversation_raw = json.loads(m.conversation_json or "[]") if m else []
-    conversation = [schemas.ChatMessage(**msg) for msg in conversation_raw]
+    # Parse + validate stored JSON in one pass instead of json.loads followed by per-item model construction
+    key_info = schemas.KeyInfoList.validate_json(r.key_info_json or "[]")
+    actions = schemas.ActionList.validate_json(r.actions_json or "[]")
+    pages = orjson.loads(r.extracted_text_json or "[]")
+    # Packed page-store references expand without decoding a JSON list (legacy rows may hold inline base64)
+    page_images = page_store.unpack_page_urls(r.page_images_uri) if r.page_images_uri else orjson.loads(r.page_images_json or "[]")
+    conversation = [schemas.ChatMessage(**msg) for msg in orjson.loads(r.conversation_json or "[]")]
     fa = schemas.FullAnalysisResponse(
-        id=a.id,
-        filename=a.filename,
-        assessment=a.assessment or "",
+        id=r.id,
+        filename=r.filename,
+        assessment=r.assessment or "",
         key_info=key_info,
         identified_actions=actions,
         extracted_text=pages,
         page_images=page_images,
-        created_at=m.created_at if m else None,
-        risk_level=m.risk_level if m else None,
-        risk_reason=m.risk_reason if m else None,
+        created_at=r.created_at,
+        risk_level=r.risk_level,
+        risk_reason=r.risk_reason,
         conversation=conversation,
     )
-    # Compute risk highlights (best-effort)
+    # Compute risk highlights (best-effort); off the event loop, scanned pages may OCR synchronously
     try:
-        fa.risk_highlights = _compute_risk_highlights_from_fa(fa)
+        fa.risk_highlights = await asyncio.to_thread(_compute_risk_highlights_from_fa, fa)
     except Exception:
         fa.risk_highlights = []
     # Prewarm OCR cache for scanned PDFs (first few pages) in background
-    try:
-        if fa.page_images:
-            asyncio.create_task(_prewarm_scanned_pages_ocr(int(fa.id), fa.page_images))
-    except Exception:
-        pass
+    if fa.page_images:
+        enqueue_ocr_prewarm(int(fa.id), fa.page_images)
     return fa
 
 async def append_conversation_message(analysis_id: int, owner_id: int, user_message: dict, assistant_message: dict) -> None:
@@ -506,21 +816,19 @@ async def append_conversation_message(analysis_id: int, owner_id: int, user_mess
             pass
         return
     from app.database import SessionLocal
-    db = SessionLocal()
-    try:
-        meta = db.query(models.AnalysisMeta).filter(models.AnalysisMeta.analysis_id == analysis_id, models.AnalysisMeta.owner_id == owner_id).first()
+    async with SessionLocal() as db:
+        result = await db.execute(select(models.AnalysisMeta).where(models.AnalysisMeta.analysis_id == analysis_id, models.AnalysisMeta.owner_id == owner_id))
+        meta = result.scalars().first()
         if not meta:
             return
-        convo = json.loads(meta.conversation_json or "[]")
+        convo = orjson.loads(meta.conversation_json or "[]")
         convo.append(user_message)
         convo.append(assistant_message)
-        meta.conversation_json = json.dumps(convo)
+        meta.conversation_json = orjson.dumps(convo).decode()
         db.add(meta)
-        db.commit()
-    finally:
-        db.close()
+        await db.commit()
 
-async def has_analysis_access(db: Session, analysis_id: int, owner_id: int) -> bool:
+async def has_analysis_access(db: AsyncSession, analysis_id: int, owner_id: int) -> bool:
     """Lightweight existence/ownership check, Firestore-aware."""
     if fs_repo.is_firestore_enabled():
         try:
@@ -528,20 +836,24 @@ async def has_analysis_access(db: Session, analysis_id: int, owner_id: int) -> b
         except Exception:
             return False
     # SQLite path
-    a = db.query(models.Analysis).filter(models.Analysis.id == analysis_id, models.Analysis.owner_id == owner_id).first()
+    a = (await db.execute(select(models.Analysis.id).where(models.Analysis.id == analysis_id, models.Analysis.owner_id == owner_id))).first()
     return bool(a)
 
-async def find_existing_analysis_by_hash(db: Session, owner_id: int, pages: list[str]) -> int | None:
-    content_hash = _hash_content(pages)
+async def find_existing_analysis_by_hash(db: AsyncSession, owner_id: int, pages: list[str] | None = None, file_hash: str | None = None, content_hash: str | None = None) -> int | None:
+    """Looks up an owner's analysis by uploaded-file digest if given, else by extracted-text hash."""
+    if file_hash:
+        field, value = "file_hash", file_hash
+    else:
+        field, value = "content_hash", content_hash or hash_pages(pages or [])
     if fs_repo.is_firestore_enabled():
         try:
-            return fs_repo.find_by_content_hash(owner_id, content_hash)
+            return fs_repo.find_by_content_hash(owner_id, value, field=field)
         except Exception:
             return None
-    m = db.query(models.AnalysisMeta).filter(
+    m = (await db.execute(select(models.AnalysisMeta).where(
         models.AnalysisMeta.owner_id == owner_id,
-        models.AnalysisMeta.content_hash == content_hash
-    ).first()
+        getattr(models.AnalysisMeta, field) == value
+    ))).scalars().first()
     return m.analysis_id if m else None
 
 async def full_analysis_to_intelligent(fa: schemas.FullAnalysisResponse) -> schemas.IntelligentAnalysis:
@@ -558,11 +870,13 @@ async def full_analysis_to_intelligent(fa: schemas.FullAnalysisResponse) -> sche
     )
 
 # --- Timeline generation ---
-async def generate_timeline(db: Session, analysis_id: int, owner_id: int) -> schemas.TimelineResponse:
+async def generate_timeline(db: AsyncSession, analysis_id: int, owner_id: int) -> schemas.TimelineResponse:
     if not model:
         return schemas.TimelineResponse(lifecycle_summary="Timeline unavailable - AI model not initialized.", events=[])
     
     fa = await get_full_analysis(db, analysis_id, owner_id)
+    # End the read transaction so the model call below doesn't hold the single writer connection
+    await db.commit()
     # Build prompts with extracted text and key info to identify dates/events
     doc_text = "\n".join(fa.extracted_text or [])
     key_info_str = "\n".join([f"- {k.key}: {k.value}" for k in (fa.key_info or [])])
@@ -593,8 +907,8 @@ async def generate_timeline(db: Session, analysis_id: int, owner_id: int) -> sch
     """
     generation_config = GenerationConfig(response_mime_type="application/json")
     try:
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
-        data = json.loads((response.text or "{}").strip())
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
+        data = orjson.loads((response.text or "{}").strip())
     except Exception as e:
         print(f"Timeline generation error: {e}")
         data = {"lifecycle_summary": "Timeline unavailable.", "events": []}
@@ -609,7 +923,7 @@ async def generate_timeline(db: Session, analysis_id: int, owner_id: int) -> sch
         return schemas.TimelineResponse(lifecycle_summary=lifecycle_summary, events=items)
 
     # SQLite path
-    db.query(models.TimelineEvent).filter(models.TimelineEvent.analysis_id == analysis_id).delete()
+    await db.execute(delete(models.TimelineEvent).where(models.TimelineEvent.analysis_id == analysis_id))
     events = []
     for e in raw_events:
         # Normalize fields and skip events with missing/invalid dates to satisfy NOT NULL constraint
@@ -632,19 +946,19 @@ async def generate_timeline(db: Session, analysis_id: int, owner_id: int) -> sch
         )
         db.add(te)
         events.append(te)
-    db.commit()
-    stored = db.query(models.TimelineEvent).filter(models.TimelineEvent.analysis_id == analysis_id).all()
+    await db.commit()
+    stored = (await db.execute(select(models.TimelineEvent).where(models.TimelineEvent.analysis_id == analysis_id))).scalars().all()
     items = [schemas.TimelineEvent(id=ev.id, date=ev.date, label=ev.label, kind=ev.kind, description=ev.description) for ev in stored]
     return schemas.TimelineResponse(lifecycle_summary=lifecycle_summary, events=items)
 
-async def list_timeline(db: Session, analysis_id: int, owner_id: int) -> schemas.TimelineResponse:
+async def list_timeline(db: AsyncSession, analysis_id: int, owner_id: int) -> schemas.TimelineResponse:
     _ = await get_full_analysis(db, analysis_id, owner_id) # ownership check
     if fs_repo.is_firestore_enabled():
         summary, items_raw = fs_repo.list_timeline(analysis_id, owner_id)
         items = [schemas.TimelineEvent(id=None, date=e.get("date", ""), label=e.get("label", ""), kind=e.get("kind", "key_date"), description=e.get("description", "")) for e in items_raw]
         summary = summary or ("" if items else "No timeline events found for this analysis.")
         return schemas.TimelineResponse(lifecycle_summary=summary, events=items)
-    stored = db.query(models.TimelineEvent).filter(models.TimelineEvent.analysis_id == analysis_id).all()
+    stored = (await db.execute(select(models.TimelineEvent).where(models.TimelineEvent.analysis_id == analysis_id))).scalars().all()
     items = [schemas.TimelineEvent(id=ev.id, date=ev.date, label=ev.label, kind=ev.kind, description=ev.description) for ev in stored]
     summary = "" if items else "No timeline events found for this analysis."
     return schemas.TimelineResponse(lifecycle_summary=summary, events=items)
@@ -654,35 +968,47 @@ async def save_reminder(analysis_id: int, event_id: int, email: str, days_before
     print(f"Reminder scheduled: analysis={analysis_id}, event={event_id}, email={email}, days_before={days_before}")
     return True
 
-async def delete_analysis(db: Session, analysis_id: int) -> bool:
+async def delete_analysis(db: AsyncSession, analysis_id: int) -> bool:
     """Delete an analysis and its related metadata/events."""
     if fs_repo.is_firestore_enabled():
         try:
             return fs_repo.delete_analysis(analysis_id)
         except Exception:
             return False
-    # SQLite path
-    db.query(models.TimelineEvent).filter(models.TimelineEvent.analysis_id == analysis_id).delete()
-    db.query(models.AnalysisMeta).filter(models.AnalysisMeta.analysis_id == analysis_id).delete()
-    db.query(models.Analysis).filter(models.Analysis.id == analysis_id).delete()
-    db.commit()
+    # SQLite path: foreign keys aren't enforced (anonymous analyses are owned by id 0, which has no
+    # users row), so child rows are removed explicitly, in one transaction
+    await db.execute(delete(models.TimelineEvent).where(models.TimelineEvent.analysis_id == analysis_id))
+    await db.execute(delete(models.AnalysisMeta).where(models.AnalysisMeta.analysis_id == analysis_id))
+    await db.execute(delete(models.Analysis).where(models.Analysis.id == analysis_id))
+    await db.commit()
+    # SQLite hands a deleted max id to the next insert, which must not inherit this analysis's OCR
+    _ocr_cache_evict(analysis_id)
     return True
 
 async def get_risk_simulation(clause_text: str, document_context: str, key_info: list) -> str:
     """
     Generates a realistic risk scenario for a specific legal clause, using the full document context.
     """
+    return (await get_risk_simulations_batch([clause_text], document_context, key_info))[0]
+
+async def get_risk_simulations_batch(clauses: list[str], document_context: str, key_info: list) -> list[str]:
+    """
+    Generates one risk scenario per clause in a single model call; element i answers clauses[i].
+    """
     if not model:
         raise ValueError("Generative model not initialized.")
+    if not clauses:
+        return []
 
     # Convert key_info list to a more readable string format for the prompt
     key_info_str = "\n".join([f"- {item['key']}: {item['value']}" for item in key_info])
+    clauses_str = "\n".join(f'{i}) "{c}"' for i, c in enumerate(clauses, 1))
 
     prompt = f"""
-    Act as a pragmatic risk analyst. You will be given the key facts from a legal document, a general assessment, and one specific clause.
-    Your task is to generate a realistic, negative consequence scenario for the provided clause.
+    Act as a pragmatic risk analyst. You will be given the key facts from a legal document, a general assessment, and a numbered list of clauses.
+    Your task is to generate a realistic, negative consequence scenario for each provided clause.
 
-    **CRITICAL INSTRUCTION:** You MUST use the correct names and roles of the parties as defined in the 'Key Facts' section in your scenario. Do not confuse the parties.
+    **CRITICAL INSTRUCTION:** You MUST use the correct names and roles of the parties as defined in the 'Key Facts' section in your scenarios. Do not confuse the parties.
 
     **Key Facts from Document:**
     {key_info_str}
@@ -690,21 +1016,33 @@ async def get_risk_simulation(clause_text: str, document_context: str, key_info:
     **General Document Assessment:**
     {document_context}
 
-    **Clause to Analyze:**
-    "{clause_text}"
+    **Clauses to Analyze:**
+    {clauses_str}
 
-    **Generate the risk simulation now (2-4 sentences), concluding with brief, actionable advice:**
+    **Return a JSON array of {len(clauses)} strings; index i corresponds to clause i+1. Each string is a risk simulation (2-4 sentences) concluding with brief, actionable advice.**
     """
+    # Informational request: identical prompts can be served from the response cache
+    cache_key = llm_cache.input_hash("risk_simulation_batch", prompt)
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    if cached is not None:
+        return cached
     try:
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS)
-        
+        generation_config = GenerationConfig(response_mime_type="application/json")
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
+
         if not response.text:
             raise ValueError(f"The AI response was blocked. Details: {response.prompt_feedback}")
-            
-        return response.text.strip()
+
+        data = orjson.loads(response.text.strip())
+        if not isinstance(data, list) or len(data) != len(clauses):
+            raise ValueError(f"Expected {len(clauses)} simulations, got {len(data) if isinstance(data, list) else type(data).__name__}")
+        simulations = [str(item).strip() for item in data]
+        if all(simulations):
+            await asyncio.to_thread(llm_cache.put, cache_key, simulations)
+        return simulations
     except Exception as e:
         print(f"An error occurred during risk simulation: {e}")
-        return f"Error: Could not generate a risk simulation. Details: {str(e)}"
+        return [f"Error: Could not generate a risk simulation. Details: {str(e)}"] * len(clauses)
     
 async def get_clause_rewrites(clause_key: str, clause_text: str, document_context: str) -> list[str]:
     """
@@ -732,20 +1070,142 @@ async def get_clause_rewrites(clause_key: str, clause_text: str, document_contex
 
     **Generate the three rewritten versions now:**
     """
+    cache_key = llm_cache.input_hash("clause_rewrites", prompt)
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    if cached is not None:
+        return cached
     try:
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS)
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS)
         if not response.text:
             raise ValueError(f"The AI response was blocked. Details: {response.prompt_feedback}")
         
         # Split the response into a list of clauses
         # The model is prompted to return a numbered list, so we split by newline
         clauses = [clause.strip() for clause in response.text.strip().split('\n') if clause.strip()]
+        if clauses:
+            await asyncio.to_thread(llm_cache.put, cache_key, clauses)
         return clauses
     except Exception as e:
         print(f"An error occurred during clause rewrite: {e}")
         return [f"Error: Could not generate rewrites. Details: {str(e)}"]
     
 
+# Cue tables/patterns for classify_document_type, compiled once rather than per page
+_CUE_TITLE_KEYWORDS = (
+    "agreement", "contract", "lease", "addendum", "master service agreement",
+    "terms and conditions", "statement of work", "non-disclosure agreement",
+    "confidentiality agreement", "employment agreement", "loan agreement",
+    "purchase agreement",
+)
+_CUE_LEGAL_MARKERS = (
+    "whereas", "in witness whereof", "governing law", "indemnif", "confidential",
+    "term and termination", "force majeure", "severab", "assignment", "liability",
+    "warranty", "entire agreement", "notices",
+)
+_CUE_PARTY_DEFS = ("this agreement is between", "by and between", "the parties")
+_CUE_SIGNATURE_MARKERS = ("signed:", "signature", "by:", "name:", "title:")
+# (family, weight, keywords); a keyword scores once per family. "title" only counts in the first
+# 300 chars, "signature" only in the last 800, and "structure" adds its weight once for any hit.
+_CUE_FAMILIES = (
+    ("title", 2.0, _CUE_TITLE_KEYWORDS),
+    ("legal", 1.0, _CUE_LEGAL_MARKERS),
+    ("party", 1.5, _CUE_PARTY_DEFS),
+    ("signature", 0.5, _CUE_SIGNATURE_MARKERS),
+    ("structure", 0.5, ("section", "clause")),
+)
+_CUE_WEIGHTS = {family: weight for family, weight, _ in _CUE_FAMILIES}
+
+
+def _build_cue_automaton():
+    """One Aho-Corasick automaton over every cue keyword, so a page is scanned once instead of per keyword."""
+    if ahocorasick is None:
+        return None
+    families_by_kw: dict[str, list[str]] = {}
+    for family, _, keywords in _CUE_FAMILIES:
+        for kw in keywords:
+            families_by_kw.setdefault(kw, []).append(family)
+    automaton = ahocorasick.Automaton()
+    for kw, families in families_by_kw.items():
+        automaton.add_word(kw, (kw, tuple(families)))
+    automaton.make_automaton()
+    return automaton
+
+
+_CUE_AUTOMATON = _build_cue_automaton()
+
+
+def _lexical_cue_score(t: str) -> float:
+    """Keyword part of the legal cue score for lowercased text `t`."""
+    sig_start = max(0, len(t) - 800)
+    if _CUE_AUTOMATON is None:
+        score = sum(2.0 for kw in _CUE_TITLE_KEYWORDS if kw in t[:300])
+        score += sum(1.0 for kw in _CUE_LEGAL_MARKERS if kw in t)
+        score += 0.5 if ("section" in t or "clause" in t) else 0.0
+        score += sum(1.5 for kw in _CUE_PARTY_DEFS if kw in t)
+        last_800 = t[sig_start:]
+        return score + sum(0.5 for kw in _CUE_SIGNATURE_MARKERS if kw in last_800)
+    hits: set[tuple[str, str]] = set()
+    for end, (kw, families) in _CUE_AUTOMATON.iter(t):
+        for family in families:
+            if family == "title" and end >= 300:
+                continue
+            if family == "signature" and end - len(kw) + 1 < sig_start:
+                continue
+            hits.add((family, "" if family == "structure" else kw))
+    return sum(_CUE_WEIGHTS[family] for family, _ in hits)
+
+
+_RE_NUMBERED = re.compile(r"^\s*\d+(?:\.\d+)*\s+", re.MULTILINE)
+_RE_DATE = re.compile(r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\b|\b\d{4}\b")
+_RE_MONEY = re.compile(r"[$€£]\s*\d|\b\d{1,3}(?:,\d{3})+\b|\b\d+%\b")
+
+# Pages are scored in the early-exit pass and again when picking pages for the LLM check
+@functools.lru_cache(maxsize=1024)
+def _compute_legal_cue_score(text: str) -> float:
+    t = (text or "").strip().lower()
+    if not t:
+        return 0.0
+    # Title keywords, legal markers, section/clause, parties and signature blocks in one pass
+    score = _lexical_cue_score(t)
+
+    # Structure cues: numbered sections/clauses
+    numbered = _RE_NUMBERED.findall(t)
+    score += min(5, len(numbered)) * 0.5
+
+    # Dates/money density
+    date_hits = len(_RE_DATE.findall(t))
+    money_hits = len(_RE_MONEY.findall(t))
+    length = max(1, len(t))
+    score += 3.0 * ((date_hits + money_hits) / (length / 1000))  # per 1k chars
+    return score
+
+# Documents at least this long are cue-scored across the CPU pool, one round of chunks at a time.
+# The first pages are scored inline first: the early exit usually fires on them, and then nothing
+# is shipped to the pool at all.
+CUE_PARALLEL_MIN_PAGES = 16
+CUE_PARALLEL_CHUNK_PAGES = 8
+CUE_INLINE_PAGES = 2
+
+def _score_cue_pages(pages: list[str]) -> list[float]:
+    return [_compute_legal_cue_score(p or "") for p in pages]
+
+async def _iter_legal_cue_scores(pages: list[str]):
+    """Yields cue scores in page order. Small documents, and the first pages of large ones, are scored
+    inline; the rest of a large document is scored one round (a chunk per pool worker) at a time, so the
+    caller's early exit still applies between rounds.
+    """
+    inline = len(pages) if len(pages) < CUE_PARALLEL_MIN_PAGES else CUE_INLINE_PAGES
+    for p in pages[:inline]:
+        yield _compute_legal_cue_score(p or "")
+    step = CUE_PARALLEL_CHUNK_PAGES
+    round_size = step * cpu_pool.WORKERS
+    for r in range(inline, len(pages), round_size):
+        chunk = pages[r:r + round_size]
+        results = await asyncio.gather(*(cpu_pool.run_cpu_bound(_score_cue_pages, chunk[i:i + step]) for i in range(0, len(chunk), step)))
+        for batch in results:
+            for sc in batch:
+                yield sc
+
 async def classify_document_type(page_chunks: list[str]) -> str:
     """
     Classifies a document as 'LegalAgreement' or 'NonLegalDocument' using:
@@ -755,53 +1215,8 @@ async def classify_document_type(page_chunks: list[str]) -> str:
     if not model:
         raise ValueError("Generative model not initialized.")
 
-    def _normalize(s: str) -> str:
-        return (s or "").strip()
-
-    def _compute_legal_cue_score(text: str) -> float:
-        t = (_normalize(text)).lower()
-        if not t:
-            return 0.0
-        score = 0.0
-        # Title/keywords (strong signals)
-        title_keywords = [
-            "agreement", "contract", "lease", "addendum", "master service agreement",
-            "terms and conditions", "statement of work", "non-disclosure agreement",
-            "confidentiality agreement", "employment agreement", "loan agreement",
-            "purchase agreement"
-        ]
-        first_300 = t[:300]
-        score += sum(2.0 for kw in title_keywords if kw in first_300)
-
-        # Legal markers
-        legal_markers = [
-            "whereas", "in witness whereof", "governing law", "indemnif", "confidential",
-            "term and termination", "force majeure", "severab", "assignment", "liability",
-            "warranty", "entire agreement", "notices"
-        ]
-        score += sum(1.0 for kw in legal_markers if kw in t)
-
-        # Structure cues: numbered sections/clauses
-        numbered = re.findall(r"^\s*\d+(?:\.\d+)*\s+", t, flags=re.MULTILINE)
-        score += min(5, len(numbered)) * 0.5
-        if "section" in t or "clause" in t:
-            score += 0.5
-
-        # Parties / signature blocks
-        party_defs = ["this agreement is between", "by and between", "the parties"]
-        score += sum(1.5 for kw in party_defs if kw in t)
-        signature_markers = ["signed:", "signature", "by:", "name:", "title:"]
-        score += sum(0.5 for kw in signature_markers if kw in t[-800:])  # near end
-
-        # Dates/money density
-        date_hits = len(re.findall(r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)\b|\b\d{4}\b", t))
-        money_hits = len(re.findall(r"[$€£]\s*\d|\b\d{1,3}(?:,\d{3})+\b|\b\d+%\b", t))
-        length = max(1, len(t))
-        score += 3.0 * ((date_hits + money_hits) / (length / 1000))  # per 1k chars
-        return score
-
-    def _select_informative_pages(pages: list[str], k: int = 3) -> list[str]:
-        scored = [(i, _compute_legal_cue_score(p or "")) for i, p in enumerate(pages)]
+    def _select_informative_pages(pages: list[str], scores: list[float], k: int = 3) -> list[str]:
+        scored = list(enumerate(scores))
         scored.sort(key=lambda x: x[1], reverse=True)
         # take top k non-empty scores
         top = [pages[i] for i, s in scored[:k] if s > 0]
@@ -819,21 +1234,23 @@ async def classify_document_type(page_chunks: list[str]) -> str:
     if not pages:
         return "NonLegalDocument"
 
-    # Early exits using cue scoring
-    scores = [_compute_legal_cue_score(p or "") for p in pages]
-    max_score = max(scores) if scores else 0.0
-    sum_scores = sum(scores)
-    first_page_score = scores[0] if scores else 0.0
-
-    # High-confidence legal: strong signals on first page or any page
-    if first_page_score >= 4.0 or max_score >= 6.0 or sum_scores >= 10.0:
-        return "LegalAgreement"
+    # Early exits using cue scoring. Scores are non-negative, so once a legal threshold is met the
+    # remaining pages can't change the outcome and are not scored.
+    scores: list[float] = []
+    max_score = sum_scores = 0.0
+    async for sc in _iter_legal_cue_scores(pages):
+        scores.append(sc)
+        max_score = max(max_score, sc)
+        sum_scores += sc
+        # High-confidence legal: strong signals on first page or any page
+        if scores[0] >= 4.0 or max_score >= 6.0 or sum_scores >= 10.0:
+            return "LegalAgreement"
     # High-confidence non-legal: no signals across pages
     if sum_scores < 1.0 and max_score < 1.0:
         return "NonLegalDocument"
 
     # Inconclusive → LLM verification on top-K informative pages
-    sample_pages = _select_informative_pages(pages, k=3)
+    sample_pages = _select_informative_pages(pages, scores, k=3)
     text_sample = "\n\n---\n\n".join(sample_pages)[:6000]
 
     try:
@@ -849,7 +1266,7 @@ async def classify_document_type(page_chunks: list[str]) -> str:
         {text_sample}
         ---
         """
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS)
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS)
         if (response.text or "").find("LegalAgreement") != -1:
             return "LegalAgreement"
         return "NonLegalDocument"
@@ -860,26 +1277,219 @@ async def classify_document_type(page_chunks: list[str]) -> str:
     
 DB_FILE = "benchmark.db"
 
+def _connect_benchmark_db(**kwargs) -> sqlite3.Connection:
+    # The app only reads the benchmark data; read-only mode skips journal/lock setup for writes
+    conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True, **kwargs)
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+# Score against the int8 copy (emb_q8) when the DB has one; false forces the float32 emb_blob path, and
+# skips the sqlite-vec index too, since that holds the int8 codes
+BENCHMARK_INT8 = os.getenv("BENCHMARK_INT8", "true").strip().lower() not in ("0", "false", "no", "off")
+# Rows per int8→float32 upcast in _clause_similarities; bounds the temporary to a few MB
+CLAUSE_SCORE_BLOCK_ROWS = 2048
+
+# (mtime, N×D matrix, per-row scales or None, texts, categories); reloaded when DB_FILE changes.
+# The matrix is either unit-normalized float32, or int8 codes with scales[i] = 1 / |codes[i]|: similarities
+# are then cosines between code vectors, exactly what the int8 vec_clauses index ranks by.
+_clause_matrix = None
+_clause_matrix_lock = threading.Lock()
+
+def _load_clause_matrix():
+    global _clause_matrix
+    mtime = os.stat(DB_FILE).st_mtime_ns
+    with _clause_matrix_lock:
+        if _clause_matrix is None or _clause_matrix[0] != mtime:
+            conn = _connect_benchmark_db()
+            try:
+                cols = {row[1] for row in conn.execute("PRAGMA table_info('clauses')")}
+                # emb_blob holds raw float32 bytes; until the migration drops it, the JSON column is authoritative
+                emb_col = "embedding" if "embedding" in cols else "emb_blob"
+                rows = None
+                if BENCHMARK_INT8 and emb_col == "emb_blob" and "emb_q8" in cols:
+                    rows = conn.execute("SELECT text, category, emb_q8 FROM clauses").fetchall()
+                    if any(q is None for _, _, q in rows):
+                        # Partially quantized DB (migration not run since rows were added); use the float32 column
+                        rows = None
+                int8 = rows is not None
+                if rows is None:
+                    rows = conn.execute(f"SELECT text, category, {emb_col} FROM clauses").fetchall()
+            finally:
+                conn.close()
+            scales = None
+            if rows and int8:
+                matrix = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.int8).reshape(len(rows), -1)
+                norms = np.sqrt(_clause_dots(matrix, lambda block: np.einsum("ij,ij->i", block, block)))
+                scales = 1.0 / np.where(norms == 0, 1.0, norms)
+            elif rows and emb_col == "emb_blob":
+                # Concatenated blobs are viewed as an N×D float32 matrix without per-row parsing
+                matrix = np.frombuffer(b"".join(r[2] for r in rows), dtype=np.float32).reshape(len(rows), -1)
+            elif rows:
+                matrix = np.asarray([orjson.loads(r[2]) for r in rows], dtype=np.float32)
+            if rows and scales is None:
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix = matrix / np.where(norms == 0, 1.0, norms)
+            elif not rows:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            _clause_matrix = (mtime, matrix, scales, [r[0] for r in rows], [r[1] for r in rows])
+        return _clause_matrix[1:]
+
+def _clause_dots(matrix: np.ndarray, fn) -> np.ndarray:
+    # NumPy has no BLAS path for integer matmul, so int8 blocks are upcast to float32 (exact for int8
+    # values) one at a time; the resident matrix stays at one byte per dimension
+    out = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), CLAUSE_SCORE_BLOCK_ROWS):
+        block = matrix[start:start + CLAUSE_SCORE_BLOCK_ROWS]
+        out[start:start + len(block)] = fn(block.astype(np.float32))
+    return out
+
+def _clause_similarities(matrix: np.ndarray, scales, query_vec: np.ndarray) -> np.ndarray:
+    """Cosine similarity of the unit `query_vec` against every row of a _load_clause_matrix matrix."""
+    if scales is None:
+        # Rows are pre-normalized, so one matrix-vector product yields every cosine similarity
+        return matrix @ query_vec
+    return _clause_dots(matrix, lambda block: block @ query_vec) * scales
+
+# (mtime, connection with sqlite-vec loaded or None); None means the vec_clauses KNN index is unavailable
+_clause_vec = None
+
+def _clause_vec_conn():
+    global _clause_vec
+    if sqlite_vec is None or not BENCHMARK_INT8:
+        return None
+    mtime = os.stat(DB_FILE).st_mtime_ns
+    with _clause_matrix_lock:
+        if _clause_vec is None or _clause_vec[0] != mtime:
+            if _clause_vec is not None and _clause_vec[1] is not None:
+                _clause_vec[1].close()
+            conn = None
+            try:
+                conn = _connect_benchmark_db(check_same_thread=False)
+                conn.enable_load_extension(True)
+                sqlite_vec.load(conn)
+                conn.enable_load_extension(False)
+                if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'vec_clauses'").fetchone():
+                    conn.close()
+                    conn = None
+            except Exception as e:
+                # Builds without extension loading (or an older DB) use the NumPy scan instead
+                print(f"sqlite-vec unavailable, using brute-force clause search: {e}")
+                if conn is not None:
+                    conn.close()
+                conn = None
+            _clause_vec = (mtime, conn)
+        return _clause_vec[1]
+
+def _find_similar_clauses_knn(conn, query_embedding: list, top_k: int) -> list:
+    # vec_clauses holds the int8 codes with the cosine metric, so similarity = 1 - distance
+    query = quantize_int8(query_embedding)[0]
+    with _clause_matrix_lock:
+        rows = conn.execute(
+            "WITH knn AS (SELECT rowid, distance FROM vec_clauses WHERE embedding MATCH vec_int8(?) AND k = ?) "
+            "SELECT c.text, c.category, knn.distance FROM knn JOIN clauses c ON c.id = knn.rowid ORDER BY knn.distance",
+            (query, top_k),
+        ).fetchall()
+    return [(1.0 - float(distance), text, category) for text, category, distance in rows]
+
 def find_similar_clauses(query_embedding: list, top_k: int = 3) -> list:
     """Finds the most similar clauses from the SQLite DB using cosine similarity."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT text, category, embedding FROM clauses")
-    all_clauses = cursor.fetchall()
-    conn.close()
-
-    query_vec = np.array(query_embedding)
-    similarities = []
-    for text, category, embedding_json in all_clauses:
-        db_vec = np.array(json.loads(embedding_json))
-        # Calculate cosine similarity
-        similarity = np.dot(query_vec, db_vec) / (np.linalg.norm(query_vec) * np.linalg.norm(db_vec))
-        similarities.append((similarity, text, category))
+    if top_k <= 0:
+        return []
+    conn = _clause_vec_conn()
+    if conn is not None:
+        try:
+            return _find_similar_clauses_knn(conn, query_embedding, top_k)
+        except Exception as e:
+            print(f"sqlite-vec query failed, falling back to brute-force clause search: {e}")
+    matrix, scales, texts, categories = _load_clause_matrix()
+    if not texts:
+        return []
+    if scales is None:
+        query_vec = np.asarray(query_embedding, dtype=np.float32)
+        query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+    else:
+        # Stored codes are compared with the query's own codes, as in the KNN index
+        query_vec = int8_unit_query(query_embedding)
+    sims = _clause_similarities(matrix, scales, query_vec)
+    if top_k < len(texts):
+        idx = np.argpartition(-sims, top_k)[:top_k]
+    else:
+        idx = np.arange(len(texts))
+    idx = idx[np.argsort(-sims[idx])]
+    return [(float(sims[i]), texts[i], categories[i]) for i in idx]
     
-    # Sort by similarity and return the top_k
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    return similarities[:top_k]
+# FTS5 query over the risk themes in _is_risky_action_text (prefix terms cover inflections)
+RISKY_CLAUSE_FTS_QUERY = (
+    'indemnif* OR "hold harmless" OR "assumption of risk" OR "unlimited liability" OR waive* OR '
+    'penalt* OR "liquidated damages" OR "late fee" OR "governing law" OR jurisdiction OR '
+    '"sole discretion" OR terminat* OR default OR remedy'
+)
+
+def find_risky_clauses(query: str | None = None, limit: int = 20) -> list:
+    """Keyword lookup over the benchmark clauses via the clauses_fts index, best bm25 match first.
+
+    Returns (score, text, category) tuples like find_similar_clauses (higher score = better match),
+    or [] when the database has no FTS index.
+    """
+    try:
+        conn = _connect_benchmark_db()
+        try:
+            rows = conn.execute(
+                "SELECT bm25(clauses_fts) AS rank, c.text, c.category FROM clauses_fts "
+                "JOIN clauses c ON c.id = clauses_fts.rowid WHERE clauses_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query or RISKY_CLAUSE_FTS_QUERY, limit),
+            ).fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Risky clause lookup failed: {e}")
+        return []
+    return [(-float(rank), text, category) for rank, text, category in rows]
+
+EMBEDDING_MODEL = 'models/text-embedding-004'
+# Query embeddings keyed by sha256(model, task type, text); repeat benchmarks of a clause skip the API call
+_embedding_cache: LRUCache = LRUCache(maxsize=4096)
+_embedding_lock = threading.Lock()
+def _embedding_key(text: str, task_type: str) -> bytes:
+    return hashlib.sha256(f"{EMBEDDING_MODEL}\0{task_type}\0{text}".encode("utf-8")).digest()
+
+def _embed_batch_with_cache(texts: list[str], task_type: str = "RETRIEVAL_QUERY") -> list[list[float]]:
+    """Embeds texts in one embed_content call, sending only those missing from the LRU cache."""
+    keys = [_embedding_key(t, task_type) for t in texts]
+    with _embedding_lock:
+        found = {k: _embedding_cache[k] for k in keys if k in _embedding_cache}
+    missing = list(dict.fromkeys(k for k in keys if k not in found))
+    if missing:
+        by_key = dict(zip(keys, texts))
+        result = genai.embed_content(model=EMBEDDING_MODEL, content=[by_key[k] for k in missing], task_type=task_type)
+        fresh = dict(zip(missing, result['embedding']))
+        with _embedding_lock:
+            _embedding_cache.update(fresh)
+        found.update(fresh)
+    return [found[k] for k in keys]
+
+def _embed_query(text: str, task_type: str = "RETRIEVAL_QUERY") -> list[float]:
+    return _embed_batch_with_cache([text], task_type)[0]
+
+def _benchmark_from_similar(similar_clauses: list) -> dict:
+    if not similar_clauses:
+        return {"benchmark_result": "Could not find comparable clauses in the benchmark data.", "examples": []}
+
+    # Analyze the categories of the similar clauses
+    categories = [category for _, _, category in similar_clauses]
+    examples = [text for _, text, _ in similar_clauses]
     
+    # Simple logic: if any strict clauses are found, flag it as strict.
+    if any("Strict" in c for c in categories):
+        benchmark_result = "This clause appears stricter than the market standard."
+    elif any("Lenient" in c for c in categories):
+        benchmark_result = "This clause appears more lenient than the market standard."
+    else:
+        benchmark_result = "This clause appears to be a standard market term."
+        
+    return {"benchmark_result": benchmark_result, "examples": examples}
+
 async def get_clause_benchmark(clause_text: str) -> dict:
     """
     Analyzes a clause against the benchmark database using semantic search.
@@ -889,34 +1499,29 @@ async def get_clause_benchmark(clause_text: str) -> dict:
     
     try:
         # 1. Generate an embedding for the user's clause
-        result = genai.embed_content(model='models/text-embedding-004',
-                                     content=clause_text,
-                                     task_type="RETRIEVAL_QUERY")
-        query_embedding = result['embedding']
-        
-        # 2. Find the top 3 most similar clauses from our DB
-        similar_clauses = find_similar_clauses(query_embedding, top_k=3)
+        query_embedding = await asyncio.to_thread(_embed_query, clause_text)
         
-        if not similar_clauses:
-            return {"benchmark_result": "Could not find comparable clauses in the benchmark data.", "examples": []}
-
-        # 3. Analyze the categories of the similar clauses
-        categories = [category for _, _, category in similar_clauses]
-        examples = [text for _, text, _ in similar_clauses]
-        
-        # Simple logic: if any strict clauses are found, flag it as strict.
-        if any("Strict" in c for c in categories):
-            benchmark_result = "This clause appears stricter than the market standard."
-        elif any("Lenient" in c for c in categories):
-            benchmark_result = "This clause appears more lenient than the market standard."
-        else:
-            benchmark_result = "This clause appears to be a standard market term."
-            
-        return {"benchmark_result": benchmark_result, "examples": examples}
+        # 2. Find the top 3 most similar clauses from our DB and classify them
+        return _benchmark_from_similar(find_similar_clauses(query_embedding, top_k=3))
 
     except Exception as e:
         print(f"An error occurred during benchmarking: {e}")
         return {"benchmark_result": f"Error during analysis: {e}", "examples": []}
+
+async def get_clause_benchmarks_batch(clause_texts: list[str]) -> list[dict]:
+    """
+    Benchmarks several clauses (e.g. the risky actions of an analysis) with one batched embedding request.
+    """
+    if not model:
+        raise ValueError("Generative model not initialized.")
+    if not clause_texts:
+        return []
+    try:
+        embeddings = await asyncio.to_thread(_embed_batch_with_cache, clause_texts)
+        return [_benchmark_from_similar(find_similar_clauses(emb, top_k=3)) for emb in embeddings]
+    except Exception as e:
+        print(f"An error occurred during benchmarking: {e}")
+        return [{"benchmark_result": f"Error during analysis: {e}", "examples": []} for _ in clause_texts]
     
 def _is_subjective_question(question: str) -> bool:
     """Heuristic detection for subjective/judgment questions."""
@@ -930,24 +1535,57 @@ def _is_subjective_question(question: str) -> bool:
     ]
     return any(term in q for term in subjective_terms)
 
-async def answer_user_question(question: str, full_text: str, history: list | None = None) -> dict:
+# Vertex Q&A calls that haven't answered after this long get a second, identical request; the first
+# success wins. Off by default: every hedge is a billed call, so only enable it with a delay near the
+# observed p95 latency. ORACLE_MAX_CALLS caps the calls one question can start, hedges and retries together.
+ORACLE_HEDGE_DELAY = float(os.getenv("ORACLE_HEDGE_DELAY_MS", "0")) / 1000.0
+ORACLE_MAX_CALLS = max(1, int(os.getenv("ORACLE_MAX_CALLS", "3")))
+
+async def _hedged_to_thread(fn, *args, delay: float, max_calls: int = 1, backoff: float = 0.5):
+    """Runs fn(*args) in a thread, starting at most `max_calls` calls in total. A failed call is retried
+    after an exponential backoff; with `delay` > 0, a call still running after `delay` gets one duplicate.
+    The first success wins; raises the last error once the budget is spent and every call has failed.
+    Losing threads are left to finish on their own.
+    """
+    pending: set[asyncio.Future] = set()
+    started = failures = 0
+    last_err: BaseException | None = None
+
+    def _start():
+        nonlocal started
+        started += 1
+        pending.add(asyncio.ensure_future(asyncio.to_thread(fn, *args)))
+
+    _start()
+    while pending:
+        hedge = delay > 0 and len(pending) == 1 and started < max_calls
+        done, _ = await asyncio.wait(pending, timeout=delay if hedge else None, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            _start()
+            continue
+        for task in done:
+            pending.discard(task)
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+            last_err = task.exception()
+            failures += 1
+        if not pending and started < max_calls:
+            await asyncio.sleep(backoff * (2 ** (failures - 1)))
+            _start()
+    raise last_err
+
+async def answer_user_question(question: str, full_text: str, history: list[dict] | None = None) -> dict:
     """
     Answers a user's question based ONLY on the provided document text.
+    `history` holds {"role", "content"} dicts, oldest first.
     """
     if not model: raise ValueError("Generative model not initialized.")
     
     # Prepare recent conversation history (last 10 turns) for follow-up context
     history = history or []
-    def _format_msg(m):
-        if isinstance(m, dict):
-            role = m.get('role', 'user')
-            content = m.get('content', '')
-        else:
-            role = getattr(m, 'role', 'user')
-            content = getattr(m, 'content', '')
-        role = (role or 'user').upper()
-        return f"{role}: {content}"
-    formatted_history = "\n".join([_format_msg(m) for m in history[-10:]])
+    formatted_history = "\n".join(f"{(m['role'] or 'user').upper()}: {m['content']}" for m in history[-10:])
 
     subjective = _is_subjective_question(question)
     if subjective:
@@ -1013,43 +1651,64 @@ async def answer_user_question(question: str, full_text: str, history: list | No
         ---
         USER QUESTION: "{question}"
         """
+    # First-turn questions are cached semantically per document so rephrasings of the
+    # same question skip the LLM round-trip; follow-ups depend on history and are not cached
+    semantic_scope = None
+    question_embedding = None
+    if not history and llm_cache.is_enabled():
+        semantic_scope = llm_cache.input_hash("oracle", AI_PROVIDER, str(subjective), full_text)
+        try:
+            result = await asyncio.to_thread(genai.embed_content, model='models/text-embedding-004', content=question, task_type="SEMANTIC_SIMILARITY")
+            question_embedding = result['embedding']
+        except Exception:
+            question_embedding = None
+        cached = await asyncio.to_thread(llm_cache.semantic_get, semantic_scope, question_embedding)
+        if cached is not None:
+            return cached
+
+    async def _remember(data: dict) -> dict:
+        # An empty answer (blocked or truncated response) must not be served to later questions
+        if semantic_scope and question_embedding and llm_cache.has_answer(data):
+            await asyncio.to_thread(llm_cache.semantic_put, semantic_scope, question_embedding, data)
+        return data
+
     # Vertex AI path (only for Clause Oracle). Do not fallback to other providers.
     if AI_PROVIDER == "vertex":
         try:
             # Import locally to avoid hard dependency when not enabled
             from app import ai_provider as _ap
             # Vertex client is sync; use a thread to avoid blocking the loop
-            import asyncio as _asyncio
-            last_err: Exception | None = None
-            for attempt in range(3):
-                try:
-                    data = await _asyncio.to_thread(_ap.generate_oracle_json, prompt)
-                    if not isinstance(data, dict):
-                        data = {"answer": str(data or ""), "citation": ""}
-                    data.setdefault("answer", "")
-                    data.setdefault("citation", "")
-                    return data
-                except Exception as e:
-                    last_err = e
-                    # brief backoff before retrying
-                    if attempt < 2:
-                        await _asyncio.sleep(0.5 * (2 ** attempt))
-            print(f"Vertex AI path failed after retries: {last_err}")
-            return {"answer": "An error occurred while querying Vertex AI. Please try again.", "citation": ""}
+            try:
+                data = await _hedged_to_thread(_ap.generate_oracle_json, prompt, delay=ORACLE_HEDGE_DELAY, max_calls=ORACLE_MAX_CALLS)
+                if not isinstance(data, dict):
+                    data = {"answer": str(data or ""), "citation": ""}
+                data.setdefault("answer", "")
+                data.setdefault("citation", "")
+                return await _remember(data)
+            except Exception as e:
+                print(f"Vertex AI path failed after retries: {e}")
+                return {"answer": "An error occurred while querying Vertex AI. Please try again.", "citation": ""}
         except Exception as e:
             print(f"Vertex AI setup failed: {e}")
             return {"answer": "Vertex AI is not configured correctly.", "citation": ""}
 
     # Default provider path (used only when AI_PROVIDER != "vertex")
+    cache_key = llm_cache.input_hash("oracle", prompt)
+    cached = await asyncio.to_thread(llm_cache.get, cache_key)
+    if cached is not None:
+        return await _remember(cached)
     try:
-        generation_config = GenerationConfig(response_mime_type="application/json")
-        response = await model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
+        # Schema-constrained output always parses to {answer, citation}; raw text is kept only as a last resort
+        generation_config = GenerationConfig(response_mime_type="application/json", response_schema=schemas.QUERY_RESPONSE_SCHEMA)
+        response = await _generate_content(prompt, safety_settings=SAFETY_SETTINGS, generation_config=generation_config)
+        text = response.text or ''
         try:
-            data = json.loads(response.text)
-        except Exception:
-            text = (response.text or '').strip()
-            data = {"answer": text, "citation": ""}
-        return data
+            data = orjson.loads(text)
+        except orjson.JSONDecodeError:
+            data = {"answer": text.strip(), "citation": ""}
+        if llm_cache.has_answer(data):
+            await asyncio.to_thread(llm_cache.put, cache_key, data)
+        return await _remember(data)
     except Exception as e:
         print(f"An error occurred during Q&A: {e}")
         return {"answer": "An error occurred while processing your question.", "citation": ""}
@@ -1072,6 +1731,44 @@ async def create_analysis_record(owner_id: int, filename: str, assessment: str,
 # --- Highlight location (anchors on demand) ---
 import unicodedata as _ud
 
+# C-level equivalents of the per-character steps in _normalize_with_map, for callers that don't
+# need the index map. The quote-like modifier letters are dropped like the loop's quotes, and capital
+# sigma is pre-mapped because str.lower() would turn a word-final one into 'ς' (the loop yields 'σ').
+_NORM_TRANSLATE = str.maketrans({'–': '-', '—': '-', '‑': '-', 'ʼ': None, 'ʹ': None, 'Σ': 'σ'})
+_RE_NORM_SOFT_BREAK = re.compile(r"-[\n\r]")
+_RE_NORM_SPACE = re.compile(r"\s+")
+_RE_NORM_DROP = re.compile(r"[^\w%\- ]|_")
+
+
+def _normalize_fast(s: str) -> str:
+    """Same string as _normalize_with_map(s)[0], without building the index map."""
+    if not s:
+        return ""
+    s = _ud.normalize('NFKD', s).replace("\u00AD", "").replace("\u200B", "")
+    s = _RE_NORM_SPACE.sub(' ', _RE_NORM_SOFT_BREAK.sub('', s))
+    return _RE_NORM_DROP.sub('', s.translate(_NORM_TRANSLATE)).lower().strip()
+
+
+# Length-preserving form of _NORM_TRANSLATE for _normalize_with_map: every position must survive for
+# the index map, so quote-like modifier letters become a (dropped) quote instead of being deleted
+_NORM_MAP_TRANSLATE = str.maketrans({'–': '-', '—': '-', '‑': '-', 'ʼ': "'", 'ʹ': "'", 'Σ': 'σ'})
+# Character classes for _normalize_with_map (anything else, class 0, is dropped)
+_CH_KEEP, _CH_SPACE = 1, 2
+
+
+@functools.lru_cache(maxsize=1)
+def _char_classes() -> np.ndarray:
+    """Per-code-point class table (drop/keep/space) for _normalize_with_map; built once (~1 MB)."""
+    table = np.zeros(0x110000, dtype=np.uint8)
+    for cp in range(0x110000):
+        ch = chr(cp)
+        if ch.isalnum() or ch == '-' or ch == '%':
+            table[cp] = _CH_KEEP
+        elif ch.isspace():
+            table[cp] = _CH_SPACE
+    return table
+
+
 def _normalize_with_map(s: str) -> tuple[str, list[int]]:
     """Return a lenient, lowercased, whitespace-collapsed string and a map from
     normalized indices back to original indices. Removes soft hyphens, zero-width,
@@ -1083,67 +1780,51 @@ def _normalize_with_map(s: str) -> tuple[str, list[int]]:
     s = _ud.normalize('NFKD', s)
     # Strip control chars
     s = s.replace("\u00AD", "").replace("\u200B", "")
-    out = []
-    idx_map: list[int] = []
-    prev_was_space = False
-    i = 0
-    L = len(s)
-    while i < L:
-        ch = s[i]
-        # Handle hyphenation at line breaks: '-\n' -> ''
-        if ch == '-' and i + 1 < L and s[i+1] in ('\n', '\r'):
-            i += 2
-            continue
-        # Collapse whitespace to single space
-        if ch.isspace():
-            if not prev_was_space:
-                out.append(' ')
-                idx_map.append(i)
-                prev_was_space = True
-            i += 1
-            continue
-        prev_was_space = False
-        # Normalize common punctuation variants
-        if ch in '“”"′’‘`´ʼʹ’':
-            ch = '"' if ch in '“”"' else "'"
-        if ch in '–—‑':  # en/em/nb hyphens
-            ch = '-'
-        # Remove punctuation we don't want to match on
-        # Keep: hyphen, digits, letters, percent
-        if not (ch.isalnum() or ch in ['-', '%']):
-            i += 1
-            continue
-        out.append(ch.lower())
-        idx_map.append(i)
-        i += 1
+    # Handle hyphenation at line breaks: '-\n' -> ''
+    breaks = [m.start() for m in _RE_NORM_SOFT_BREAK.finditer(s)]
+    if breaks:
+        s = _RE_NORM_SOFT_BREAK.sub('', s)
+    # Classify every code point at once; a whitespace run survives as its first char
+    cps = np.frombuffer(s.translate(_NORM_MAP_TRANSLATE).lower().encode('utf-32-le'), dtype=np.uint32)
+    cls = _char_classes()[cps]
+    space = cls == _CH_SPACE
+    space[1:] &= ~space[:-1]
+    idx = np.flatnonzero((cls == _CH_KEEP) | space)
+    out = np.where(space[idx], np.uint32(32), cps[idx])
     # Remove leading/trailing spaces if any
-    norm = ''.join(out).strip()
-    # Rebuild idx_map for trimmed spaces
-    if out and (out[0] == ' ' or out[-1] == ' '):
-        # find first/last non-space in out
-        start = 0
-        end = len(out)
-        while start < end and out[start] == ' ': start += 1
-        while end > start and out[end-1] == ' ': end -= 1
-        norm = ''.join(out[start:end])
-        idx_map = idx_map[start:end]
-    return norm, idx_map
-
-_STOPWORDS = set('''a an and are as at be by for from has have in into is it its of on or that the this to will shall with each per including include includes such such as if then than whereas whereof thereof thereof herein hereby thereof pursuant under between both either neither not no nor any all more most least less few upon within without once when whenever while whose which who whom what where why how their there they're them they we you your our ours mine his her hers him he she i do does did can could may might must should would'''.split())
+    solid = np.flatnonzero(out != 32)
+    if not solid.size:
+        return "", []
+    start, end = int(solid[0]), int(solid[-1]) + 1
+    if breaks:
+        # Shift positions back past the removed '-\n' pairs
+        idx = idx + 2 * np.searchsorted(np.asarray(breaks) - 2 * np.arange(len(breaks)), idx, side='right')
+    return out[start:end].tobytes().decode('utf-32-le'), idx[start:end].tolist()
+
+_STOPWORDS = frozenset('''a an and are as at be by for from has have in into is it its of on or that the this to will shall with each per including include includes such such as if then than whereas whereof thereof thereof herein hereby thereof pursuant under between both either neither not no nor any all more most least less few upon within without once when whenever while whose which who whom what where why how their there they're them they we you your our ours mine his her hers him he she i do does did can could may might must should would'''.split())
 
 def _tokenize_norm(s: str) -> list[str]:
     return [t for t in (s or '').split(' ') if t]
 
 def _salient_tokens(tokens: list[str]) -> set[str]:
-    sal = set()
-    for t in tokens:
-        if t in _STOPWORDS:
-            continue
-        if len(t) >= 4 or any(c.isdigit() for c in t) or ('-' in t) or ('/' in t):
-            sal.add(t)
-    return sal
+    return {
+        t for t in tokens
+        if t not in _STOPWORDS and (len(t) >= 4 or '-' in t or '/' in t or any(c.isdigit() for c in t))
+    }
+
+@functools.lru_cache(maxsize=4096)
+def _query_terms(q_norm: str) -> tuple[tuple[str, ...], frozenset[str]]:
+    """(tokens, salient tokens) of a normalized query; highlights and locates repeat the same queries."""
+    tokens = tuple(_tokenize_norm(q_norm))
+    return tokens, frozenset(_salient_tokens(tokens))
+
+@functools.lru_cache(maxsize=256)
+def _page_token_sets(page_norm: str) -> tuple[frozenset[str], frozenset[tuple[str, str]]]:
+    """Whole tokens and adjacent token pairs of a normalized page, shared by every query anchored against it."""
+    page_tokens = page_norm.split()
+    return frozenset(page_tokens), frozenset(zip(page_tokens, page_tokens[1:]))
 
-def _best_scored_window(q_tokens: list[str], salient: set[str], page_norm: str) -> tuple[int, int, int, int] | None:
+def _best_scored_window(q_tokens: tuple[str, ...], salient: frozenset[str], page_norm: str) -> tuple[int, int, int, int] | None:
     """Return the best matching window (start,end,tokens_matched,salient_count)
     by scanning all contiguous token windows (len -> 3). Requires at least one
     salient token in the window to avoid generic matches.
@@ -1152,14 +1833,28 @@ def _best_scored_window(q_tokens: list[str], salient: set[str], page_norm: str)
         return None
     token_join = ' '.join
     best: tuple[int,int,int,int] | None = None
+    # A window's interior tokens are space-delimited on both sides, so any find() hit needs them
+    # (and their adjacent pairs) to occur as whole page tokens. Prefix counts of query tokens/pairs
+    # missing from the page make that check O(1) per window; only survivors pay for a find().
+    page_vocab, page_pairs = _page_token_sets(page_norm)
+    n = len(q_tokens)
+    sal_prefix = [0] * (n + 1)
+    miss_tok = [0] * (n + 1)
+    miss_pair = [0] * n
+    for j, t in enumerate(q_tokens):
+        sal_prefix[j + 1] = sal_prefix[j] + (t in salient)
+        miss_tok[j + 1] = miss_tok[j] + (t not in page_vocab)
+        if j + 1 < n:
+            miss_pair[j + 1] = miss_pair[j] + ((t, q_tokens[j + 1]) not in page_pairs)
     # Try decreasing window sizes
-    for win in range(len(q_tokens), 2, -1):
-        for i in range(0, len(q_tokens) - win + 1):
-            window = q_tokens[i:i+win]
-            sal_count = sum(1 for t in window if t in salient)
+    for win in range(n, 2, -1):
+        for i in range(0, n - win + 1):
+            sal_count = sal_prefix[i + win] - sal_prefix[i]
             if sal_count == 0:
                 continue  # skip generic windows
-            phrase = token_join(window)
+            if miss_tok[i + win - 1] - miss_tok[i + 1] or miss_pair[i + win - 2] - miss_pair[i + 1]:
+                continue
+            phrase = token_join(q_tokens[i:i+win])
             pos = page_norm.find(phrase)
             if pos >= 0:
                 cand = (pos, pos + len(phrase), win, sal_count)
@@ -1183,26 +1878,17 @@ def _expand_to_full_lines(text: str, start: int, end: int) -> tuple[int, int]:
     n = len(text or "")
     if n == 0:
         return start, end
-    # Find previous line break
-    s = start
-    i = start - 1
-    while i >= 0:
-        ch = text[i]
-        if ch == '\n' or ch == '\r':
-            s = i + 1
-            break
-        i -= 1
-    # Find next line break
-    e = end
-    j = end
-    while j < n:
-        ch = text[j]
-        if ch == '\n' or ch == '\r':
-            e = j
-            break
-        j += 1
+    # Nearest break before start / at-or-after end (str.rfind/find scan in C); a span with no break
+    # on that side keeps its original boundary
+    b = max(text.rfind('\n', 0, start), text.rfind('\r', 0, start))
+    s = b + 1 if b >= 0 else start
+    b_n = text.find('\n', end)
+    b_r = text.find('\r', end)
+    b = min(b_n, b_r) if b_n >= 0 and b_r >= 0 else max(b_n, b_r)
+    e = b if b >= 0 else end
     return max(0, s), min(n, e)
 
+@functools.lru_cache(maxsize=4096)
 def _score_action_text(t: str) -> int:
     """Heuristic severity score for an obligation string."""
     if not t:
@@ -1231,6 +1917,7 @@ def _score_action_text(t: str) -> int:
     score += min(5, len(s) // 80)
     return score
 
+@functools.lru_cache(maxsize=4096)
 def _is_risky_action_text(t: str) -> bool:
     """Classify whether an obligation text is risky enough to highlight.
     Uses keyword families across multiple risk themes.
@@ -1254,46 +1941,116 @@ def _is_risky_action_text(t: str) -> bool:
     num_money = any(ch.isdigit() for ch in s) and ("$" in s or "%" in s)
     return hits >= 1 or num_money or _score_action_text(t) >= 5
 
-def _find_best_anchor_in_pages(pages: list[str], query_text: str) -> tuple[int, int, int, str] | None:
+# Page text -> (norm, idx_map). Locate/highlight requests for one analysis re-anchor against the
+# same pages, so each page is normalized once rather than per request; results are shared, never mutate.
+_normalize_page = functools.lru_cache(maxsize=128)(_normalize_with_map)
+
+def _normalize_pages(pages: list[str]) -> list[tuple[str, list[int]] | None]:
+    """_normalize_with_map for every page (None for empty pages), computed once per highlight pass."""
+    return [_normalize_page(p) if p else None for p in pages or []]
+
+def _exact_hits_in_pages(query_texts: list[str], pages_norm: list[tuple[str, list[int]] | None]) -> dict[str, dict[int, int]]:
+    """{query_text: {page_idx: first normalized position}} for every query occurring verbatim (after
+    normalization) on a page. One Aho-Corasick pass per page replaces a find() per query per page.
+    """
+    by_norm: dict[str, list[str]] = {}
+    for t in query_texts:
+        q_norm = _normalize_fast(t) if t else ''
+        if q_norm:
+            by_norm.setdefault(q_norm, []).append(t)
+    hits: dict[str, dict[int, int]] = {t: {} for ts in by_norm.values() for t in ts}
+    if not by_norm:
+        return hits
+    automaton = None
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for q_norm in by_norm:
+            automaton.add_word(q_norm, q_norm)
+        automaton.make_automaton()
+    for idx, page_norm in enumerate(pages_norm):
+        if page_norm is None:
+            continue
+        norm = page_norm[0]
+        if automaton is not None:
+            # Matches arrive in end order, so the first one seen per pattern is its leftmost occurrence
+            first: dict[str, int] = {}
+            for end, q_norm in automaton.iter(norm):
+                if q_norm not in first:
+                    first[q_norm] = end - len(q_norm) + 1
+        else:
+            first = {q_norm: pos for q_norm in by_norm if (pos := norm.find(q_norm)) >= 0}
+        for q_norm, pos in first.items():
+            for t in by_norm[q_norm]:
+                hits[t][idx] = pos
+    return hits
+
+def _find_best_anchor_in_pages(pages: list[str], query_text: str, pages_norm: list[tuple[str, list[int]] | None] | None = None, exact_hits: dict[int, int] | None = None) -> tuple[int, int, int, str] | None:
     """Return (page_idx, start, end, strategy) for best match of query across pages using
     the same normalization and windowing approach as locate_text_anchors.
+    Pass pages_norm from _normalize_pages when anchoring several queries against the same pages,
+    and exact_hits (this query's entry from _exact_hits_in_pages) to skip the per-page find().
     """
     if not query_text:
         return None
-    q_norm, _ = _normalize_with_map(query_text)
+    q_norm = _normalize_fast(query_text)
     if not q_norm:
         return None
-    q_tokens = _tokenize_norm(q_norm)
-    q_salient = _salient_tokens(q_tokens)
-    candidates: list[tuple[int, int, int, int, int, str]] = []
-    # (score, page_idx, start_char, end_char, norm_pos, strategy)
-    for idx, page_text in enumerate(pages or []):
-        if not page_text:
-            continue
-        norm, idx_map = _normalize_with_map(page_text)
-        pos = norm.find(q_norm)
-        if pos >= 0:
-            start = idx_map[pos] if pos < len(idx_map) else 0
-            end_norm = pos + len(q_norm)
-            end = idx_map[end_norm-1] + 1 if end_norm-1 < len(idx_map) else start + len(query_text)
-            score = 1_000_000 + (end - start)
-            candidates.append((score, idx, start, end, pos, "text:normalized"))
-        else:
-            if q_tokens:
-                found = _best_scored_window(q_tokens, q_salient, norm)
-                if found:
-                    s, e, win, sal = found
-                    start = idx_map[s] if s < len(idx_map) else 0
-                    end = idx_map[e-1] + 1 if e-1 < len(idx_map) else start
-                    if end > start:
-                        score = win*100 + sal*10
-                        candidates.append((score, idx, start, end, s, "text:ngram"))
-    if not candidates:
+    q_tokens, q_salient = _query_terms(q_norm)
+    # Best candidate so far as (score, page_idx, start_char, end_char, norm_pos, strategy); ranked by
+    # highest score, then earliest page, then earliest position
+    best: tuple[int, int, int, int, int, str] | None = None
+    if pages_norm is None:
+        pages_norm = _normalize_pages(pages)
+    if exact_hits is None:
+        exact_hits = {idx: pos for idx, page_norm in enumerate(pages_norm) if page_norm is not None and (pos := page_norm[0].find(q_norm)) >= 0}
+    for idx, pos in exact_hits.items():
+        idx_map = pages_norm[idx][1]
+        start = idx_map[pos] if pos < len(idx_map) else 0
+        end_norm = pos + len(q_norm)
+        end = idx_map[end_norm-1] + 1 if end_norm-1 < len(idx_map) else start + len(query_text)
+        score = 1_000_000 + (end - start)
+        cand = (score, idx, start, end, pos, "text:normalized")
+        if best is None or (-cand[0], cand[1], cand[4]) < (-best[0], best[1], best[4]):
+            best = cand
+    # Any exact hit outranks every n-gram window, so windows are only scored when there is none
+    if best is None and q_tokens:
+        for idx, page_norm in enumerate(pages_norm):
+            if page_norm is None:
+                continue
+            norm, idx_map = page_norm
+            found = _best_scored_window(q_tokens, q_salient, norm)
+            if found:
+                s, e, win, sal = found
+                start = idx_map[s] if s < len(idx_map) else 0
+                end = idx_map[e-1] + 1 if e-1 < len(idx_map) else start
+                if end > start:
+                    score = win*100 + sal*10
+                    cand = (score, idx, start, end, s, "text:ngram")
+                    if best is None or (-cand[0], cand[1], cand[4]) < (-best[0], best[1], best[4]):
+                        best = cand
+    if best is None:
         return None
-    candidates.sort(key=lambda x: (-x[0], x[1], x[4]))
-    _, page_idx, start, end, _, strategy = candidates[0]
+    _, page_idx, start, end, _, strategy = best
     return page_idx, start, end, strategy
 
+def _select_risky_texts(actions) -> list[str]:
+    """Distinct action texts to highlight (at most 12): the risky ones, or else the top 5 by score.
+
+    Repeated texts would only re-find an already-seen span, so they are dropped before scoring.
+    """
+    texts: list[str] = []
+    for a in actions:
+        txt = a.get('text') if isinstance(a, dict) else getattr(a, 'text', None)
+        if txt:
+            texts.append(txt)
+    texts = list(dict.fromkeys(texts))
+    risky_texts = [t for t in texts if _is_risky_action_text(t)]
+    if not risky_texts:
+        # Fallback: take top 5 by score (nsmallest keeps sorted()'s order for ties)
+        risky_texts = heapq.nsmallest(5, texts, key=lambda t: (-_score_action_text(t), -len(t)))
+    return risky_texts[:12]
+
+
 def _compute_risk_highlights_from_fa(fa: schemas.FullAnalysisResponse) -> list[schemas.AnchorMatch]:
     """Select multiple risky obligations and return their best line-bounded anchors.
     Returns a list for fast, zero-lag rendering.
@@ -1302,29 +2059,14 @@ def _compute_risk_highlights_from_fa(fa: schemas.FullAnalysisResponse) -> list[s
     pages = getattr(fa, 'extracted_text', None) or []
     if not actions or not pages:
         return []
-    # Score and filter risky items
-    items: list[tuple[int, int, str]] = []  # (score, len, text)
-    risky_texts: list[str] = []
-    for a in actions:
-        try:
-            txt = getattr(a, 'text', None) or (a.get('text') if isinstance(a, dict) else '')
-        except Exception:
-            txt = ''
-        if not txt:
-            continue
-        sc = _score_action_text(txt)
-        if _is_risky_action_text(txt):
-            risky_texts.append(txt)
-        items.append((sc, len(txt), txt))
-    if not risky_texts:
-        # Fallback: take top 5 by score
-        items.sort(key=lambda x: (-x[0], -x[1]))
-        risky_texts = [t for _, _, t in items[:5]]
+    risky_texts = _select_risky_texts(actions)
     # Build anchors for each risky text (cap to 12)
     matches: list[schemas.AnchorMatch] = []
     seen_spans: set[tuple[int,int,int]] = set()  # (page, start, end)
-    for txt in risky_texts[:12]:
-        found = _find_best_anchor_in_pages(pages, txt)
+    pages_norm = _normalize_pages(pages)
+    exact_hits = _exact_hits_in_pages(risky_texts, pages_norm)
+    for txt in risky_texts:
+        found = _find_best_anchor_in_pages(pages, txt, pages_norm, exact_hits.get(txt))
         if not found:
             continue
         page_idx, s, e, strategy = found
@@ -1335,52 +2077,10 @@ def _compute_risk_highlights_from_fa(fa: schemas.FullAnalysisResponse) -> list[s
         seen_spans.add(key)
         match = schemas.AnchorMatch(page_index=page_idx, char_start=s2, char_end=e2, strategy=(strategy + "+risk"))
         # If scanned pages exist, compute OCR box as well
-        try:
-            if getattr(fa, 'page_images', None) and page_idx is not None and 0 <= page_idx < len(fa.page_images):
-                cache_key = (int(getattr(fa, 'id', 0) or 0), int(page_idx))
-                cached = _OCR_CACHE.get(cache_key)
-                if cached is None:
-                    _get_or_build_ocr_cache_for_page_sync(int(getattr(fa, 'id', 0) or 0), int(page_idx), fa.page_images[page_idx])
-                    cached = _OCR_CACHE.get(cache_key)
-                if cached is not None:
-                    agg_norm, norm2raw, idx_map, W, H = cached
-                    q_raw = (pages[page_idx] or '')[s2:e2]
-                    q_norm2, _ = _normalize_with_map(q_raw)
-                    q_tokens = _tokenize_norm(q_norm2)
-                    q_salient = _salient_tokens(q_tokens)
-                    mpos = agg_norm.find(q_norm2) if q_norm2 else -1
-                    mend = mpos + len(q_norm2) if mpos >= 0 else -1
-                    if mpos < 0 and q_tokens:
-                        found2 = _best_scored_window(q_tokens, q_salient, agg_norm)
-                        if found2:
-                            mpos, mend, _, _ = found2
-                    if mpos >= 0 and mend > mpos:
-                        s_raw = norm2raw[mpos] if mpos < len(norm2raw) else 0
-                        e_raw = norm2raw[mend-1] + 1 if mend-1 < len(norm2raw) else s_raw
-                        x_min = y_min = 1.0
-                        x_max = y_max = 0.0
-                        found_any = False
-                        for s0, e0, rect in idx_map:
-                            if e0 <= s_raw:
-                                continue
-                            if s0 >= e_raw:
-                                break
-                            x, y, w, h = rect
-                            x_min = min(x_min, x)
-                            y_min = min(y_min, y)
-                            x_max = max(x_max, x + w)
-                            y_max = max(y_max, y + h)
-                            found_any = True
-                        if found_any:
-                            pad = 0.005
-                            x_min = max(0.0, x_min - pad)
-                            y_min = max(0.0, y_min - pad)
-                            x_max = min(1.0, x_max + pad)
-                            y_max = min(1.0, y_max + pad)
-                            match.boxes = [schemas.AnchorBox(x=x_min, y=y_min, w=max(0.0, x_max - x_min), h=max(0.0, y_max - y_min))]
-                            match.strategy = (match.strategy or "") + "+ocr"
-        except Exception:
-            pass
+        box = _risk_match_ocr_box(getattr(fa, 'page_images', None), int(getattr(fa, 'id', 0) or 0), page_idx, pages[page_idx], s2, e2)
+        if box is not None:
+            match.boxes = [box]
+            match.strategy += "+ocr"
         matches.append(match)
     return matches
 
@@ -1388,240 +2088,407 @@ def compute_risk_highlights_for_ia(ia: schemas.IntelligentAnalysis) -> list[sche
     """Compute risky line highlight(s) from an IntelligentAnalysis object.
     Mirrors the FA-based method but avoids requiring a full FA.
     """
-    try:
-        actions = getattr(ia, 'identified_actions', None) or []
-        pages = getattr(ia, 'extracted_text', None) or []
-        if not actions or not pages:
-            return []
-        # Score and filter risky items
-        items: list[tuple[int, int, str]] = []
-        risky_texts: list[str] = []
-        for a in actions:
-            try:
-                txt = getattr(a, 'text', None) or (a.get('text') if isinstance(a, dict) else '')
-            except Exception:
-                txt = ''
-            if not txt:
-                continue
-            sc = _score_action_text(txt)
-            if _is_risky_action_text(txt):
-                risky_texts.append(txt)
-            items.append((sc, len(txt), txt))
-        if not risky_texts:
-            items.sort(key=lambda x: (-x[0], -x[1]))
-            risky_texts = [t for _, _, t in items[:5]]
-        matches: list[schemas.AnchorMatch] = []
-        seen_spans: set[tuple[int,int,int]] = set()
-        for txt in risky_texts[:12]:
-            found = _find_best_anchor_in_pages(pages, txt)
-            if not found:
-                continue
-            page_idx, s, e, strategy = found
-            s2, e2 = _expand_to_full_lines(pages[page_idx], s, e)
-            key = (page_idx, s2, e2)
-            if key in seen_spans:
-                continue
-            seen_spans.add(key)
-            match = schemas.AnchorMatch(page_index=page_idx, char_start=s2, char_end=e2, strategy=(strategy + "+risk"))
+    actions = getattr(ia, 'identified_actions', None) or []
+    pages = getattr(ia, 'extracted_text', None) or []
+    if not actions or not pages:
+        return []
+    risky_texts = _select_risky_texts(actions)
+    matches: list[schemas.AnchorMatch] = []
+    seen_spans: set[tuple[int,int,int]] = set()
+    pages_norm = _normalize_pages(pages)
+    exact_hits = _exact_hits_in_pages(risky_texts, pages_norm)
+    for txt in risky_texts:
+        found = _find_best_anchor_in_pages(pages, txt, pages_norm, exact_hits.get(txt))
+        if not found:
+            continue
+        page_idx, s, e, strategy = found
+        s2, e2 = _expand_to_full_lines(pages[page_idx], s, e)
+        key = (page_idx, s2, e2)
+        if key in seen_spans:
+            continue
+        seen_spans.add(key)
+        match = schemas.AnchorMatch(page_index=page_idx, char_start=s2, char_end=e2, strategy=(strategy + "+risk"))
         # If scanned images exist, attempt to compute OCR box as well
-        try:
-            if getattr(ia, 'page_images', None) and page_idx is not None and 0 <= page_idx < len(ia.page_images):
-                aid = int(getattr(ia, 'id', 0) or 0)
-                cache = _get_or_build_ocr_cache_for_page_sync(aid, int(page_idx), ia.page_images[page_idx])
-                if cache:
-                    agg_norm, norm2raw, idx_map, W, H = cache
-                    q_raw = (pages[page_idx] or '')[s2:e2]
-                    q_norm2, _ = _normalize_with_map(q_raw)
-                    q_tokens = _tokenize_norm(q_norm2)
-                    q_salient = _salient_tokens(q_tokens)
-                    mpos = agg_norm.find(q_norm2) if q_norm2 else -1
-                    mend = mpos + len(q_norm2) if mpos >= 0 else -1
-                    if mpos < 0 and q_tokens:
-                        found2 = _best_scored_window(q_tokens, q_salient, agg_norm)
-                        if found2:
-                            mpos, mend, _, _ = found2
-                    if mpos >= 0 and mend > mpos:
-                        s_raw = norm2raw[mpos] if mpos < len(norm2raw) else 0
-                        e_raw = norm2raw[mend-1] + 1 if mend-1 < len(norm2raw) else s_raw
-                        x_min = y_min = 1.0
-                        x_max = y_max = 0.0
-                        found_any = False
-                        for s0, e0, rect in idx_map:
-                            if e0 <= s_raw:
-                                continue
-                            if s0 >= e_raw:
-                                break
-                            x, y, w, h = rect
-                            x_min = min(x_min, x)
-                            y_min = min(y_min, y)
-                            x_max = max(x_max, x + w)
-                            y_max = max(y_max, y + h)
-                            found_any = True
-                        if found_any:
-                            pad = 0.005
-                            x_min = max(0.0, x_min - pad)
-                            y_min = max(0.0, y_min - pad)
-                            x_max = min(1.0, x_max + pad)
-                            y_max = min(1.0, y_max + pad)
-                            match.boxes = [schemas.AnchorBox(x=x_min, y=y_min, w=max(0.0, x_max - x_min), h=max(0.0, y_max - y_min))]
-                            match.strategy = (match.strategy or "") + "+ocr"
-        except Exception:
-            pass
+        box = _risk_match_ocr_box(getattr(ia, 'page_images', None), int(getattr(ia, 'id', 0) or 0), page_idx, pages[page_idx], s2, e2)
+        if box is not None:
+            match.boxes = [box]
+            match.strategy += "+ocr"
         matches.append(match)
-        # continue building all matches (do not return early)
-        
-        
-        
-        
-        
-        
-        return matches
+    return matches
+
+
+def _risk_match_ocr_box(page_images: list[str] | None, analysis_id: int, page_idx: int, page_text: str, s2: int, e2: int) -> schemas.AnchorBox | None:
+    """OCR box for a risk highlight's line span [s2, e2) when the page is scanned, else None.
+
+    The box is an extra: any failure while building it leaves the highlight as a box-less text match.
+    """
+    if not page_images or not 0 <= page_idx < len(page_images):
+        return None
+    try:
+        return _ocr_box_for_span(page_images[page_idx], analysis_id, page_idx, page_text, s2, e2)
+    except Exception as e:
+        print(f"OCR box for page {page_idx + 1} failed: {e}")
+        return None
+
+def _ocr_box_for_span(ref: str, analysis_id: int, page_idx: int, page_text: str, s2: int, e2: int) -> schemas.AnchorBox | None:
+    cached = _get_or_build_ocr_cache_for_page_sync(analysis_id, page_idx, ref)
+    if cached is None:
+        return None
+    agg_norm, norm2raw, idx_map, W, H, starts = cached
+    q_norm2 = _normalize_fast((page_text or '')[s2:e2])
+    q_tokens, q_salient = _query_terms(q_norm2)
+    mpos = agg_norm.find(q_norm2) if q_norm2 else -1
+    mend = mpos + len(q_norm2) if mpos >= 0 else -1
+    if mpos < 0 and q_tokens:
+        found2 = _best_scored_window(q_tokens, q_salient, agg_norm)
+        if found2:
+            mpos, mend, _, _ = found2
+    if mpos < 0 or mend <= mpos:
+        return None
+    s_raw = norm2raw[mpos] if mpos < len(norm2raw) else 0
+    e_raw = norm2raw[mend-1] + 1 if mend-1 < len(norm2raw) else s_raw
+    return _ocr_span_box(idx_map, starts, s_raw, e_raw)
+
+# Remote page images go through one pooled keep-alive session (shared by the OCR worker threads) instead
+# of a fresh TCP/TLS handshake per fetch; images are already compressed, so skip gzip negotiation
+_HTTP = requests.Session()
+_HTTP.headers["Accept-Encoding"] = "identity"
+for _scheme in ("https://", "http://"):
+    _HTTP.mount(_scheme, HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.2)))
+
+def _load_page_image_bytes(ref: str) -> bytes | None:
+    """Returns image bytes for a stored page reference: data URI, local page URL, or remote URL."""
+    if not ref:
+        return None
+    try:
+        if ref.startswith('data:image'):
+            return _b64decode(ref[ref.index(',') + 1:])
+        if ref.startswith('http://') or ref.startswith('https://'):
+            r = _HTTP.get(ref, timeout=5)
+            r.raise_for_status()
+            return r.content
+        return page_store.read_local_page_image(ref)
     except Exception:
+        return None
+
+# OCR uploads are capped at this many pixels on the longest side; boxes are normalized, so scale is transparent
+OCR_IMAGE_MAX_SIDE = 2000
+OCR_IMAGE_JPEG_QUALITY = 85
+# Prepared OCR payloads keyed by _page_ref_digest, so a hit skips the fetch/base64 decode entirely
+_ocr_image_cache: LRUCache = LRUCache(maxsize=64)
+_ocr_image_lock = threading.Lock()
+
+def _page_ref_digest(ref: str) -> bytes:
+    """Digest identifying the page image behind a stored reference (data URI or URL).
+
+    URLs are identified by their path: the query carries the page-store key or a V4 signature,
+    which changes every time the URL is re-signed while the object stays the same.
+    """
+    ref = ref or ""
+    if not ref.startswith('data:'):
+        ref = ref.split('?', 1)[0]
+    return hashlib.blake2b(ref.encode("utf-8"), digest_size=16).digest()
+
+def _prepare_ocr_image(ref: str) -> tuple[bytes, str] | None:
+    """Returns (bytes, mime type) to send to OCR for a stored page reference, or None if it can't be loaded.
+
+    Pages larger than OCR_IMAGE_MAX_SIDE are downscaled, and the page is re-encoded as JPEG when that
+    is smaller than the stored PNG; otherwise the original bytes are sent unchanged.
+    """
+    key = _page_ref_digest(ref)
+    with _ocr_image_lock:
+        hit = _ocr_image_cache.get(key)
+    if hit is not None:
+        return hit
+    raw = _load_page_image_bytes(ref)
+    if not raw:
+        return None
+    prepared = (raw, "image/png")
+    try:
+        import fitz  # PyMuPDF
+        pix = fitz.Pixmap(raw)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        if pix.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        longest = max(pix.width, pix.height)
+        scaled = longest > OCR_IMAGE_MAX_SIDE
+        if scaled:
+            f = OCR_IMAGE_MAX_SIDE / longest
+            pix = fitz.Pixmap(pix, max(1, round(pix.width * f)), max(1, round(pix.height * f)), None)
+        jpeg = pix.tobytes("jpeg", jpg_quality=OCR_IMAGE_JPEG_QUALITY)
+        if scaled or len(jpeg) < len(raw):
+            prepared = (jpeg, "image/jpeg")
+    except Exception:
+        pass
+    with _ocr_image_lock:
+        _ocr_image_cache[key] = prepared
+    return prepared
+
+OCR_BOX_PAD = 0.005
+
+def _ocr_span_box(idx_map: list, starts: list[int] | None, s_raw: int, e_raw: int) -> schemas.AnchorBox | None:
+    """Padded union box of the OCR tokens overlapping raw span [s_raw, e_raw), or None if none do.
+
+    `starts` (from the cache entry) holds the tokens' sorted start offsets, so the overlapping run is
+    found by bisection; None means the tokens aren't in start order and the whole map is scanned.
+    """
+    if starts is not None:
+        # Tokens don't overlap each other, so only the one just before s_raw can still reach into the span
+        lo = max(0, bisect.bisect_right(starts, s_raw) - 1)
+        hi = bisect.bisect_left(starts, e_raw, lo)
+        rects = [rect for s0, e0, rect in idx_map[lo:hi] if e0 > s_raw]
+    else:
+        rects = []
+        for s0, e0, rect in idx_map:
+            if e0 <= s_raw:
+                continue
+            if s0 >= e_raw:
+                break
+            rects.append(rect)
+    if not rects:
+        return None
+    x_min = max(0.0, min(1.0, min(r[0] for r in rects)) - OCR_BOX_PAD)
+    y_min = max(0.0, min(1.0, min(r[1] for r in rects)) - OCR_BOX_PAD)
+    x_max = min(1.0, max(0.0, max(r[0] + r[2] for r in rects)) + OCR_BOX_PAD)
+    y_max = min(1.0, max(0.0, max(r[1] + r[3] for r in rects)) + OCR_BOX_PAD)
+    return schemas.AnchorBox(x=x_min, y=y_min, w=max(0.0, x_max - x_min), h=max(0.0, y_max - y_min))
+
+
+def _idx_map_starts(idx_map: list) -> list[int] | None:
+    """Token start offsets for _ocr_span_box when idx_map is in start order with no overlaps, else None."""
+    starts = [s0 for s0, _, _ in idx_map]
+    if all(idx_map[i][1] <= starts[i + 1] and starts[i] <= starts[i + 1] for i in range(len(starts) - 1)):
+        return starts
+    return None
+
+
+def _polys_to_rects(polys: list, scales: list) -> list[tuple[float, float, float, float]]:
+    """(x, y, w, h) bounding rects of vertex polygons, each divided by its (sx, sy) scale.
+
+    Polygons are [(x, y), ...] lists; an empty one yields a zero rect. Four-vertex polygons (every
+    Vision word and Document AI token in practice) are reduced in one NumPy min/max pass.
+    """
+    if not polys:
         return []
+    if all(len(p) == 4 for p in polys):
+        pts = np.asarray(polys, dtype=np.float64)
+        sc = np.asarray(scales, dtype=np.float64)
+        lo = pts.min(axis=1)
+        rects = np.concatenate((lo / sc, (pts.max(axis=1) - lo) / sc), axis=1)
+        return [tuple(r) for r in np.maximum(rects, 0.0).tolist()]
+    rects = []
+    for pts, (sx, sy) in zip(polys, scales):
+        if not pts:
+            rects.append((0.0, 0.0, 0.0, 0.0))
+            continue
+        xs = [x for x, _ in pts]
+        ys = [y for _, y in pts]
+        x0, x1 = min(xs), max(xs)
+        y0, y1 = min(ys), max(ys)
+        rects.append((max(0.0, x0 / sx), max(0.0, y0 / sy), max(0.0, (x1 - x0) / sx), max(0.0, (y1 - y0) / sy)))
+    return rects
+
+
+def _docai_page_to_idx_map(page0, W: float, H: float) -> list:
+    """[(start_raw, end_raw, rect)] for a Document AI page's tokens; rects are normalized to the page."""
+    spans = []
+    polys = []
+    scales = []
+    for token in getattr(page0, 'tokens', []) or []:
+        layout = getattr(token, 'layout', None)
+        if not layout:
+            continue
+        ta = getattr(layout, 'text_anchor', None)
+        segs = getattr(ta, 'text_segments', []) if ta else []
+        if not segs:
+            continue
+        spans.append((int(getattr(segs[0], 'start_index', 0) or 0), int(getattr(segs[0], 'end_index', 0) or 0)))
+        bp = getattr(layout, 'bounding_poly', None)
+        nvs = getattr(bp, 'normalized_vertices', None) if bp is not None else None
+        if nvs:
+            polys.append([(v.x, v.y) for v in nvs])
+            scales.append((1.0, 1.0))
+        else:
+            vs = (getattr(bp, 'vertices', None) or []) if bp is not None else []
+            polys.append([(v.x, v.y) for v in vs])
+            scales.append((W, H))
+    return [(s, e, rect) for (s, e), rect in zip(spans, _polys_to_rects(polys, scales))]
+
+
+def _docai_ocr_entry(doc) -> tuple | None:
+    """Builds an _OCR_CACHE entry from a Document AI document, or None when it has no text."""
+    if not doc or getattr(doc, 'text', None) is None:
+        return None
+    agg_raw = doc.text or ''
+    try:
+        page0 = doc.pages[0]
+        dim = getattr(page0, 'dimension', None)
+        W = float(getattr(dim, 'width', 1.0) or 1.0)
+        H = float(getattr(dim, 'height', 1.0) or 1.0)
+    except Exception:
+        W = H = 1.0
+        page0 = None
+    idx_map = _docai_page_to_idx_map(page0, W, H) if page0 is not None else []
+    agg_norm, norm2raw = _normalize_with_map(agg_raw)
+    return (agg_norm, norm2raw, idx_map, W, H, _idx_map_starts(idx_map))
+
+
+def _vision_page_to_tokens_and_map(page) -> tuple[str, list]:
+    """Joins a Vision page's words with single spaces; returns (text, [(start, end, rect)]) per word."""
+    W = float(page.width or 1)
+    H = float(page.height or 1)
+    words = []
+    polys = []
+    for block in page.blocks:
+        for para in block.paragraphs:
+            for word in para.words:
+                t = "".join([s.text for s in word.symbols])
+                if not t:
+                    continue
+                words.append(t)
+                polys.append([(v.x, v.y) for v in word.bounding_box.vertices])
+    raw_idx_map = []
+    pos0 = 0
+    for t, rect in zip(words, _polys_to_rects(polys, [(W, H)] * len(polys))):
+        raw_idx_map.append((pos0, pos0 + len(t), rect))
+        pos0 += len(t) + 1
+    return ' '.join(words), raw_idx_map
+
+
+def _vision_ocr_entry(annotation) -> tuple | None:
+    """Builds an _OCR_CACHE entry from a Vision AnnotateImageResponse, or None when it has no pages."""
+    fta = annotation.full_text_annotation
+    if not fta or not getattr(fta, 'pages', None):
+        return None
+    page = fta.pages[0]
+    agg_raw, raw_idx_map = _vision_page_to_tokens_and_map(page)
+    agg_norm, norm2raw = _normalize_with_map(agg_raw)
+    return (agg_norm, norm2raw, raw_idx_map, float(page.width or 1), float(page.height or 1), _idx_map_starts(raw_idx_map))
+
+
 def _get_or_build_ocr_cache_for_page_sync(analysis_id: int, pidx: int, data_uri: str):
     """Populate OCR cache for a scanned page synchronously using Cloud Vision (fallback).
     Returns the cached tuple or None on failure. Only used for scanned pages.
     """
+    if not data_uri:
+        return None
+    key = _ocr_cache_key(analysis_id, pidx, data_uri)
+    cached = _ocr_cache_get(key)
+    if cached is not None:
+        return cached
+    if _ocr_claim(key) is not None:
+        # Another caller is OCRing this page. Callers run on the shared default executor, which the
+        # owner's own OCR also needs, so don't park this thread on it: go without the box this time.
+        return None
+    entry = None
     try:
-        key = (int(analysis_id), int(pidx))
-        cached = _OCR_CACHE.get(key)
-        if cached is not None:
-            return cached
-        if not data_uri:
-            return None
-        img_bytes = None
-        if data_uri.startswith('data:image'):
-            try:
-                b64 = data_uri.split(',', 1)[1]
-                img_bytes = base64.b64decode(b64)
-            except Exception:
-                img_bytes = None
-        elif data_uri.startswith('http://') or data_uri.startswith('https://'):
-            try:
-                r = requests.get(data_uri, timeout=5)
-                r.raise_for_status()
-                img_bytes = r.content
-            except Exception:
-                img_bytes = None
-        if not img_bytes:
-            return None
-        # Prefer Document AI if configured (synchronous client)
+        entry = _build_ocr_entry_sync(data_uri)
+    finally:
+        _ocr_release(key, entry)
+    return entry
+
+def _build_ocr_entry_sync(data_uri: str):
+    """OCRs one page image (Document AI if configured, else Vision) into an _OCR_CACHE entry, or None."""
+    # Loading never raises (unreadable refs come back as None); only the two OCR calls are guarded
+    prepared = _prepare_ocr_image(data_uri)
+    if not prepared:
+        return None
+    img_bytes, img_mime = prepared
+    # Prefer Document AI if configured (synchronous client)
+    docai_name = _docai_processor_name()
+    if docai_name:
         try:
-            processor_id = os.environ.get("DOCAI_PROCESSOR_ID")
-            location = os.environ.get("DOCAI_LOCATION", "us")
-            project_id = os.environ.get("DOCAI_PROJECT_ID")
-            if not project_id:
-                try:
-                    creds, default_project = google.auth.default()
-                    if default_project:
-                        project_id = default_project
-                except Exception:
-                    project_id = None
-            if documentai is not None and processor_id and project_id:
-                da_client_sync = documentai.DocumentProcessorServiceClient()
-                name = da_client_sync.processor_path(project_id, location, processor_id)
-                raw_document = documentai.RawDocument(content=img_bytes, mime_type="image/png")
-                req = documentai.ProcessRequest(name=name, raw_document=raw_document)
-                resp = da_client_sync.process_document(request=req)
-                doc = getattr(resp, 'document', None)
-                if doc and getattr(doc, 'text', None) is not None:
-                    agg_raw = doc.text or ''
-                    try:
-                        page0 = doc.pages[0]
-                        dim = getattr(page0, 'dimension', None)
-                        W = float(getattr(dim, 'width', 1.0) or 1.0)
-                        H = float(getattr(dim, 'height', 1.0) or 1.0)
-                    except Exception:
-                        W = H = 1.0
-                        page0 = None
-                    idx_map = []
-                    if page0 is not None:
-                        for token in getattr(page0, 'tokens', []) or []:
-                            layout = getattr(token, 'layout', None)
-                            if not layout:
-                                continue
-                            ta = getattr(layout, 'text_anchor', None)
-                            segs = getattr(ta, 'text_segments', []) if ta else []
-                            if not segs:
-                                continue
-                            start_raw = int(getattr(segs[0], 'start_index', 0) or 0)
-                            end_raw = int(getattr(segs[0], 'end_index', 0) or 0)
-                            bp = getattr(layout, 'bounding_poly', None)
-                            rect = (0.0, 0.0, 0.0, 0.0)
-                            if bp is not None:
-                                nvs = getattr(bp, 'normalized_vertices', None)
-                                if nvs:
-                                    xs = [v.x for v in nvs]
-                                    ys = [v.y for v in nvs]
-                                    x0, x1 = min(xs), max(xs)
-                                    y0, y1 = min(ys), max(ys)
-                                    rect = (max(0.0, x0), max(0.0, y0), max(0.0, (x1 - x0)), max(0.0, (y1 - y0)))
-                                else:
-                                    vs = getattr(bp, 'vertices', None) or []
-                                    if vs:
-                                        xs = [v.x for v in vs]
-                                        ys = [v.y for v in vs]
-                                        x0, x1 = min(xs), max(xs)
-                                        y0, y1 = min(ys), max(ys)
-                                        rect = (max(0.0, x0 / W), max(0.0, y0 / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                            idx_map.append((start_raw, end_raw, rect))
-                    agg_norm, norm2raw = _normalize_with_map(agg_raw)
-                    _OCR_CACHE[key] = (agg_norm, norm2raw, idx_map, W, H)
-                    return _OCR_CACHE.get(key)
+            da_client_sync = get_ocr_client(documentai.DocumentProcessorServiceClient)
+            raw_document = documentai.RawDocument(content=img_bytes, mime_type=img_mime)
+            req = documentai.ProcessRequest(name=docai_name, raw_document=raw_document)
+            resp = da_client_sync.process_document(request=req)
+            entry = _docai_ocr_entry(getattr(resp, 'document', None))
+            if entry is not None:
+                return entry
         except Exception:
             pass
-        # Cloud Vision synchronous fallback
-        try:
-            from google.cloud import vision as _vision
-            client = _vision.ImageAnnotatorClient()
-            image = _vision.Image(content=img_bytes)
-            response = client.document_text_detection(image=image)
-            fta = response.full_text_annotation
-            if not fta or not getattr(fta, 'pages', None):
-                return None
-            page = fta.pages[0]
-            W = float(page.width or 1)
-            H = float(page.height or 1)
-            tokens = []
-            for block in page.blocks:
-                for para in block.paragraphs:
-                    for word in para.words:
-                        t = "".join([s.text for s in word.symbols])
-                        poly = word.bounding_box
-                        xs = [v.x for v in poly.vertices]
-                        ys = [v.y for v in poly.vertices]
-                        x0, x1 = min(xs), max(xs)
-                        y0, y1 = min(ys), max(ys)
-                        rect = (max(0.0, x0 / W), max(0.0, (y0) / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                        tokens.append((t, rect))
-            agg = []
-            raw_idx_map = []
-            pos0 = 0
-            for t, rect in tokens:
-                if not t:
-                    continue
-                if agg:
-                    agg.append(' ')
-                    pos0 += 1
-                agg.append(t)
-                s0 = pos0
-                pos0 += len(t)
-                raw_idx_map.append((s0, pos0, rect))
-            agg_raw = ''.join(agg)
-            agg_norm, norm2raw = _normalize_with_map(agg_raw)
-            _OCR_CACHE[key] = (agg_norm, norm2raw, raw_idx_map, W, H)
-            return _OCR_CACHE.get(key)
-        except Exception:
-            return None
+    # Cloud Vision synchronous fallback
+    try:
+        from google.cloud import vision as _vision
+        client = get_ocr_client(_vision.ImageAnnotatorClient)
+        image = _vision.Image(content=img_bytes)
+        return _vision_ocr_entry(client.document_text_detection(image=image))
     except Exception:
         return None
 
-_OCR_CACHE: dict[
-    tuple[int, int],
-    tuple[str, list[int], list[tuple[int,int,tuple[float,float,float,float]]], float, float]
-] = {}
+# (analysis_id, page_idx) -> (agg_norm, norm2raw, idx_map, W, H, starts). Bounded, and shared by request
+# handlers, worker threads and the prewarm worker, so every access holds _OCR_LOCK.
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "1024"))
+# How long an async caller waits for another caller's in-flight OCR of the same page before giving up
+OCR_INFLIGHT_WAIT = 30.0
+_OCR_CACHE: LRUCache = LRUCache(maxsize=OCR_CACHE_SIZE)
+_OCR_LOCK = threading.Lock()
+# Resolved with the owner's entry (or None); awaitable via asyncio.wrap_future without holding a thread
+_OCR_INFLIGHT: dict[tuple, concurrent.futures.Future] = {}
+
+def _ocr_cache_key(analysis_id: int, pidx: int, ref: str) -> tuple:
+    # A stored analysis's pages never change, and the same page is referenced as a data URI, a page
+    # URL or a freshly signed URL over time, so the page position is the key. Unsaved analyses (id 0)
+    # have no position to share; their entries are keyed by the image reference instead.
+    if analysis_id:
+        return (int(analysis_id), int(pidx))
+    return (0, int(pidx), _page_ref_digest(ref))
+
+def _ocr_cache_evict(analysis_id: int) -> None:
+    with _OCR_LOCK:
+        for key in [k for k in _OCR_CACHE if k[0] == int(analysis_id)]:
+            del _OCR_CACHE[key]
+
+def _ocr_cache_get(key: tuple):
+    with _OCR_LOCK:
+        return _OCR_CACHE.get(key)
+
+def _ocr_claim(key: tuple) -> concurrent.futures.Future | None:
+    """Single-flight: None if the caller now owns building `key` (and must _ocr_release it), otherwise
+    the Future that resolves to the current owner's entry."""
+    with _OCR_LOCK:
+        pending = _OCR_INFLIGHT.get(key)
+        if pending is None:
+            _OCR_INFLIGHT[key] = concurrent.futures.Future()
+        return pending
+
+def _ocr_release(key: tuple, entry) -> None:
+    """Stores the owner's result (if any) and hands it to callers waiting on `key`."""
+    with _OCR_LOCK:
+        if entry is not None:
+            _OCR_CACHE[key] = entry
+        pending = _OCR_INFLIGHT.pop(key, None)
+    if pending is not None:
+        pending.set_result(entry)
+
+async def _build_ocr_entry_async(client, _vision, data_uri: str):
+    """Async counterpart of _build_ocr_entry_sync for request handlers: Document AI (on a worker
+    thread) if configured, else the async Vision client."""
+    prepared = await asyncio.to_thread(_prepare_ocr_image, data_uri)
+    if not prepared:
+        return None
+    img_bytes, img_mime = prepared
+    # Prefer Document AI OCR if configured
+    docai_name = _docai_processor_name()
+    if docai_name:
+        try:
+            da_client_sync = get_ocr_client(documentai.DocumentProcessorServiceClient)
+            raw_document = documentai.RawDocument(content=img_bytes, mime_type=img_mime)
+            req = documentai.ProcessRequest(name=docai_name, raw_document=raw_document)
+            resp = await asyncio.to_thread(da_client_sync.process_document, request=req)
+            entry = _docai_ocr_entry(getattr(resp, 'document', None))
+            if entry is not None:
+                return entry
+        except Exception:
+            pass
+    # Fallback to Cloud Vision
+    img = _vision.Image(content=img_bytes)
+    features = [_vision.Feature(type_=_vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+    resp = await client.batch_annotate_images(requests=[_vision.AnnotateImageRequest(image=img, features=features)])
+    return _vision_ocr_entry(resp.responses[0])
 
-async def locate_text_anchors(db: Session, analysis_id: int, owner_id: int, query_text: str) -> schemas.LocateResponse:
+async def locate_text_anchors(db: AsyncSession, analysis_id: int, owner_id: int, query_text: str) -> schemas.LocateResponse:
     """Find exact occurrences of query_text in the document.
 
     - For text pages: returns page + char ranges (exact, case-insensitive).
@@ -1633,18 +2500,18 @@ async def locate_text_anchors(db: Session, analysis_id: int, owner_id: int, quer
     fa = await get_full_analysis(db, analysis_id, owner_id)
     pages = fa.extracted_text or []
     q_raw = query_text or ""
-    q_norm, _ = _normalize_with_map(q_raw)
-    q_tokens = _tokenize_norm(q_norm)
-    q_salient = _salient_tokens(q_tokens)
+    q_norm = _normalize_fast(q_raw)
+    q_tokens, q_salient = _query_terms(q_norm)
     candidates: list[tuple[int, int, int, int, int, str]] = []
     # (score, page_idx, start_char, end_char, norm_pos, strategy)
     best_phrase_norm: str | None = None
 
     # Pass 1: text exact match (case-insensitive) per page
-    for idx, page_text in enumerate(pages):
-        if not page_text:
+    pages_norm = _normalize_pages(pages)
+    for idx, page_norm in enumerate(pages_norm):
+        if page_norm is None:
             continue
-        norm, idx_map = _normalize_with_map(page_text)
+        norm, idx_map = page_norm
         pos = norm.find(q_norm) if q_norm else -1
         if pos >= 0:
             start = idx_map[pos] if pos < len(idx_map) else 0
@@ -1672,7 +2539,7 @@ async def locate_text_anchors(db: Session, analysis_id: int, owner_id: int, quer
 
     # Build the normalized phrase actually matched to feed OCR matching
     try:
-        page_norm, idx_map = _normalize_with_map(pages[best_page])
+        page_norm, idx_map = pages_norm[best_page]
         if best_strategy.startswith("text:normalized"):
             best_phrase_norm = page_norm[best_norm_pos: best_norm_pos + len(q_norm)] if q_norm else None
         else:
@@ -1685,332 +2552,190 @@ async def locate_text_anchors(db: Session, analysis_id: int, owner_id: int, quer
     if (getattr(fa, 'page_images', None) or []) and best_page is not None:
         try:
             from google.cloud import vision as _vision
-            client = _vision.ImageAnnotatorAsyncClient()
+            client = get_ocr_client(_vision.ImageAnnotatorAsyncClient)
             pidx = int(best_page)
             data_uri = fa.page_images[pidx] if pidx < len(fa.page_images) else ""
-            img_bytes: bytes | None = None
-            if data_uri and data_uri.startswith("data:image"):
-                cache_key = (int(analysis_id), pidx)
-                cached = _OCR_CACHE.get(cache_key)
-                if cached is None:
-                    # OCR this page
-                    try:
-                        b64 = data_uri.split(",", 1)[1]
-                        img_bytes = base64.b64decode(b64)
-                    except Exception:
-                        img_bytes = b""
-            elif data_uri and (data_uri.startswith("http://") or data_uri.startswith("https://")):
-                cache_key = (int(analysis_id), pidx)
-                cached = _OCR_CACHE.get(cache_key)
-                if cached is None:
-                    try:
-                        r = requests.get(data_uri, timeout=5)
-                        r.raise_for_status()
-                        img_bytes = r.content
-                    except Exception:
-                        img_bytes = None
-            else:
-                cached = None
-
-            if (cache_key := (int(analysis_id), pidx)) and _OCR_CACHE.get(cache_key) is None and img_bytes is not None:
-                # Prefer Document AI OCR if configured
-                processor_id = os.environ.get("DOCAI_PROCESSOR_ID")
-                location = os.environ.get("DOCAI_LOCATION", "us")
-                project_id = os.environ.get("DOCAI_PROJECT_ID")
-                if not project_id:
-                    try:
-                        creds, default_project = google.auth.default()
-                        if default_project:
-                            project_id = default_project
-                    except Exception:
-                        project_id = None
-                used_docai = False
-                if documentai is not None and processor_id and project_id:
-                    try:
-                        da_client_sync = documentai.DocumentProcessorServiceClient()
-                        name = da_client_sync.processor_path(project_id, location, processor_id)
-                        raw_document = documentai.RawDocument(content=img_bytes, mime_type="image/png")
-                        req = documentai.ProcessRequest(name=name, raw_document=raw_document)
-                        resp = da_client_sync.process_document(request=req)
-                        doc = getattr(resp, 'document', None)
-                        if doc and getattr(doc, 'text', None) is not None:
-                            # Build token map from Document AI tokens
-                            agg_raw = doc.text or ''
-                            try:
-                                page0 = doc.pages[0]
-                                dim = getattr(page0, 'dimension', None)
-                                W = float(getattr(dim, 'width', 1.0) or 1.0)
-                                H = float(getattr(dim, 'height', 1.0) or 1.0)
-                            except Exception:
-                                W = H = 1.0
-                                page0 = None
-                            idx_map = []  # (start_raw, end_raw, rect)
-                            if page0 is not None:
-                                for token in getattr(page0, 'tokens', []) or []:
-                                    layout = getattr(token, 'layout', None)
-                                    if not layout:
-                                        continue
-                                    ta = getattr(layout, 'text_anchor', None)
-                                    segs = getattr(ta, 'text_segments', []) if ta else []
-                                    if not segs:
-                                        continue
-                                    start_raw = int(getattr(segs[0], 'start_index', 0) or 0)
-                                    end_raw = int(getattr(segs[0], 'end_index', 0) or 0)
-                                    bp = getattr(layout, 'bounding_poly', None)
-                                    rect = (0.0, 0.0, 0.0, 0.0)
-                                    if bp is not None:
-                                        nvs = getattr(bp, 'normalized_vertices', None)
-                                        if nvs:
-                                            xs = [v.x for v in nvs]
-                                            ys = [v.y for v in nvs]
-                                            x0, x1 = min(xs), max(xs)
-                                            y0, y1 = min(ys), max(ys)
-                                            rect = (max(0.0, x0), max(0.0, y0), max(0.0, (x1 - x0)), max(0.0, (y1 - y0)))
-                                        else:
-                                            vs = getattr(bp, 'vertices', None) or []
-                                            if vs:
-                                                xs = [v.x for v in vs]
-                                                ys = [v.y for v in vs]
-                                                x0, x1 = min(xs), max(xs)
-                                                y0, y1 = min(ys), max(ys)
-                                                rect = (max(0.0, x0 / W), max(0.0, y0 / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                                    idx_map.append((start_raw, end_raw, rect))
-                            agg_norm, norm2raw = _normalize_with_map(agg_raw)
-                            _OCR_CACHE[cache_key] = (agg_norm, norm2raw, idx_map, W, H)
-                            used_docai = True
-                    except Exception:
-                        used_docai = False
-                if not used_docai:
-                    # Fallback to Cloud Vision
-                    img = _vision.Image(content=img_bytes)
-                    features = [_vision.Feature(type_=_vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
-                    resp = await client.batch_annotate_images(requests=[_vision.AnnotateImageRequest(image=img, features=features)])
-                    annotation = resp.responses[0]
-                    fta = annotation.full_text_annotation
-                    if fta and getattr(fta, 'pages', None):
-                        page = fta.pages[0]
-                        W = float(page.width or 1)
-                        H = float(page.height or 1)
-                        tokens = []
-                        for block in page.blocks:
-                            for para in block.paragraphs:
-                                for word in para.words:
-                                    t = "".join([s.text for s in word.symbols])
-                                    poly = word.bounding_box
-                                    xs = [v.x for v in poly.vertices]
-                                    ys = [v.y for v in poly.vertices]
-                                    x0, x1 = min(xs), max(xs)
-                                    y0, y1 = min(ys), max(ys)
-                                    rect = (max(0.0, x0 / W), max(0.0, (y0) / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                                    tokens.append((t, rect))
-                        agg = []
-                        raw_idx_map = []  # positions in raw aggregated string
-                        pos0 = 0
-                        for t, rect in tokens:
-                            if not t:
-                                continue
-                            if agg:
-                                agg.append(' ')
-                                pos0 += 1
-                            agg.append(t)
-                            s0 = pos0
-                            pos0 += len(t)
-                            raw_idx_map.append((s0, pos0, rect))
-                        agg_raw = ''.join(agg)
-                        agg_norm, norm2raw = _normalize_with_map(agg_raw)
-                        _OCR_CACHE[cache_key] = (agg_norm, norm2raw, raw_idx_map, W, H)
-                cached = _OCR_CACHE.get(cache_key)
-                if cached:
-                    agg_norm, norm2raw, idx_map, W, H = cached
-                    # Prefer the normalized phrase that matched best
-                    mpos = -1
-                    mend = -1
-                    if best_phrase_norm:
-                        mpos = agg_norm.find(best_phrase_norm)
-                        if mpos >= 0:
-                            mend = mpos + len(best_phrase_norm)
-                    if mpos < 0 and q_norm:
-                        mpos = agg_norm.find(q_norm)
-                        if mpos >= 0:
-                            mend = mpos + len(q_norm)
-                    if mpos < 0 and q_tokens:
-                        # Try best-scored window against OCR
-                        found2 = _best_scored_window(q_tokens, q_salient, agg_norm)
-                        if found2:
-                            mpos, mend, _, _ = found2
+            cache_key = _ocr_cache_key(analysis_id, pidx, data_uri)
+            cached = _ocr_cache_get(cache_key) if data_uri else None
+            waiting = _ocr_claim(cache_key) if data_uri and cached is None else None
+            if waiting is not None:
+                # Another request is already OCRing this page; reuse its result instead of a second RPC.
+                # asyncio.wait (unlike wait_for) never cancels the shared future on timeout.
+                done, _ = await asyncio.wait({asyncio.wrap_future(waiting)}, timeout=OCR_INFLIGHT_WAIT)
+                cached = done.pop().result() if done else None
+            elif data_uri and cached is None:
+                try:
+                    cached = await _build_ocr_entry_async(client, _vision, data_uri)
+                finally:
+                    _ocr_release(cache_key, cached)
+            if cached:
+                agg_norm, norm2raw, idx_map, W, H, starts = cached
+                # Prefer the normalized phrase that matched best
+                mpos = -1
+                mend = -1
+                if best_phrase_norm:
+                    mpos = agg_norm.find(best_phrase_norm)
                     if mpos >= 0:
-                        # map normalized positions to raw aggregated positions
-                        s_raw = norm2raw[mpos] if mpos < len(norm2raw) else 0
-                        e_raw = norm2raw[mend-1] + 1 if mend-1 < len(norm2raw) else s_raw
-                        # Compute a single union bounding box over all tokens in range
-                        x_min = y_min = 1.0
-                        x_max = y_max = 0.0
-                        found_any = False
-                        for s0, e0, rect in idx_map:
-                            if e0 <= s_raw:
-                                continue
-                            if s0 >= e_raw:
-                                break
-                            x, y, w, h = rect
-                            x_min = min(x_min, x)
-                            y_min = min(y_min, y)
-                            x_max = max(x_max, x + w)
-                            y_max = max(y_max, y + h)
-                            found_any = True
-                        if found_any:
-                            # Optional small padding
-                            pad = 0.005
-                            x_min = max(0.0, x_min - pad)
-                            y_min = max(0.0, y_min - pad)
-                            x_max = min(1.0, x_max + pad)
-                            y_max = min(1.0, y_max + pad)
-                            box = schemas.AnchorBox(x=x_min, y=y_min, w=max(0.0, x_max - x_min), h=max(0.0, y_max - y_min))
-                            match.boxes = [box]
-                            match.strategy = (match.strategy or "") + "+ocr"
+                        mend = mpos + len(best_phrase_norm)
+                if mpos < 0 and q_norm:
+                    mpos = agg_norm.find(q_norm)
+                    if mpos >= 0:
+                        mend = mpos + len(q_norm)
+                if mpos < 0 and q_tokens:
+                    # Try best-scored window against OCR
+                    found2 = _best_scored_window(q_tokens, q_salient, agg_norm)
+                    if found2:
+                        mpos, mend, _, _ = found2
+                if mpos >= 0:
+                    # map normalized positions to raw aggregated positions
+                    s_raw = norm2raw[mpos] if mpos < len(norm2raw) else 0
+                    e_raw = norm2raw[mend-1] + 1 if mend-1 < len(norm2raw) else s_raw
+                    # Compute a single union bounding box over all tokens in range
+                    box = _ocr_span_box(idx_map, starts, s_raw, e_raw)
+                    if box is not None:
+                        match.boxes = [box]
+                        match.strategy = (match.strategy or "") + "+ocr"
         except Exception:
             pass
 
     return schemas.LocateResponse(matches=[match])
 
 
+# Per-page Document AI calls in one prewarm overlap up to this many
+PREWARM_DOCAI_CONCURRENCY = 8
+OCR_MAX_RETRIES = 3
+
+
+async def _with_ocr_retries(call):
+    """Awaits call() (a fresh awaitable per attempt), retrying 429/503 with exponential backoff."""
+    for attempt in range(OCR_MAX_RETRIES + 1):
+        try:
+            return await call()
+        except _RETRYABLE:
+            if attempt == OCR_MAX_RETRIES:
+                raise
+        await asyncio.sleep(2 ** attempt)
+
+
 async def _prewarm_scanned_pages_ocr(analysis_id: int, page_images: list[str], limit: int = 3) -> None:
     """Precompute OCR token caches for the first few scanned pages to reduce first-click latency.
+    Document AI pages run concurrently; pages it can't handle go to Vision in one batched request.
     Best-effort and silent on failure.
     """
+    # Claim each uncached page; pages another caller is already OCRing are left to it
+    keys = {}
+    for p in range(min(limit, len(page_images))):
+        key = _ocr_cache_key(analysis_id, p, page_images[p])
+        if page_images[p] and _ocr_cache_get(key) is None and _ocr_claim(key) is None:
+            keys[p] = key
+    if not keys:
+        return
+    built: dict[int, tuple] = {}
     try:
-        from google.cloud import vision as _vision
-        client = _vision.ImageAnnotatorAsyncClient()
+        images = await asyncio.gather(*(asyncio.to_thread(_prepare_ocr_image, page_images[p]) for p in keys))
+        pending = {p: img for p, img in zip(keys, images) if img}
+        if pending:
+            await _ocr_pages_batch(pending, built)
+    finally:
+        for p, key in keys.items():
+            _ocr_release(key, built.get(p))
+
+
+async def _ocr_pages_batch(pending: dict[int, tuple[bytes, str]], built: dict[int, tuple]) -> None:
+    """OCRs prepared page images into `built` ({page_idx: cache entry}); pages that fail are left out."""
+    # Try Document AI first (sync client, one call per page, overlapped on worker threads)
+    try:
+        docai_name = _docai_processor_name()
+        if docai_name:
+            da_client_sync = get_ocr_client(documentai.DocumentProcessorServiceClient)
+            sem = asyncio.Semaphore(PREWARM_DOCAI_CONCURRENCY)
+
+            async def _docai(img: tuple[bytes, str]):
+                raw_document = documentai.RawDocument(content=img[0], mime_type=img[1])
+                req = documentai.ProcessRequest(name=docai_name, raw_document=raw_document)
+                async with sem:
+                    resp = await _with_ocr_retries(lambda: asyncio.to_thread(da_client_sync.process_document, request=req))
+                return _docai_ocr_entry(getattr(resp, 'document', None))
+
+            results = await asyncio.gather(*(_docai(b) for b in pending.values()), return_exceptions=True)
+            for pidx, entry in zip(list(pending), results):
+                if isinstance(entry, tuple):
+                    built[pidx] = entry
+                    del pending[pidx]
     except Exception:
-        client = None
-    # Basic loop; stop if cache already populated
-    tasks = []
-    max_i = min(limit, len(page_images))
-    for pidx in range(max_i):
-        if (int(analysis_id), pidx) in _OCR_CACHE:
-            continue
-        data_uri = page_images[pidx]
-        img_bytes: bytes | None = None
-        if data_uri.startswith('data:image'):
-            try:
-                b64 = data_uri.split(',', 1)[1]
-                img_bytes = base64.b64decode(b64)
-            except Exception:
-                img_bytes = None
-        elif data_uri.startswith('http://') or data_uri.startswith('https://'):
-            try:
-                r = requests.get(data_uri, timeout=5)
-                r.raise_for_status()
-                img_bytes = r.content
-            except Exception:
-                img_bytes = None
-        if not img_bytes:
-            continue
-        # Try Document AI first
-        try:
-            processor_id = os.environ.get("DOCAI_PROCESSOR_ID")
-            location = os.environ.get("DOCAI_LOCATION", "us")
-            project_id = os.environ.get("DOCAI_PROJECT_ID")
-            if not project_id:
+        pass
+    if not pending:
+        return
+
+    # Vision fallback: every remaining page in one batch_annotate_images round-trip (chunked at the API cap)
+    try:
+        from google.cloud import vision as _vision
+        client = get_ocr_client(_vision.ImageAnnotatorAsyncClient)
+        features = [_vision.Feature(type_=_vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
+        items = list(pending.items())
+        for i in range(0, len(items), VISION_IMAGES_PER_REQUEST):
+            chunk = items[i:i + VISION_IMAGES_PER_REQUEST]
+            requests_ = [_vision.AnnotateImageRequest(image=_vision.Image(content=img[0]), features=features) for _, img in chunk]
+            resp = await _with_ocr_retries(lambda: client.batch_annotate_images(requests=requests_))
+            for (pidx, _), annotation in zip(chunk, resp.responses):
                 try:
-                    creds, default_project = google.auth.default()
-                    if default_project:
-                        project_id = default_project
+                    entry = _vision_ocr_entry(annotation)
                 except Exception:
-                    project_id = None
-            if documentai is not None and processor_id and project_id:
-                da_client_sync = documentai.DocumentProcessorServiceClient()
-                name = da_client_sync.processor_path(project_id, location, processor_id)
-                raw_document = documentai.RawDocument(content=img_bytes, mime_type="image/png")
-                req = documentai.ProcessRequest(name=name, raw_document=raw_document)
-                resp = da_client_sync.process_document(request=req)
-                doc = getattr(resp, 'document', None)
-                if doc and getattr(doc, 'text', None) is not None:
-                    agg_raw = doc.text or ''
-                    try:
-                        page0 = doc.pages[0]
-                        dim = getattr(page0, 'dimension', None)
-                        W = float(getattr(dim, 'width', 1.0) or 1.0)
-                        H = float(getattr(dim, 'height', 1.0) or 1.0)
-                    except Exception:
-                        W = H = 1.0
-                        page0 = None
-                    idx_map = []
-                    if page0 is not None:
-                        for token in getattr(page0, 'tokens', []) or []:
-                            layout = getattr(token, 'layout', None)
-                            if not layout:
-                                continue
-                            ta = getattr(layout, 'text_anchor', None)
-                            segs = getattr(ta, 'text_segments', []) if ta else []
-                            if not segs:
-                                continue
-                            start_raw = int(getattr(segs[0], 'start_index', 0) or 0)
-                            end_raw = int(getattr(segs[0], 'end_index', 0) or 0)
-                            bp = getattr(layout, 'bounding_poly', None)
-                            rect = (0.0, 0.0, 0.0, 0.0)
-                            if bp is not None:
-                                nvs = getattr(bp, 'normalized_vertices', None)
-                                if nvs:
-                                    xs = [v.x for v in nvs]
-                                    ys = [v.y for v in nvs]
-                                    x0, x1 = min(xs), max(xs)
-                                    y0, y1 = min(ys), max(ys)
-                                    rect = (max(0.0, x0), max(0.0, y0), max(0.0, (x1 - x0)), max(0.0, (y1 - y0)))
-                                else:
-                                    vs = getattr(bp, 'vertices', None) or []
-                                    if vs:
-                                        xs = [v.x for v in vs]
-                                        ys = [v.y for v in vs]
-                                        x0, x1 = min(xs), max(xs)
-                                        y0, y1 = min(ys), max(ys)
-                                        rect = (max(0.0, x0 / W), max(0.0, y0 / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                            idx_map.append((start_raw, end_raw, rect))
-                    agg_norm, norm2raw = _normalize_with_map(agg_raw)
-                    _OCR_CACHE[(int(analysis_id), pidx)] = (agg_norm, norm2raw, idx_map, W, H)
-                    continue
-        except Exception:
-            pass
-        # Vision fallback
+                    entry = None
+                if entry is not None:
+                    built[pidx] = entry
+    except Exception:
+        pass
+
+
+# Prewarming runs on a background worker fed by a bounded queue so request handlers only pay for
+# a put_nowait; the worker has its own semaphore and never competes with user-facing OCR slots.
+PREWARM_QUEUE_SIZE = int(os.getenv("OCR_PREWARM_QUEUE_SIZE", "64"))
+PREWARM_CONCURRENCY = int(os.getenv("OCR_PREWARM_CONCURRENCY", "2"))
+_prewarm_queue: asyncio.Queue | None = None
+_prewarm_pending: set[int] = set()
+
+
+def enqueue_ocr_prewarm(analysis_id: int, page_images: list[str]) -> None:
+    """Queues an OCR prewarm; no-op when the worker isn't running, the analysis is queued, or the queue is full."""
+    if _prewarm_queue is None or analysis_id in _prewarm_pending:
+        return
+    try:
+        _prewarm_queue.put_nowait((analysis_id, page_images))
+        _prewarm_pending.add(analysis_id)
+    except asyncio.QueueFull:
+        pass
+
+
+async def run_ocr_prewarm_worker() -> None:
+    """Consumes the prewarm queue in FIFO order until cancelled (started from app startup)."""
+    global _prewarm_queue
+    _prewarm_queue = asyncio.Queue(maxsize=PREWARM_QUEUE_SIZE)
+    sem = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+    async def _run(analysis_id: int, page_images: list[str]) -> None:
         try:
-            if client is None:
-                continue
-            img = _vision.Image(content=img_bytes)
-            features = [_vision.Feature(type_=_vision.Feature.Type.DOCUMENT_TEXT_DETECTION)]
-            resp = await client.batch_annotate_images(requests=[_vision.AnnotateImageRequest(image=img, features=features)])
-            annotation = resp.responses[0]
-            fta = annotation.full_text_annotation
-            if not fta or not getattr(fta, 'pages', None):
-                continue
-            page = fta.pages[0]
-            W = float(page.width or 1)
-            H = float(page.height or 1)
-            tokens = []
-            for block in page.blocks:
-                for para in block.paragraphs:
-                    for word in para.words:
-                        t = "".join([s.text for s in word.symbols])
-                        poly = word.bounding_box
-                        xs = [v.x for v in poly.vertices]
-                        ys = [v.y for v in poly.vertices]
-                        x0, x1 = min(xs), max(xs)
-                        y0, y1 = min(ys), max(ys)
-                        rect = (max(0.0, x0 / W), max(0.0, (y0) / H), max(0.0, (x1 - x0) / W), max(0.0, (y1 - y0) / H))
-                        tokens.append((t, rect))
-            agg = []
-            raw_idx_map = []
-            pos0 = 0
-            for t, rect in tokens:
-                if not t:
-                    continue
-                if agg:
-                    agg.append(' ')
-                    pos0 += 1
-                agg.append(t)
-                s0 = pos0
-                pos0 += len(t)
-                raw_idx_map.append((s0, pos0, rect))
-            agg_raw = ''.join(agg)
-            agg_norm, norm2raw = _normalize_with_map(agg_raw)
-            _OCR_CACHE[(int(analysis_id), pidx)] = (agg_norm, norm2raw, raw_idx_map, W, H)
-        except Exception:
-            continue
+            await _prewarm_scanned_pages_ocr(analysis_id, page_images)
+        except Exception as e:
+            print(f"OCR prewarm failed for analysis {analysis_id}: {e}")
+        finally:
+            _prewarm_pending.discard(analysis_id)
+            sem.release()
+
+    # The event loop only keeps weak references to tasks; hold them here so a running prewarm is never
+    # collected with its claimed in-flight OCR futures unresolved
+    tasks: set[asyncio.Task] = set()
+    try:
+        while True:
+            analysis_id, page_images = await _prewarm_queue.get()
+            await sem.acquire()
+            task = asyncio.create_task(_run(analysis_id, page_images))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        _prewarm_queue = None
+        _prewarm_pending.clear()
+        for task in tasks:
+            task.cancel()
+        # Let cancelled prewarms run their finally blocks, which release the in-flight claims
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,6 +1,6 @@
 import fitz  # PyMuPDF
 import os
-from app.services import extract_text_with_ocr
+from app.services import extract_text_with_ocr, get_ocr_client
 import base64
 import io
 import zipfile
@@ -77,16 +77,31 @@ def _has_near_full_image(page) -> bool:
         return False
     return False
 
-async def extract_text_from_document(file_bytes: bytes, mime_type: str) -> list[str]:
+def _read_source(source: bytes | str, limit: int = -1) -> bytes:
+    """Return the raw bytes of an upload given either in-memory bytes or a path on disk."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source if limit < 0 else source[:limit])
+    with open(source, "rb") as f:
+        return f.read(limit)
+
+def _open_pdf(source: bytes | str):
+    # Opening by path lets MuPDF read pages on demand instead of holding a full copy in memory
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+async def extract_text_from_document(source: bytes | str, mime_type: str) -> list[str]:
     """
     Orchestrates text extraction, returning a list of strings, where each string is a page's content.
+    `source` is either the file bytes or a path to the uploaded file on disk.
     """
     # Handle plain text directly, returned as a single-element list
     if mime_type == "text/plain":
-        return [file_bytes.decode("utf-8")]
+        return [_read_source(source).decode("utf-8")]
     # Minimal support for common Office/text formats
     if mime_type in {"application/rtf", "text/rtf"}:
         # Naive RTF to text: strip control words and braces; preserve basic newlines
+        file_bytes = _read_source(source)
         try:
             text = file_bytes.decode("utf-8", errors="ignore")
         except Exception:
@@ -100,7 +115,7 @@ async def extract_text_from_document(file_bytes: bytes, mime_type: str) -> list[
     if mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
         # DOCX: unzip and parse word/document.xml for w:t nodes
         try:
-            with zipfile.ZipFile(io.BytesIO(file_bytes)) as zf:
+            with zipfile.ZipFile(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as zf:
                 with zf.open("word/document.xml") as docxml:
                     tree = ET.parse(docxml)
                     ns = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
@@ -117,7 +132,7 @@ async def extract_text_from_document(file_bytes: bytes, mime_type: str) -> list[
     
     if mime_type == "application/pdf":
         try:
-            pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
+            pdf_document = _open_pdf(source)
             # If forced via env, treat as scanned regardless of text presence
             if _force_ocr_enabled():
                 image_bytes_list = [page.get_pixmap(dpi=300).tobytes("png") for page in pdf_document]
@@ -203,7 +218,7 @@ async def extract_text_from_document(file_bytes: bytes, mime_type: str) -> list[
                 if ambiguous_indices:
                     try:
                         from google.cloud import vision as _vision
-                        client = _vision.ImageAnnotatorClient()
+                        client = get_ocr_client(_vision.ImageAnnotatorClient)
                         for i in ambiguous_indices:
                             try:
                                 # Low-res thumbnail for quick detection
@@ -263,15 +278,16 @@ async def extract_text_from_document(file_bytes: bytes, mime_type: str) -> list[
     else:
         # For any remaining types, attempt OCR only if it's an image; otherwise error
         # Heuristic: simple magic header checks for common image types
-        is_png = file_bytes[:8] == b"\x89PNG\r\n\x1a\n"
-        is_jpeg = file_bytes[:3] == b"\xff\xd8\xff"
-        is_gif = file_bytes[:6] in {b"GIF87a", b"GIF89a"}
+        header = _read_source(source, 8)
+        is_png = header[:8] == b"\x89PNG\r\n\x1a\n"
+        is_jpeg = header[:3] == b"\xff\xd8\xff"
+        is_gif = header[:6] in {b"GIF87a", b"GIF89a"}
         if is_png or is_jpeg or is_gif:
-            ocr_texts = await extract_text_with_ocr([file_bytes])
+            ocr_texts = await extract_text_with_ocr([_read_source(source)])
             return ocr_texts
         raise ValueError("Unsupported file type. Allowed: PDF, DOC, DOCX, TXT, RTF.")
 
-async def get_page_images_if_scanned(file_bytes: bytes, mime_type: str) -> list[str]:
+async def get_page_images_if_scanned(source: bytes | str, mime_type: str) -> list[str]:
     """
     Returns a list of data URI PNGs if the PDF is likely scanned; otherwise returns an empty list.
     For non-PDF types, returns an empty list.
@@ -279,7 +295,7 @@ async def get_page_images_if_scanned(file_bytes: bytes, mime_type: str) -> list[
     if mime_type != "application/pdf":
         return []
     try:
-        pdf_document = fitz.open(stream=file_bytes, filetype="pdf")
+        pdf_document = _open_pdf(source)
         # Forced scanned path via env
         if _force_ocr_enabled():
             images: list[str] = []
@@ -622,13 +638,13 @@ def add_header_footer(canvas, doc):
     canvas.drawRightString(522, 50, f"Page {doc.page}")
 
 
-def merge_pdf_with_original(analysis_pdf_bytes: bytes, original_pdf_bytes: bytes) -> bytes:
+def merge_pdf_with_original(analysis_pdf_bytes: bytes, original_pdf_bytes: bytes | str) -> bytes:
     """
     Merges the analysis PDF with the original PDF document.
     
     Args:
         analysis_pdf_bytes: Bytes of the analysis PDF
-        original_pdf_bytes: Bytes of the original PDF
+        original_pdf_bytes: Bytes of the original PDF, or a local file path to it
     
     Returns:
         Merged PDF bytes
@@ -645,7 +661,7 @@ def merge_pdf_with_original(analysis_pdf_bytes: bytes, original_pdf_bytes: bytes
     
     # Add original PDF pages
     try:
-        original_reader = pypdf.PdfReader(io.BytesIO(original_pdf_bytes))
+        original_reader = pypdf.PdfReader(original_pdf_bytes if isinstance(original_pdf_bytes, str) else io.BytesIO(original_pdf_bytes))
         for page in original_reader.pages:
             writer.add_page(page)
     except Exception as e:
@@ -781,3 +797,51 @@ def create_attachment_notice_page(original_filename: str) -> bytes:
     buffer.close()
     
     return pdf_bytes
+
+
+def build_export_pdf(analysis_data: dict, company_name: str, original_source: bytes | str | None,
+                     original_filename: str, original_mime_type: str) -> bytes:
+    """
+    Builds the full export PDF: analysis report followed by the original document.
+    CPU-bound (reportlab + pypdf); callers should run it in a worker thread.
+    
+    Args:
+        analysis_data: Analysis payload as passed to create_analysis_pdf
+        company_name: Company name for the report header
+        original_source: Original document bytes or local file path, or None if unavailable
+        original_filename: Name of the original file
+        original_mime_type: MIME type of the original file
+    
+    Returns:
+        PDF bytes
+    """
+    analysis_pdf_bytes = create_analysis_pdf(analysis_data, company_name)
+    if not original_source:
+        # No original document - just return analysis PDF
+        return analysis_pdf_bytes
+    
+    if original_mime_type == "application/pdf":
+        # Merge PDFs
+        return merge_pdf_with_original(analysis_pdf_bytes, original_source)
+    
+    # Attach non-PDF as attachment
+    attached_pdf_bytes = attach_non_pdf_original(
+        analysis_pdf_bytes,
+        _read_source(original_source),
+        original_filename,
+        original_mime_type
+    )
+    # Add notice page about attachment
+    notice_page = create_attachment_notice_page(original_filename)
+    writer = pypdf.PdfWriter()
+    for pdf_bytes in (attached_pdf_bytes, notice_page):
+        for page in pypdf.PdfReader(io.BytesIO(pdf_bytes)).pages:
+            writer.add_page(page)
+    
+    # Write final PDF
+    output_buffer = io.BytesIO()
+    writer.write(output_buffer)
+    final_pdf_bytes = output_buffer.getvalue()
+    output_buffer.close()
+    
+    return final_pdf_bytes
@@ -0,0 +1,18 @@
+import numpy as np
+
+
+# Benchmark clause embeddings are searched as int8 codes: the seed and migration scripts store them
+# with this function, and queries are encoded the same way, so the sqlite-vec KNN index and the NumPy
+# scan in services rank the same vectors.
+def quantize_int8(embedding) -> tuple[bytes, float]:
+    """Unit-normalizes an embedding and returns (int8 bytes, scale) with vector ≈ codes * scale."""
+    v = np.asarray(embedding, dtype=np.float32)
+    v = v / (np.linalg.norm(v) or 1.0)
+    scale = float(np.abs(v).max()) / 127 or 1.0
+    return np.round(v / scale).astype(np.int8).tobytes(), scale
+
+
+def int8_unit_query(embedding) -> np.ndarray:
+    """The float32 unit vector of an embedding's int8 codes, for scoring against stored codes."""
+    codes = np.frombuffer(quantize_int8(embedding)[0], dtype=np.int8).astype(np.float32)
+    return codes / (np.linalg.norm(codes) or 1.0)
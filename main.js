@@ -5,6 +5,10 @@ document.addEventListener('DOMContentLoaded', () => {
     const BASE_URL = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1' 
         ? 'http://127.0.0.1:8000' 
         : `${window.location.protocol}//${window.location.host}/api`;
+    // Matches the server's maximum /analyses/dashboard page size
+    const DASHBOARD_PAGE_SIZE = 200;
+    // Matches the server's clause limit for /simulate/batch and /benchmark/batch
+    const MAX_BATCH_CLAUSES = 12;
     
     // Custom Notification System
     const showNotification = (message, type = 'info', duration = 5000) => {
@@ -320,12 +324,21 @@ document.addEventListener('DOMContentLoaded', () => {
     const updateDashboard = async () => {
         showState('dashboard');
         try {
-            const items = await apiCall('/analyses/dashboard');
-            appState.dashboardItems = Array.isArray(items) ? items : [];
+            // The endpoint pages by id cursor; render the first page right away, then keep
+            // appending so search and sort still see every analysis
+            let page = await apiCall(`/analyses/dashboard?limit=${DASHBOARD_PAGE_SIZE}`);
+            appState.dashboardItems = Array.isArray(page) ? page : [];
             renderDashboardList();
             attachDashboardControls();
             const landing = document.getElementById('landing-container');
             if (landing) landing.classList.add('hidden');
+            while (Array.isArray(page) && page.length === DASHBOARD_PAGE_SIZE) {
+                const afterId = page[page.length - 1].id;
+                page = await apiCall(`/analyses/dashboard?limit=${DASHBOARD_PAGE_SIZE}&after_id=${afterId}`);
+                if (!Array.isArray(page) || !page.length) break;
+                appState.dashboardItems = appState.dashboardItems.concat(page);
+                renderDashboardList();
+            }
         } catch (error) {
             console.error('Failed to fetch analyses:', error);
             // Stay on dashboard; authentication is disabled
@@ -619,6 +632,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
     const actionsList = document.getElementById('actions-list');
     actionsList.innerHTML = '';
+    document.getElementById('simulate-all-btn')?.classList.toggle('hidden', !(data.identified_actions?.length > 0));
     if (data.identified_actions?.length > 0) {
         data.identified_actions.forEach((item, idx) => {
             // NOW an item is an object with a .text property
@@ -723,7 +737,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const wrap = document.createElement('div');
             wrap.className = 'relative';
             const img = document.createElement('img');
-            img.src = src;
+            // Locally stored pages come back as API-relative URLs
+            img.src = src.startsWith('/') ? `${BASE_URL}${src}` : src;
             img.alt = `Page ${index + 1}`;
             img.loading = 'lazy';
             img.className = 'w-full h-auto rounded border border-gray-200';
@@ -942,6 +957,20 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // One /simulate/batch round trip for the first MAX_BATCH_CLAUSES actions instead of a call per clause
+    const handleSimulateAll = async () => {
+        const clauses = (appState.currentAnalysis?.identified_actions || []).map(a => a.text).filter(Boolean).slice(0, MAX_BATCH_CLAUSES);
+        if (!clauses.length) return;
+        showModal(`<div class="text-center p-8"><div class="w-12 h-12 border-4 border-primary-500 border-t-transparent rounded-full animate-spin mx-auto"></div><p class="mt-4">Simulating...</p></div>`);
+        try {
+            const data = await apiCall('/simulate/batch', { method: 'POST', body: { clauses, document_context: appState.currentAnalysis.assessment, key_info: appState.currentAnalysis.key_info } });
+            const items = clauses.map((clause, i) => `<li class="border-t pt-3"><p class="text-xs text-gray-500 italic mb-1">${escapeHTML(clause)}</p><p class="text-gray-700">${data.simulations[i] || ''}</p></li>`).join('');
+            showModal(`<button id="close-modal-btn" class="absolute top-4 right-4 text-gray-400 hover:text-gray-600">&times;</button><h3 class="text-xl font-semibold mb-4 text-primary-800">Risk Simulations</h3><ul class="space-y-3 text-sm max-h-[70vh] overflow-y-auto">${items}</ul>`);
+        } catch (error) {
+            showModal(`<button id="close-modal-btn" class="absolute top-4 right-4 text-gray-400 hover:text-gray-600">&times;</button><h3 class="text-xl font-semibold mb-4 text-red-700">Error</h3><p class="text-gray-700">Could not complete request: ${error.message}</p>`);
+        }
+    };
+
     const handleQuery = async (question) => {
         const popupLog = document.getElementById('co-popup-log');
         const log = popupLog || elements.conversationLog;
@@ -1097,6 +1126,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 const button = e.target.closest('button');
                 if (!button) return;
                 if (button.classList.contains('simulate-risk-btn')) handleApiAction('simulate', button);
+                if (button.id === 'simulate-all-btn') handleSimulateAll();
                 if (button.classList.contains('rewrite-clause-btn')) handleApiAction('rewrite', button);
                 // Benchmark disabled: no-op on benchmark button clicks
                 // if (button.classList.contains('benchmark-btn')) handleApiAction('benchmark', button);
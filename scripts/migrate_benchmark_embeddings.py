@@ -0,0 +1,106 @@
+# In scripts/migrate_benchmark_embeddings.py
+# Migration for benchmark.db files created before embeddings were stored as float32 BLOBs
+# with an int8 search copy; safe to re-run, each step only touches rows that still need it
+import sqlite3
+import os
+import sys
+import json
+import numpy as np
+try:
+    import sqlite_vec
+except ImportError:
+    sqlite_vec = None
+
+# quantize_int8 is shared with the app, which encodes search queries the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.vectors import quantize_int8
+
+DB_FILE = "benchmark.db"
+TABLE_NAME = "clauses"
+
+
+if not os.path.exists(DB_FILE):
+    raise SystemExit(f"Database file not found: {DB_FILE}")
+
+conn = sqlite3.connect(DB_FILE)
+cursor = conn.cursor()
+cols = {row[1] for row in cursor.execute(f"PRAGMA table_info('{TABLE_NAME}')")}
+converted = 'embedding' in cols
+quantized = 0
+
+if converted:
+    if 'emb_blob' not in cols:
+        cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN emb_blob BLOB")
+
+    rows = cursor.execute(f"SELECT id, embedding FROM {TABLE_NAME}").fetchall()
+    print(f"Converting {len(rows)} embeddings...")
+    cursor.executemany(
+        f"UPDATE {TABLE_NAME} SET emb_blob = ? WHERE id = ?",
+        [(np.asarray(json.loads(emb), dtype=np.float32).tobytes(), row_id) for row_id, emb in rows],
+    )
+
+    # Verify every row round-trips before dropping the JSON column
+    for row_id, emb, blob in cursor.execute(f"SELECT id, embedding, emb_blob FROM {TABLE_NAME}").fetchall():
+        if blob is None or not np.array_equal(np.frombuffer(blob, dtype=np.float32), np.asarray(json.loads(emb), dtype=np.float32)):
+            conn.rollback()
+            conn.close()
+            raise SystemExit(f"Verification failed for clause id={row_id}; no changes were saved.")
+
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} DROP COLUMN embedding")
+else:
+    print("Embeddings are already stored as BLOBs.")
+
+# --- int8 search copy: emb_q8 holds the quantized unit vector, emb_scale its dequantization factor ---
+if 'emb_q8' not in cols:
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN emb_q8 BLOB")
+if 'emb_scale' not in cols:
+    cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN emb_scale REAL")
+pending = cursor.execute(f"SELECT id, emb_blob FROM {TABLE_NAME} WHERE emb_q8 IS NULL OR emb_scale IS NULL").fetchall()
+if pending:
+    print(f"Quantizing {len(pending)} embeddings to int8...")
+    cursor.executemany(
+        f"UPDATE {TABLE_NAME} SET emb_q8 = ?, emb_scale = ? WHERE id = ?",
+        [(*quantize_int8(np.frombuffer(blob, dtype=np.float32)), row_id) for row_id, blob in pending],
+    )
+    quantized = len(pending)
+
+# Older versions indexed the float32 blobs; the app now queries vec_clauses with int8 codes
+vec_sql = cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_clauses'").fetchone()
+stale_index = vec_sql is not None and 'int8[' not in (vec_sql[0] or '').lower()
+
+if not converted and not quantized and not stale_index:
+    print("Nothing to do.")
+    conn.close()
+    raise SystemExit(0)
+
+# (Re)build the optional sqlite-vec KNN index over the int8 codes
+try:
+    first = cursor.execute(f"SELECT length(emb_q8) FROM {TABLE_NAME} LIMIT 1").fetchone()
+    if not first:
+        raise ValueError("no clauses to index")
+    conn.enable_load_extension(True)
+    sqlite_vec.load(conn)
+    conn.enable_load_extension(False)
+    dims = first[0]
+    cursor.execute("DROP TABLE IF EXISTS vec_clauses")
+    cursor.execute(f"CREATE VIRTUAL TABLE vec_clauses USING vec0(embedding int8[{dims}] distance_metric=cosine)")
+    cursor.execute(f"INSERT INTO vec_clauses (rowid, embedding) SELECT id, vec_int8(emb_q8) FROM {TABLE_NAME}")
+    print("KNN index 'vec_clauses' created successfully.")
+except Exception as e:
+    print(f"Skipping sqlite-vec KNN index (brute-force search will be used): {e}")
+
+if converted:
+    # --- Keyword index: clauses_fts is an external-content FTS5 table over clauses.text/category ---
+    try:
+        cursor.execute("DROP TABLE IF EXISTS clauses_fts")
+        cursor.execute(f"CREATE VIRTUAL TABLE clauses_fts USING fts5(text, category, content='{TABLE_NAME}', content_rowid='id')")
+        cursor.execute("INSERT INTO clauses_fts (clauses_fts) VALUES ('rebuild')")
+        print("Keyword index 'clauses_fts' created successfully.")
+    except sqlite3.Error as e:
+        print(f"Skipping FTS5 keyword index: {e}")
+
+conn.commit()
+cursor.execute("VACUUM")
+conn.close()
+
+print("Migration complete.")
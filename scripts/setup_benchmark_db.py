@@ -1,9 +1,18 @@
 # In scripts/setup_benchmark_db.py
 import sqlite3
 import os
+import sys
 import google.generativeai as genai
 from dotenv import load_dotenv
-import json
+import numpy as np
+try:
+    import sqlite_vec
+except ImportError:
+    sqlite_vec = None
+
+# quantize_int8 is shared with the app, which encodes search queries the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.vectors import quantize_int8
 
 print("Setting up the benchmark database...")
 
@@ -31,14 +40,16 @@ if os.path.exists(DB_FILE):
 conn = sqlite3.connect(DB_FILE)
 cursor = conn.cursor()
 
-# Create table with a column for the vector embedding
+# Create table with a column for the vector embedding (raw float32 bytes) plus its int8 copy used for search
 cursor.execute(f'''
 CREATE TABLE {TABLE_NAME} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     clause_type TEXT NOT NULL,
     text TEXT NOT NULL,
     category TEXT NOT NULL,
-    embedding TEXT NOT NULL
+    emb_blob BLOB NOT NULL,
+    emb_q8 BLOB NOT NULL,
+    emb_scale REAL NOT NULL
 )
 ''')
 print(f"Table '{TABLE_NAME}' created successfully.")
@@ -51,11 +62,33 @@ result = genai.embed_content(model='models/text-embedding-004',
                              task_type="RETRIEVAL_DOCUMENT")
 
 for i, item in enumerate(mock_clauses):
-    embedding_json = json.dumps(result['embedding'][i])
+    emb_blob = np.asarray(result['embedding'][i], dtype=np.float32).tobytes()
+    emb_q8, emb_scale = quantize_int8(result['embedding'][i])
     cursor.execute(f'''
-    INSERT INTO {TABLE_NAME} (clause_type, text, category, embedding)
-    VALUES (?, ?, ?, ?)
-    ''', (item['clause_type'], item['text'], item['category'], embedding_json))
+    INSERT INTO {TABLE_NAME} (clause_type, text, category, emb_blob, emb_q8, emb_scale)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', (item['clause_type'], item['text'], item['category'], emb_blob, emb_q8, emb_scale))
+
+# --- KNN index (optional): vec_clauses mirrors emb_blob keyed by clause id ---
+try:
+    conn.enable_load_extension(True)
+    sqlite_vec.load(conn)
+    conn.enable_load_extension(False)
+    dims = len(result['embedding'][0])
+    cursor.execute(f"CREATE VIRTUAL TABLE vec_clauses USING vec0(embedding int8[{dims}] distance_metric=cosine)")
+    cursor.execute(f"INSERT INTO vec_clauses (rowid, embedding) SELECT id, vec_int8(emb_q8) FROM {TABLE_NAME}")
+    print("KNN index 'vec_clauses' created successfully.")
+except Exception as e:
+    print(f"Skipping sqlite-vec KNN index (brute-force search will be used): {e}")
+
+# --- Keyword index: clauses_fts is an external-content FTS5 table over clauses.text/category ---
+try:
+    cursor.execute("DROP TABLE IF EXISTS clauses_fts")
+    cursor.execute(f"CREATE VIRTUAL TABLE clauses_fts USING fts5(text, category, content='{TABLE_NAME}', content_rowid='id')")
+    cursor.execute("INSERT INTO clauses_fts (clauses_fts) VALUES ('rebuild')")
+    print("Keyword index 'clauses_fts' created successfully.")
+except sqlite3.Error as e:
+    print(f"Skipping FTS5 keyword index: {e}")
 
 conn.commit()
 conn.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# app.database opens ./chimera_app.db and the page/export stores write under ./data, all relative
+# to the working directory; run the suite in a scratch directory so the checkout stays untouched
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix="legalease-tests-"))
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.pop("DB_BACKEND", None)
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from app import llm_cache
+
+
+@pytest.fixture
+def cache_db(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "true")
+    monkeypatch.setattr(llm_cache, "CACHE_DB_FILE", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    monkeypatch.setattr(llm_cache, "_last_purge", 0.0)
+    yield
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+
+
+def test_cached_skips_results_rejected_by_predicate(cache_db):
+    replies = iter([{"answer": "", "citation": ""}, {"answer": "Yes.", "citation": "s.2"}, {"answer": "No.", "citation": ""}])
+
+    @llm_cache.cached(should_cache=llm_cache.has_answer)
+    def ask(prompt):
+        return next(replies)
+
+    assert ask("q") == {"answer": "", "citation": ""}
+    assert ask("q") == {"answer": "Yes.", "citation": "s.2"}
+    assert ask("q") == {"answer": "Yes.", "citation": "s.2"}
+
+
+def test_writes_purge_expired_rows(cache_db):
+    llm_cache.put("old", {"answer": "a"}, ttl=-1)
+    llm_cache.semantic_put("scope", [1.0, 0.0], {"answer": "a"}, ttl=-1)
+    llm_cache._last_purge = time.time() - llm_cache.PURGE_INTERVAL_SECONDS - 1
+    llm_cache.put("new", {"answer": "b"})
+    conn = llm_cache._get_conn()
+    assert [r[0] for r in conn.execute("SELECT input_hash FROM llm_cache")] == ["new"]
+    assert conn.execute("SELECT COUNT(*) FROM llm_semantic_cache").fetchone()[0] == 0
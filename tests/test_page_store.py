@@ -0,0 +1,21 @@
+import base64
+import os
+
+from app import page_store
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\nfake").decode()
+
+
+def test_staged_pages_are_served_after_placement():
+    refs = [f"data:image/png;base64,{PNG}", "https://example.com/remote.png"]
+    key = page_store.stage_page_images(refs)
+    urls = page_store.place_staged_pages(41, key, refs)
+    assert urls[1] == "https://example.com/remote.png"
+    assert page_store.read_local_page_image(urls[0]) == base64.b64decode(PNG)
+    assert not os.path.exists(os.path.join(page_store.STAGING_DIR, key))
+
+
+def test_discarded_staging_leaves_nothing_behind():
+    key = page_store.stage_page_images([f"data:image/png;base64,{PNG}"])
+    page_store.discard_staged_pages(key)
+    assert not os.path.exists(os.path.join(page_store.STAGING_DIR, key))
@@ -0,0 +1,258 @@
+import asyncio
+import random
+import sqlite3
+import time
+import unicodedata
+
+import numpy as np
+import pytest
+
+from app import schemas, services
+from app.vectors import quantize_int8
+
+
+def test_ocr_cache_key_is_stable_across_page_reference_forms():
+    refs = [
+        "data:image/png;base64,iVBORw0KGgo=",
+        "/analyses/7/pages/3?k=abcdefghijklmnop",
+        "https://storage.googleapis.com/bucket/analyses/7/pages/page_3.png?X-Goog-Date=20260101T000000Z&X-Goog-Signature=aa",
+        "https://storage.googleapis.com/bucket/analyses/7/pages/page_3.png?X-Goog-Date=20260101T000100Z&X-Goog-Signature=bb",
+    ]
+    assert len({services._ocr_cache_key(7, 2, ref) for ref in refs}) == 1
+    assert services._ocr_cache_key(7, 2, refs[0]) != services._ocr_cache_key(7, 3, refs[0])
+    assert services._ocr_cache_key(8, 2, refs[0]) != services._ocr_cache_key(7, 2, refs[0])
+
+
+def test_unsaved_analyses_do_not_share_ocr_entries():
+    assert services._ocr_cache_key(0, 0, "data:image/png;base64,AAAA") != services._ocr_cache_key(0, 0, "data:image/png;base64,BBBB")
+
+
+def test_resigned_page_url_reuses_cached_ocr(monkeypatch):
+    calls = []
+    entry = ("text", [0, 1, 2, 3], [], 100.0, 100.0, None)
+
+    def build(ref):
+        calls.append(ref)
+        return entry
+
+    monkeypatch.setattr(services, "_build_ocr_entry_sync", build)
+    first = services._get_or_build_ocr_cache_for_page_sync(9001, 0, "https://example.com/p1.png?X-Goog-Signature=one")
+    again = services._get_or_build_ocr_cache_for_page_sync(9001, 0, "https://example.com/p1.png?X-Goog-Signature=two")
+    assert first is entry and again is entry
+    assert len(calls) == 1
+
+
+def test_page_ref_digest_ignores_url_signatures():
+    a = services._page_ref_digest("https://storage.googleapis.com/b/analyses/7/page_1.png?X-Goog-Signature=one")
+    b = services._page_ref_digest("https://storage.googleapis.com/b/analyses/7/page_1.png?X-Goog-Signature=two")
+    c = services._page_ref_digest("https://storage.googleapis.com/b/analyses/7/page_2.png?X-Goog-Signature=one")
+    assert a == b != c
+    assert services._page_ref_digest("data:image/png;base64,AAAA") != services._page_ref_digest("data:image/png;base64,BBBB")
+
+
+def test_inflight_ocr_is_shared_without_blocking_sync_callers(monkeypatch):
+    entry = ("text", [0, 1, 2, 3], [], 100.0, 100.0, None)
+    monkeypatch.setattr(services, "_build_ocr_entry_sync", lambda ref: pytest.fail("page is already being OCRed"))
+    key = services._ocr_cache_key(9002, 0, "/analyses/9002/pages/1?k=abcdefghijklmnop")
+    assert services._ocr_claim(key) is None
+    waiter = services._ocr_claim(key)
+    # A sync caller skips the box instead of parking its executor thread on the owner
+    assert services._get_or_build_ocr_cache_for_page_sync(9002, 0, "/analyses/9002/pages/1?k=abcdefghijklmnop") is None
+    services._ocr_release(key, entry)
+    assert waiter.result(timeout=0) is entry
+    assert services._get_or_build_ocr_cache_for_page_sync(9002, 0, "/analyses/9002/pages/1?k=abcdefghijklmnop") is entry
+
+
+def test_cue_scoring_reaches_the_pool_only_past_the_first_pages(monkeypatch):
+    async def no_pool(fn, *args):
+        pytest.fail("early pages must be scored inline")
+
+    monkeypatch.setattr(services.cpu_pool, "run_cpu_bound", no_pool)
+    pages = ["WHEREAS the parties agree; IN WITNESS WHEREOF signed."] * (services.CUE_PARALLEL_MIN_PAGES * 2)
+
+    async def first_pages():
+        it = services._iter_legal_cue_scores(pages)
+        scores = [await it.__anext__() for _ in range(services.CUE_INLINE_PAGES)]
+        await it.aclose()
+        return scores
+
+    assert asyncio.run(first_pages()) == [services._compute_legal_cue_score(pages[0])] * services.CUE_INLINE_PAGES
+
+
+def _flaky(failures: int, calls: list, pause: float = 0.0):
+    def call(arg):
+        calls.append(arg)
+        if pause:
+            time.sleep(pause)
+        if len(calls) <= failures:
+            raise RuntimeError(f"call {len(calls)} failed")
+        return arg
+    return call
+
+
+def test_oracle_retries_stop_at_the_call_budget():
+    calls: list = []
+    assert asyncio.run(services._hedged_to_thread(_flaky(2, calls), "ok", delay=0, max_calls=3, backoff=0)) == "ok"
+    assert len(calls) == 3
+    calls.clear()
+    with pytest.raises(RuntimeError):
+        asyncio.run(services._hedged_to_thread(_flaky(5, calls), "ok", delay=0, max_calls=2, backoff=0))
+    assert len(calls) == 2
+
+
+def test_oracle_hedge_counts_against_the_budget():
+    calls: list = []
+    # The slow first call is hedged once; the budget leaves no room for retries after that
+    result = asyncio.run(services._hedged_to_thread(_flaky(0, calls, pause=0.2), "ok", delay=0.01, max_calls=2, backoff=0))
+    assert result == "ok"
+    assert len(calls) == 2
+
+
+def test_failed_ocr_box_keeps_the_text_highlight(monkeypatch):
+    def broken(*args):
+        raise RuntimeError("OCR backend down")
+
+    monkeypatch.setattr(services, "_get_or_build_ocr_cache_for_page_sync", broken)
+    page = "1. The Tenant shall indemnify the Landlord.\n2. Late payment incurs a penalty of 5%.\n"
+    ia = schemas.IntelligentAnalysis(
+        key_info=[],
+        identified_actions=[
+            schemas.ActionItem(text="The Tenant shall indemnify the Landlord.", is_negotiable=True, is_benchmarkable=False),
+            schemas.ActionItem(text="Late payment incurs a penalty of 5%.", is_negotiable=True, is_benchmarkable=False),
+        ],
+        assessment="",
+        extracted_text=[page],
+        page_images=["data:image/png;base64,AAAA"],
+    )
+    matches = services.compute_risk_highlights_for_ia(ia)
+    assert len(matches) == 2
+    assert all(not m.boxes and not m.strategy.endswith("+ocr") for m in matches)
+
+
+def test_docai_processor_name_is_retried_until_resolved(monkeypatch):
+    results = iter([None, "projects/p/locations/us/processors/x"])
+    monkeypatch.setattr(services, "_docai_name", None)
+    monkeypatch.setattr(services, "_resolve_docai_processor_name", lambda: next(results))
+    assert services._docai_processor_name() is None
+    assert services._docai_processor_name() == "projects/p/locations/us/processors/x"
+    # Resolved once, then served from the module cache
+    assert services._docai_processor_name() == "projects/p/locations/us/processors/x"
+
+
+def _benchmark_db(path, embeddings):
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE clauses (id INTEGER PRIMARY KEY, clause_type TEXT, text TEXT, category TEXT, emb_blob BLOB, emb_q8 BLOB, emb_scale REAL)")
+        for i, emb in enumerate(embeddings):
+            q8, scale = quantize_int8(emb)
+            conn.execute(
+                "INSERT INTO clauses (clause_type, text, category, emb_blob, emb_q8, emb_scale) VALUES (?, ?, ?, ?, ?, ?)",
+                ("t", f"clause {i}", "Standard", np.asarray(emb, dtype=np.float32).tobytes(), q8, scale),
+            )
+
+
+@pytest.mark.parametrize("use_int8", [True, False])
+def test_int8_clause_search_matches_float32_ranking(tmp_path, monkeypatch, use_int8):
+    rng = np.random.default_rng(7)
+    embeddings = rng.normal(size=(40, 64)).astype(np.float32)
+    _benchmark_db(tmp_path / "benchmark.db", embeddings)
+    monkeypatch.setattr(services, "DB_FILE", str(tmp_path / "benchmark.db"))
+    monkeypatch.setattr(services, "BENCHMARK_INT8", use_int8)
+    monkeypatch.setattr(services, "_clause_matrix", None)
+    monkeypatch.setattr(services, "sqlite_vec", None)
+    query = embeddings[5] + 0.05 * rng.normal(size=64).astype(np.float32)
+    found = services.find_similar_clauses(query.tolist(), top_k=3)
+    unit = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    exact = unit @ (query / np.linalg.norm(query))
+    assert [text for _, text, _ in found] == [f"clause {i}" for i in np.argsort(-exact)[:3]]
+    assert abs(found[0][0] - exact.max()) < 0.02
+
+
+def test_failed_docai_group_is_read_with_vision(monkeypatch):
+    seen = []
+
+    async def vision(images):
+        seen.append(list(images))
+        return [f"vision {img.decode()}" for img in images]
+
+    monkeypatch.setattr(services, "_vision_ocr_pages", vision)
+    groups = [[b"1", b"2"], [b"3", b"4"], [b"5"]]
+    results = [["docai 1", "docai 2"], None, ["docai 5"]]
+    texts = asyncio.run(services._vision_fill_failed_groups(groups, results))
+    # Only the failed group's pages are re-read, and they keep their page positions
+    assert seen == [[b"3", b"4"]]
+    assert texts == ["docai 1", "docai 2", "vision 3", "vision 4", "docai 5"]
+
+
+
+def test_stopping_the_prewarm_worker_cancels_running_prewarms(monkeypatch):
+    started, released = asyncio.Event(), []
+
+    async def prewarm(analysis_id, page_images):
+        started.set()
+        try:
+            await asyncio.sleep(60)
+        finally:
+            released.append(analysis_id)
+
+    monkeypatch.setattr(services, "_prewarm_scanned_pages_ocr", prewarm)
+
+    async def scenario():
+        worker = asyncio.create_task(services.run_ocr_prewarm_worker())
+        await asyncio.sleep(0)
+        services.enqueue_ocr_prewarm(7, ["page"])
+        await started.wait()
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert released == [7]
+
+def _reference_normalize_with_map(s: str) -> tuple[str, list[int]]:
+    # The per-character loop _normalize_with_map replaced; the NumPy version must match it exactly
+    if not s:
+        return "", []
+    s = unicodedata.normalize('NFKD', s).replace("\u00AD", "").replace("\u200B", "")
+    out, idx_map, prev_was_space, i = [], [], False, 0
+    while i < len(s):
+        ch = s[i]
+        if ch == '-' and i + 1 < len(s) and s[i + 1] in ('\n', '\r'):
+            i += 2
+            continue
+        if ch.isspace():
+            if not prev_was_space:
+                out.append(' ')
+                idx_map.append(i)
+                prev_was_space = True
+            i += 1
+            continue
+        prev_was_space = False
+        if ch in '“”"′’‘`´ʼʹ’':
+            ch = '"' if ch in '“”"' else "'"
+        if ch in '–—‑':
+            ch = '-'
+        if ch.isalnum() or ch in ('-', '%'):
+            out.append(ch.lower())
+            idx_map.append(i)
+        i += 1
+    start, end = 0, len(out)
+    while start < end and out[start] == ' ':
+        start += 1
+    while end > start and out[end - 1] == ' ':
+        end -= 1
+    return ''.join(out[start:end]), idx_map[start:end]
+
+
+def test_normalize_with_map_matches_the_reference_on_every_code_point():
+    # Lone surrogates can't occur in decoded text
+    cps = [cp for cp in range(0x110000) if not 0xD800 <= cp <= 0xDFFF]
+    for start in range(0, len(cps), 4096):
+        s = ''.join(map(chr, cps[start:start + 4096]))
+        assert services._normalize_with_map(s) == _reference_normalize_with_map(s), hex(cps[start])
+
+
+def test_normalize_with_map_matches_the_reference_on_mixed_text():
+    rng = random.Random(11)
+    alphabet = "Aa Zz09%-\n\r\t“”’–—‑\u00AD\u200BİΣςéﬁ½.,;:()ʼ"
+    for _ in range(500):
+        s = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        assert services._normalize_with_map(s) == _reference_normalize_with_map(s), repr(s)
@@ -0,0 +1,15 @@
+import numpy as np
+
+from app.vectors import int8_unit_query, quantize_int8
+
+
+def test_quantize_int8_round_trips_the_unit_vector():
+    v = np.array([3.0, -4.0, 0.5, 0.0], dtype=np.float32)
+    codes, scale = quantize_int8(v)
+    restored = np.frombuffer(codes, dtype=np.int8) * scale
+    assert np.allclose(restored, v / np.linalg.norm(v), atol=scale)
+    assert np.abs(np.frombuffer(codes, dtype=np.int8)).max() == 127
+
+
+def test_int8_unit_query_is_unit_length():
+    assert np.isclose(np.linalg.norm(int8_unit_query([0.2, 0.1, -0.7])), 1.0)